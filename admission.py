@@ -0,0 +1,195 @@
+"""
+Admission control for MedAssist.
+
+Every chat request is charged against a per-user token bucket before any work
+is done. Cheap intents (viewing and setting reminders) and expensive ones
+(disease and drug lookups, which call Gemini, OpenFDA and the fallback APIs)
+have separate buckets, so a user hammering "tell me about ..." runs out of
+lookups without losing the ability to manage their reminders.
+
+Expensive requests also need one of a fixed number of global in-flight slots,
+sized to what the upstream APIs can take at once. When every slot is taken the
+app is overloaded: further expensive requests are shed straight away instead
+of queueing behind the ones already running, which keeps worker capacity free
+for reminder operations. A lookup the caches can answer is not expensive and
+is admitted as a cheap request (see chat() in app.py). Cheap requests that
+would go upstream on the side (a new reminder's drug info) take a slot with
+check_upstream(), and skip the upstream call when there is none.
+
+Buckets and slots live in a local SQLite file so they are shared by every
+gunicorn worker on the machine. Admission failures never fail a request: any
+error is logged and the request is let through.
+"""
+
+import os
+import time
+import uuid
+import random
+import sqlite3
+import tempfile
+import deadlines
+import telemetry
+import gemini_client
+from local_db import LocalDatabase
+
+ADMISSION_DB_PATH = os.environ.get(
+    "ADMISSION_DB_PATH", os.path.join(tempfile.gettempdir(), "medassist-admission.sqlite3")
+)
+
+# Bucket sizes (burst) and refill rates (requests per minute) per tier
+CHEAP_BURST = float(os.environ.get("CHEAP_BURST", "30"))
+CHEAP_PER_MINUTE = float(os.environ.get("CHEAP_PER_MINUTE", "60"))
+EXPENSIVE_BURST = float(os.environ.get("EXPENSIVE_BURST", "5"))
+EXPENSIVE_PER_MINUTE = float(os.environ.get("EXPENSIVE_PER_MINUTE", "6"))
+
+# Concurrent expensive requests across all workers; by default as many as the
+# workers' Gemini pools can serve at once, since a request past that only queues
+_upstream_slots = int(os.environ.get("WEB_CONCURRENCY", "2")) * gemini_client.GEMINI_MAX_CONCURRENCY
+MAX_EXPENSIVE_IN_FLIGHT = int(os.environ.get("MAX_EXPENSIVE_IN_FLIGHT", str(max(1, _upstream_slots))))
+
+# A slot whose holder died without releasing it is reclaimed after this long
+IN_FLIGHT_SLOT_TTL = deadlines.REQUEST_LATENCY_BUDGET * 2
+
+# Fraction of bucket updates that also drop buckets idle long enough to be full again
+BUCKET_CLEANUP_RATE = 0.01
+
+# Chat intents that call upstream APIs
+EXPENSIVE_INTENTS = {"disease_info", "drug_info", "bulk_import"}
+
+TIERS = {
+    "cheap": (CHEAP_BURST, CHEAP_PER_MINUTE / 60),
+    "expensive": (EXPENSIVE_BURST, EXPENSIVE_PER_MINUTE / 60),
+}
+
+_db = LocalDatabase(ADMISSION_DB_PATH, schema=(
+    "CREATE TABLE IF NOT EXISTS buckets ("
+    " user_id TEXT NOT NULL,"
+    " tier TEXT NOT NULL,"
+    " tokens REAL NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " PRIMARY KEY (user_id, tier))",
+    "CREATE TABLE IF NOT EXISTS in_flight ("
+    " slot TEXT PRIMARY KEY,"
+    " expires_at REAL NOT NULL)",
+))
+
+class Decision:
+    """Outcome of an admission check"""
+    __slots__ = ("allowed", "reason", "retry_after", "slot")
+
+    def __init__(self, allowed, reason=None, retry_after=0):
+        self.allowed = allowed
+        self.reason = reason
+        self.retry_after = retry_after
+        self.slot = None
+
+def tier_for(intent):
+    return "expensive" if intent in EXPENSIVE_INTENTS else "cheap"
+
+def take_token(user_id, tier):
+    """Take one token from the user's bucket; returns a Decision"""
+    capacity, rate = TIERS[tier]
+    conn = _db.connection()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE user_id = ? AND tier = ?", (str(user_id), tier)
+        ).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (user_id, tier, tokens, updated_at) VALUES (?, ?, ?, ?)",
+            (str(user_id), tier, tokens, now)
+        )
+        if random.random() < BUCKET_CLEANUP_RATE:
+            # An idle bucket refills to capacity, which is the same as having no row
+            for name, (tier_capacity, tier_rate) in TIERS.items():
+                conn.execute(
+                    "DELETE FROM buckets WHERE tier = ? AND updated_at < ?",
+                    (name, now - tier_capacity / tier_rate)
+                )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if allowed:
+        return Decision(True)
+    return Decision(False, "rate_limited", (1 - tokens) / rate)
+
+def _acquire_slot():
+    """Take a global in-flight slot for an expensive request; returns its id, or None if all are taken"""
+    conn = _db.connection()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM in_flight WHERE expires_at < ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM in_flight").fetchone()
+        slot = None
+        if count < MAX_EXPENSIVE_IN_FLIGHT:
+            slot = uuid.uuid4().hex
+            conn.execute("INSERT INTO in_flight (slot, expires_at) VALUES (?, ?)", (slot, now + IN_FLIGHT_SLOT_TTL))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return slot
+
+def _release_slot(slot):
+    try:
+        _db.connection().execute("DELETE FROM in_flight WHERE slot = ?", (slot,))
+    except sqlite3.Error as e:
+        print(f"Admission slot release error: {str(e)}")
+
+def check(user_id, intent):
+    """
+    Admission check for one request, returning a Decision.
+
+    An admitted expensive request holds a global in-flight slot until the
+    decision is passed to release().
+    """
+    tier = tier_for(intent)
+    slot = None
+    try:
+        # Shed before charging the user, so overload does not cost them tokens
+        if tier == "expensive":
+            slot = _acquire_slot()
+        if tier == "expensive" and slot is None:
+            decision = Decision(False, "overloaded", 1)
+        else:
+            decision = take_token(user_id, tier)
+            if not decision.allowed and slot is not None:
+                _release_slot(slot)
+                slot = None
+    except sqlite3.Error as e:
+        print(f"Admission check error for user {user_id}: {str(e)}")
+        decision = Decision(True)
+
+    telemetry.record_admission(tier, decision.reason or "admitted")
+    decision.slot = slot
+    return decision
+
+def check_upstream():
+    """
+    Admission for upstream work inside a cheap request, returning a Decision.
+
+    No tokens are charged; an allowed decision holds an in-flight slot until
+    it is passed to release(), and a refused one means the work should be
+    skipped because the app is overloaded.
+    """
+    try:
+        slot = _acquire_slot()
+    except sqlite3.Error as e:
+        print(f"Admission check error for upstream work: {str(e)}")
+        return Decision(True)
+    decision = Decision(True) if slot is not None else Decision(False, "overloaded", 1)
+    telemetry.record_admission("upstream", decision.reason or "admitted")
+    decision.slot = slot
+    return decision
+
+def release(decision):
+    """Give back the in-flight slot held by an admitted request, if any"""
+    if decision.slot is not None:
+        _release_slot(decision.slot)
@@ -0,0 +1,254 @@
+"""
+Incremental chat analytics for MedAssist.
+
+Usage statistics (intent mix, turns per session, lookup success rate, daily
+active users) are kept in small rollup collections so that nothing has to
+scan chat_history to answer them:
+
+- analytics_days: one document per day with turns, sessions, active_users,
+  lookups and lookups_ok.
+- analytics_intents: user turns per day and intent.
+- analytics_active_users: one document per (day, user) seen, backing the
+  active_users counts.
+- analytics_user_state: each user's last turn, so a session that spans two
+  runs is not counted twice.
+
+Each run only reads the chat_history messages written since the previous
+run's watermark (stored in analytics_state) and folds them into the rollups
+with aggregation pipelines ending in $merge. A run records its window before
+starting and each step when it finishes, so an interrupted run is resumed;
+the counters record which windows they hold, so a step that had merged but
+not been marked done is not counted twice. Every message is classified by
+the intent chat() recorded on it; older messages without one are classified
+once with app.detect_intent, which only sees the message text since their
+session state was not kept.
+
+Usage:
+    python analytics.py
+"""
+
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import resources
+
+# A new session starts after this many minutes without a user turn
+SESSION_GAP_MINUTES = int(os.environ.get("ANALYTICS_SESSION_GAP_MINUTES", "30"))
+# Messages younger than this (in seconds) are left for the next run, so that
+# writes still in flight when a run starts are not skipped
+ANALYTICS_LAG_SECONDS = int(os.environ.get("ANALYTICS_LAG_SECONDS", "60"))
+# Where the first run starts when there is no watermark yet
+ANALYTICS_BACKFILL_DAYS = int(os.environ.get("ANALYTICS_BACKFILL_DAYS", "90"))
+
+LOOKUP_INTENTS = ["disease_info", "drug_info"]
+
+DAYS = "analytics_days"
+INTENTS = "analytics_intents"
+ACTIVE_USERS = "analytics_active_users"
+USER_STATE = "analytics_user_state"
+
+chat_history_collection = resources.collection("chat_history")
+state_collection = resources.collection("analytics_state")
+days_collection = resources.collection(DAYS)
+intents_collection = resources.collection(INTENTS)
+active_users_collection = resources.collection(ACTIVE_USERS)
+
+STATE_ID = "chat_history"
+
+def _day(field):
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": field}}
+
+def _merge_counts(into, window, step, *fields):
+    """Final stages adding the incoming counters to the existing ones, once per window
+
+    Each document records the windows a step has added to it (by their start)
+    in the same write as the counters, so a step re-run by a resumed run
+    leaves the documents it already updated alone.
+    """
+    applied = f"applied_{step}"
+    seen = {"$in": ["$$window", {"$ifNull": [f"${applied}", []]}]}
+    added = {field: {"$cond": [seen, f"${field}", {"$add": [{"$ifNull": [f"${field}", 0]}, f"$$new.{field}"]}]} for field in fields}
+    return [
+        {"$set": {applied: [window["timestamp"]["$gt"]]}},
+        {"$merge": {
+            "into": into,
+            "on": "_id",
+            "let": {"new": "$$ROOT", "window": window["timestamp"]["$gt"]},
+            "whenMatched": [{"$set": {
+                **added,
+                applied: {"$cond": [seen, f"${applied}", {"$concatArrays": [{"$ifNull": [f"${applied}", []]}, ["$$window"]]}]}
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+def classify_legacy_messages(window):
+    """Record an intent on user messages written before chat() started storing one"""
+    from pymongo import UpdateOne
+    from app import detect_intent
+    cursor = chat_history_collection.find(
+        {**window, "role": "user", "intent": {"$exists": False}}, {"content": 1}
+    )
+    updates = []
+    classified = 0
+    for message in cursor:
+        intent = detect_intent(message.get("content") or "", 1, {})
+        updates.append(UpdateOne({"_id": message["_id"]}, {"$set": {"intent": intent}}))
+        if len(updates) == 1000:
+            chat_history_collection.bulk_write(updates, ordered=False)
+            classified += len(updates)
+            updates = []
+    if updates:
+        chat_history_collection.bulk_write(updates, ordered=False)
+        classified += len(updates)
+    return classified
+
+def rollup_intents(window):
+    chat_history_collection.aggregate([
+        {"$match": {**window, "role": "user"}},
+        {"$group": {"_id": {"day": _day("$timestamp"), "intent": {"$ifNull": ["$intent", "fallback"]}}, "count": {"$sum": 1}}},
+        {"$project": {"_id": {"$concat": ["$_id.day", ":", "$_id.intent"]}, "day": "$_id.day", "intent": "$_id.intent", "count": 1}},
+        *_merge_counts(INTENTS, window, "intents", "count")
+    ])
+
+def rollup_lookups(window):
+    chat_history_collection.aggregate([
+        {"$match": {**window, "role": "bot", "intent": {"$in": LOOKUP_INTENTS}}},
+        {"$group": {
+            "_id": _day("$timestamp"),
+            "lookups": {"$sum": 1},
+            "lookups_ok": {"$sum": {"$cond": [{"$eq": ["$lookup_ok", True]}, 1, 0]}}
+        }},
+        *_merge_counts(DAYS, window, "lookups", "lookups", "lookups_ok")
+    ])
+
+def rollup_sessions(window):
+    """Count user turns and session starts per day, continuing sessions from earlier runs"""
+    gap_ms = SESSION_GAP_MINUTES * 60 * 1000
+    chat_history_collection.aggregate([
+        {"$match": {**window, "role": "user"}},
+        {"$setWindowFields": {
+            "partitionBy": "$user_id",
+            "sortBy": {"timestamp": 1},
+            "output": {"previous": {"$shift": {"output": "$timestamp", "by": -1}}}
+        }},
+        {"$lookup": {"from": USER_STATE, "localField": "user_id", "foreignField": "_id", "as": "state"}},
+        {"$set": {"previous": {"$ifNull": ["$previous", {"$first": "$state.last_turn"}]}}},
+        {"$group": {
+            "_id": _day("$timestamp"),
+            "turns": {"$sum": 1},
+            "sessions": {"$sum": {"$cond": [
+                {"$or": [
+                    {"$eq": [{"$ifNull": ["$previous", None]}, None]},
+                    {"$gt": [{"$subtract": ["$timestamp", "$previous"]}, gap_ms]}
+                ]}, 1, 0
+            ]}}
+        }},
+        *_merge_counts(DAYS, window, "sessions", "turns", "sessions")
+    ])
+
+def rollup_user_state(window):
+    """Remember each user's last turn for the next run's session counting"""
+    chat_history_collection.aggregate([
+        {"$match": {**window, "role": "user"}},
+        {"$group": {"_id": "$user_id", "last_turn": {"$max": "$timestamp"}}},
+        {"$merge": {"into": USER_STATE, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}}
+    ])
+
+def rollup_active_users(window):
+    chat_history_collection.aggregate([
+        {"$match": {**window, "role": "user"}},
+        {"$group": {"_id": {"day": _day("$timestamp"), "user_id": "$user_id"}}},
+        {"$project": {"_id": {"$concat": ["$_id.day", ":", "$_id.user_id"]}, "day": "$_id.day", "user_id": "$_id.user_id"}},
+        {"$merge": {"into": ACTIVE_USERS, "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}}
+    ])
+    # Recount only the days this window touched
+    start, end = window["timestamp"]["$gt"].date(), window["timestamp"]["$lte"].date()
+    touched = [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+    active_users_collection.aggregate([
+        {"$match": {"day": {"$in": touched}}},
+        {"$group": {"_id": "$day", "active_users": {"$sum": 1}}},
+        {"$merge": {"into": DAYS, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}}
+    ])
+
+STEPS = [
+    ("classify", classify_legacy_messages),
+    ("intents", rollup_intents),
+    ("lookups", rollup_lookups),
+    ("sessions", rollup_sessions),
+    ("user_state", rollup_user_state),
+    ("active_users", rollup_active_users),
+]
+
+def run():
+    """Fold the messages written since the last watermark into the rollups"""
+    state = state_collection.find_one({"_id": STATE_ID}) or {}
+    pending = state.get("pending")
+    if pending is None:
+        # Start a new window; it is recorded first so an interrupted run resumes it
+        # instead of counting any of its messages twice
+        start = state.get("watermark") or datetime.now() - timedelta(days=ANALYTICS_BACKFILL_DAYS)
+        end = datetime.now() - timedelta(seconds=ANALYTICS_LAG_SECONDS)
+        if end <= start:
+            print("No new messages to process")
+            return True
+        pending = {"start": start, "end": end, "done": []}
+        state_collection.update_one({"_id": STATE_ID}, {"$set": {"pending": pending}}, upsert=True)
+    else:
+        print(f"Resuming interrupted run for {pending['start']} - {pending['end']}")
+
+    window = {"timestamp": {"$gt": pending["start"], "$lte": pending["end"]}}
+    for name, step in STEPS:
+        if name in pending["done"]:
+            continue
+        step(window)
+        state_collection.update_one({"_id": STATE_ID}, {"$push": {"pending.done": name}})
+        print(f"  {name}: done")
+
+    state_collection.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"watermark": pending["end"], "updated_at": datetime.now()}, "$unset": {"pending": ""}}
+    )
+    print(f"Analytics updated through {pending['end']}")
+    return True
+
+def read_stats(days=30):
+    """Usage statistics for the last `days` days, read from the rollups only"""
+    since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    daily = []
+    totals = {"turns": 0, "sessions": 0, "lookups": 0, "lookups_ok": 0}
+    for doc in days_collection.find({"_id": {"$gte": since}}).sort("_id", 1):
+        day = {
+            "day": doc["_id"],
+            "active_users": doc.get("active_users", 0),
+            "turns": doc.get("turns", 0),
+            "sessions": doc.get("sessions", 0),
+            "lookups": doc.get("lookups", 0),
+            "lookups_ok": doc.get("lookups_ok", 0),
+        }
+        for key in totals:
+            totals[key] += day[key]
+        daily.append(day)
+
+    intents = {}
+    for doc in intents_collection.find({"day": {"$gte": since}}, {"intent": 1, "count": 1}):
+        intents[doc["intent"]] = intents.get(doc["intent"], 0) + doc["count"]
+
+    state = state_collection.find_one({"_id": STATE_ID}, {"watermark": 1}) or {}
+    watermark = state.get("watermark")
+    return {
+        "days": days,
+        "updated_through": watermark.isoformat() if watermark else None,
+        "daily": daily,
+        "intent_mix": intents,
+        "turns_per_session": round(totals["turns"] / totals["sessions"], 2) if totals["sessions"] else None,
+        "lookup_success_rate": round(totals["lookups_ok"] / totals["lookups"], 3) if totals["lookups"] else None,
+        "average_daily_active_users": round(sum(day["active_users"] for day in daily) / len(daily), 1) if daily else 0,
+    }
+
+if __name__ == "__main__":
+    run()
@@ -7,66 +7,188 @@ when the primary methods fail.
 
 import os
 import json
-import requests
 import re
+import threading
+import time
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+import telemetry
+from lookup_cache import fallback_cache
 
 load_dotenv()
 
+WIKIPEDIA_API_URL = os.environ.get("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+HEALTH_GOV_API_URL = os.environ.get("HEALTH_GOV_API_URL", "https://health.gov/myhealthfinder/api/v3/topicsearch.json")
+
+# Total time (in seconds) FallbackAPI may spend racing its providers
+FALLBACK_TIME_BUDGET = float(os.environ.get("FALLBACK_TIME_BUDGET", "6"))
+
+# Number of resolved Wikipedia page titles to remember
+WIKIPEDIA_TITLE_CACHE_SIZE = int(os.environ.get("WIKIPEDIA_TITLE_CACHE_SIZE", "512"))
+
+# Shared HTTP session so provider calls reuse keep-alive connections (see _http_session)
+_http = None
+_http_lock = threading.Lock()
+
+# Worker pool used to race providers against each other
+FALLBACK_POOL_SIZE = 8
+_executor = ThreadPoolExecutor(max_workers=FALLBACK_POOL_SIZE, thread_name_prefix="fallback-api")
+telemetry.set_pool_size("fallback_api", FALLBACK_POOL_SIZE)
+
+# Maps a normalized search term to the Wikipedia page title it resolved to
+_wikipedia_titles = OrderedDict()
+_wikipedia_titles_lock = threading.Lock()
+
 class FallbackAPI:
     """Class to handle alternative API methods for retrieving medical information"""
     
     @staticmethod
-    def get_disease_info(disease_name):
+    def providers():
+        """Providers in priority order (best source first)"""
+        return [
+            # Wikipedia is good for general disease information
+            FallbackAPI._try_wikipedia_api,
+            FallbackAPI._try_health_gov_api,
+        ]
+    
+    @staticmethod
+    def get_disease_info(disease_name, budget=None):
         """
         Try alternative APIs to get disease information.
+        
+        All providers are queried concurrently. The result of the highest
+        priority provider that succeeds within `budget` seconds is returned.
         Returns (info_text, success_bool)
         """
-        # Try multiple methods in sequence until one works
+        cached_info = fallback_cache.get(disease_name)
+        if cached_info is not None:
+            return cached_info, True
+        
+        if budget is None:
+            budget = FALLBACK_TIME_BUDGET
+        if budget <= 0:
+            return None, False
         
-        # Try Wikipedia API first (good for general disease information)
-        wiki_info = FallbackAPI._try_wikipedia_api(disease_name)
-        if wiki_info:
-            return wiki_info, True
+        deadline = time.monotonic() + budget
+        futures = {}
+        for priority, provider in enumerate(FallbackAPI.providers()):
+            # Run in a copy of the caller's context so provider spans join the request trace
+            context = contextvars.copy_context()
+            future = _executor.submit(context.run, FallbackAPI._run_provider, provider, disease_name, budget)
+            futures[future] = priority
+        
+        results = {}
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Fallback provider error: {str(e)}")
+                    results[futures[future]] = None
             
-        # Try Health.gov API
-        health_gov_info = FallbackAPI._try_health_gov_api(disease_name)
-        if health_gov_info:
-            return health_gov_info, True
+            # Stop as soon as no higher-priority provider is still running
+            successful = [priority for priority, info in results.items() if info]
+            if successful:
+                best = min(successful)
+                if all(futures[future] > best for future in pending):
+                    fallback_cache.set(disease_name, results[best])
+                    return results[best], True
+        
+        # Budget exhausted: take the best result that did arrive in time
+        successful = [priority for priority, info in results.items() if info]
+        if successful:
+            fallback_cache.set(disease_name, results[min(successful)])
+            return results[min(successful)], True
         
         # Return failure if all methods fail
         return None, False
     
     @staticmethod
-    def _try_wikipedia_api(disease_name):
+    def _http_session():
+        """Create the shared requests Session on first use, keeping the import off the startup path"""
+        global _http
+        if _http is None:
+            # Racing providers ask for it at once; only one of them may create it
+            with _http_lock:
+                if _http is None:
+                    import requests
+                    _http = requests.Session()
+        return _http
+    
+    @staticmethod
+    def _run_provider(provider, disease_name, timeout):
+        """Run one provider on the worker pool"""
+        with telemetry.pool_slot("fallback_api"):
+            return provider(disease_name, timeout)
+    
+    @staticmethod
+    def _resolve_cached_title(term):
+        """Return the cached Wikipedia title for a search term, if any"""
+        with _wikipedia_titles_lock:
+            title = _wikipedia_titles.get(term)
+            if title is not None:
+                _wikipedia_titles.move_to_end(term)
+        telemetry.record_cache("wikipedia_titles", title is not None)
+        return title
+    
+    @staticmethod
+    def _remember_title(term, title):
+        """Cache a search term -> Wikipedia title resolution"""
+        with _wikipedia_titles_lock:
+            _wikipedia_titles[term] = title
+            _wikipedia_titles.move_to_end(term)
+            while len(_wikipedia_titles) > WIKIPEDIA_TITLE_CACHE_SIZE:
+                _wikipedia_titles.popitem(last=False)
+    
+    @staticmethod
+    def _try_wikipedia_api(disease_name, timeout=5):
         """Try to get information from Wikipedia API"""
         try:
             # Clean the disease name for the API
-            clean_term = disease_name.strip().lower().replace(" ", "_")
+            clean_term = disease_name.strip().lower()
             
-            # First get the proper page title
-            url = f"https://en.wikipedia.org/w/api.php?action=query&list=search&srsearch={clean_term}&format=json"
-            response = requests.get(url, timeout=5)
-            data = response.json()
+            params = {
+                "action": "query",
+                "prop": "extracts",
+                "exintro": 1,
+                "explaintext": 1,
+                "redirects": 1,
+                "format": "json",
+            }
+            cached_title = FallbackAPI._resolve_cached_title(clean_term)
+            if cached_title:
+                # Already know the page, fetch its extract directly
+                params["titles"] = cached_title
+            else:
+                # Search and fetch the extract of the top hit in one round trip
+                params.update({
+                    "generator": "search",
+                    "gsrsearch": clean_term,
+                    "gsrlimit": 1,
+                })
             
-            if "query" in data and "search" in data["query"] and len(data["query"]["search"]) > 0:
-                # Get the proper page title
-                page_title = data["query"]["search"][0]["title"]
-                
-                # Now get the page extract
-                extract_url = f"https://en.wikipedia.org/w/api.php?action=query&prop=extracts&exintro&titles={page_title}&format=json&explaintext=1"
-                extract_response = requests.get(extract_url, timeout=5)
-                extract_data = extract_response.json()
-                
-                # Extract the page content
-                if "query" in extract_data and "pages" in extract_data["query"]:
-                    pages = extract_data["query"]["pages"]
-                    page_id = next(iter(pages))
-                    if "extract" in pages[page_id]:
-                        extract = pages[page_id]["extract"]
-                        
-                        # Format as markdown
-                        formatted_info = f"""## Information About {disease_name.title()}
+            with telemetry.span("wikipedia", kind="upstream"):
+                response = FallbackAPI._http_session().get(WIKIPEDIA_API_URL, params=params, timeout=timeout)
+                data = response.json()
+            
+            if "query" in data and "pages" in data["query"]:
+                pages = data["query"]["pages"]
+                # Generator results carry their search rank in "index"
+                page = min(pages.values(), key=lambda p: p.get("index", 0))
+                if "extract" in page and page["extract"]:
+                    extract = page["extract"]
+                    if not cached_title and page.get("title"):
+                        FallbackAPI._remember_title(clean_term, page["title"])
+                    
+                    # Format as markdown
+                    formatted_info = f"""## Information About {disease_name.title()}
 
 ### What is {disease_name.title()}?
 {extract[:300]}...
@@ -76,7 +198,7 @@ This information is based on general medical knowledge. For more detailed or per
 
 *Would you like to set a reminder for any medications related to this condition? Please specify which medication.*
 """
-                        return formatted_info
+                    return formatted_info
             
             return None
         except Exception as e:
@@ -84,13 +206,13 @@ This information is based on general medical knowledge. For more detailed or per
             return None
     
     @staticmethod
-    def _try_health_gov_api(disease_name):
+    def _try_health_gov_api(disease_name, timeout=5):
         """Try to get information from Health.gov API"""
         try:
             # Use Health.gov API to search for content
-            url = f"https://health.gov/myhealthfinder/api/v3/topicsearch.json?keyword={disease_name}"
-            response = requests.get(url, timeout=5)
-            data = response.json()
+            with telemetry.span("health_gov", kind="upstream"):
+                response = FallbackAPI._http_session().get(HEALTH_GOV_API_URL, params={"keyword": disease_name}, timeout=timeout)
+                data = response.json()
             
             if "Result" in data and "Resources" in data["Result"] and "Resource" in data["Result"]["Resources"]:
                 resources = data["Result"]["Resources"]["Resource"]
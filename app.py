@@ -1,18 +1,39 @@
-from flask import Flask, request, jsonify, render_template, session as flask_session, redirect, url_for, flash
-import requests
-from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, render_template, session as flask_session, redirect, url_for, flash, g, Response, send_from_directory
+from datetime import datetime, timedelta, timezone
 import re
 import time
 import json
 import os
+import io
+import mimetypes
+import csv
 import uuid
-import google.generativeai as genai
-import markdown
-import pymongo
-from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+import hmac
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from dotenv import load_dotenv
+import deadlines
+from deadlines import DeadlineExceeded
+import telemetry
+import resources
+import admission
+import analytics
+import response_store
+import retention
+import export
+import search_index
+import profiler
+import gemini_client
+import passwords
+import schedule
+import autocomplete
+import interactions
+import assets
+import compression
+from lookup_cache import drug_info_cache, disease_info_cache
+from semantic_cache import semantic_cache
+from singleflight import SingleFlight
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,29 +42,25 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "medication-reminder-secret-key")
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 
-# MongoDB Configuration
-MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/medassist")
-client = pymongo.MongoClient(MONGODB_URI)
-db = client.get_database()
-users_collection = db.users
-sessions_collection = db.sessions
-medications_collection = db.medications
-chat_history_collection = db.chat_history
+# MongoDB collections; the client behind them is created per process (see resources.py)
+users_collection = resources.collection("users")
+sessions_collection = resources.collection("sessions")
+medications_collection = resources.collection("medications")
+chat_history_collection = resources.collection("chat_history")
 
-# Configure Gemini API
-try:
-    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "your-api-key-here")
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-2.0-flash')  # Using gemini-2.0-flash
-    GEMINI_ENABLED = True
-    print(f"Gemini API configured successfully with model: gemini-2.0-flash")
-except Exception as e:
-    print(f"Warning: Gemini API configuration failed: {str(e)}")
-    GEMINI_ENABLED = False
+# Upstream endpoints (overridable so the app can run against local stand-ins)
+OPENFDA_API_URL = os.environ.get("OPENFDA_API_URL", "https://api.fda.gov/drug/label.json")
+
+# Gemini is configured lazily in each worker process (see resources.gemini_model)
+GEMINI_ENABLED = os.environ.get("GEMINI_ENABLED", "true").lower() != "false"
+
+# Per-call timeouts (in seconds); each call also gets no more than the request's remaining budget
+OPENFDA_TIMEOUT = float(os.environ.get("OPENFDA_TIMEOUT", "5"))
+WEB_SEARCH_TIMEOUT = float(os.environ.get("WEB_SEARCH_TIMEOUT", "5"))
 
 # Import fallback mechanisms
 try:
-    from api_fallbacks import FallbackAPI, get_backup_disease_info
+    from api_fallbacks import FallbackAPI, get_backup_disease_info, FALLBACK_TIME_BUDGET
     FALLBACKS_ENABLED = True
 except ImportError:
     print("Warning: API fallbacks module not found. Some backup features will be disabled.")
@@ -112,6 +129,26 @@ DISEASE_MEDICATIONS = {
 # Use DISEASE_MEDICATIONS for consistency
 CONDITION_MEDICATIONS = DISEASE_MEDICATIONS
 
+# Medication names suggested as the user types (see autocomplete.py)
+medication_autocomplete = autocomplete.Autocomplete(
+    extra_names=[med["name"] for meds in DISEASE_MEDICATIONS.values() for med in meds]
+)
+
+# Coalesce concurrent identical lookups so only one request per key goes upstream
+drug_info_flight = SingleFlight("drug_info", drug_info_cache)
+disease_info_flight = SingleFlight("disease_info", disease_info_cache)
+
+# Bulk medication import limits
+BULK_IMPORT_MAX_ITEMS = int(os.environ.get("BULK_IMPORT_MAX_ITEMS", "200"))
+BULK_ENRICH_CONCURRENCY = int(os.environ.get("BULK_ENRICH_CONCURRENCY", "8"))
+
+# Fetches drug info for the distinct names of a bulk import concurrently
+enrichment_executor = ThreadPoolExecutor(max_workers=BULK_ENRICH_CONCURRENCY, thread_name_prefix="drug-enrich")
+telemetry.set_pool_size("drug_enrich", BULK_ENRICH_CONCURRENCY)
+
+# A dose reported this many minutes before it is due still counts as that dose
+REMINDER_EARLY_MINUTES = int(os.environ.get("REMINDER_EARLY_MINUTES", "15"))
+
 # Login required decorator
 def login_required(f):
     @wraps(f)
@@ -121,6 +158,106 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Admin required decorator; admin rights are the is_admin flag on the user
+# document, granted with `python db_setup.py grant-admin <email>`, never the
+# email a user signed up with
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in flask_session:
+            return redirect(url_for('login'))
+        user = users_collection.find_one({"user_id": flask_session['user_id']}, {"is_admin": 1})
+        if not user or user.get("is_admin") is not True:
+            return jsonify(success=False, message="Admin access required"), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Give every request a latency budget that downstream calls draw from, and trace it
+@app.before_request
+def start_request_tracking():
+    deadlines.start()
+    g.request_span = telemetry.start_request_span(request.endpoint or "unmatched")
+    g.profile = profiler.start(request.url_rule.rule if request.url_rule else "unmatched", request.headers)
+
+# Dose times are wall-clock times in the user's timezone, which the browser
+# reports with each reminder and chat request (the X-Timezone header)
+@app.before_request
+def remember_timezone():
+    reported = request.headers.get("X-Timezone")
+    if not reported or 'user_id' not in flask_session or reported == flask_session.get('timezone'):
+        return
+    if schedule.valid_timezone(reported):
+        flask_session['timezone'] = reported
+        users_collection.update_one({"user_id": flask_session['user_id']}, {"$set": {"timezone": reported}})
+
+def user_timezone():
+    """IANA timezone of the current user, UTC until their browser has reported one"""
+    return flask_session.get('timezone') or "UTC"
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.after_request
+def compress_response(response):
+    return compression.compress(response, request.accept_encodings)
+
+@app.teardown_request
+def finish_request_tracking(exc=None):
+    deadlines.clear()
+    decision = g.pop("admission", None)
+    if decision:
+        admission.release(decision)
+    handle = g.pop("request_span", None)
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    profile = g.pop("profile", None)
+    if profile:
+        profiler.finish(profile, route, handle[0].attrs.get("intent") if handle else None)
+    if handle:
+        telemetry.finish_request_span(handle, route, request.method, g.get("response_status", 500))
+
+def admit_request(user_id, intent):
+    """Run the admission check for this request; the decision is released when the request ends"""
+    decision = admission.check(user_id, intent)
+    if decision.allowed:
+        g.admission = decision
+    return decision
+
+def admission_rejected_response(decision, message):
+    """429 (user over budget) or 503 (app overloaded) with a Retry-After header"""
+    retry_after = max(1, int(decision.retry_after + 0.999))
+    response = jsonify(success=False, reply=message, message=message, retry_after=retry_after)
+    response.status_code = 429 if decision.reason == "rate_limited" else 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+def admission_message(decision, intent):
+    """Friendly chat reply for a request that was not admitted"""
+    if decision.reason == "overloaded":
+        return ("I'm handling a lot of medication and condition lookups right now. "
+                "Please ask again in a moment; your reminders still work as usual.")
+    retry_after = max(1, int(decision.retry_after + 0.999))
+    if admission.tier_for(intent) == "expensive":
+        return (f"You've asked about quite a few medications and conditions in a short time. "
+                f"Please try again in about {retry_after} seconds; you can still view and set reminders meanwhile.")
+    return f"You're sending messages a little too quickly. Please try again in about {retry_after} seconds."
+
+def query_openfda(field, med_name, deadline):
+    """Search the OpenFDA drug label endpoint on a single openfda field"""
+    import requests  # Deferred to keep cold starts fast
+    with telemetry.span("openfda", kind="upstream", field=field):
+        response = requests.get(
+            OPENFDA_API_URL,
+            params={"search": f"openfda.{field}:({med_name})", "limit": 1},
+            timeout=deadline.timeout(OPENFDA_TIMEOUT)
+        )
+        return response.json()
+
+def generate_with_gemini(prompt):
+    """Call Gemini through the shared client layer (concurrency pool, quota governor, retries)"""
+    return gemini_client.generate(prompt)
+
 # Function to fetch drug info from OpenFDA API with improved error handling
 def fetch_drug_info(med_name):
     # First check if this medication is for a common condition we have predefined info for
@@ -128,29 +265,35 @@ def fetch_drug_info(med_name):
     if condition_info:
         return condition_info
     
+    # Then the per-process and shared lookup caches
+    cached_info = drug_info_cache.get(med_name)
+    if cached_info is not None:
+        return cached_info
+    
+    # No reworded-name matching here: look-alike drug names are different drugs
+    return drug_info_flight.do(med_name, lambda: load_drug_info(med_name))
+
+def load_drug_info(med_name):
+    """Fetch a medication from upstream and cache it if the lookup succeeded"""
+    info = fetch_drug_info_from_upstream(med_name)
+    if not info.startswith("❌"):
+        drug_info_cache.set(med_name, info)
+    return info
+
+def fetch_drug_info_from_upstream(med_name):
+    """Look a medication up in OpenFDA, falling back to Gemini"""
+    deadline = deadlines.current()
     try:
         # Try generic name search first
-        response = requests.get(
-            "https://api.fda.gov/drug/label.json",
-            params={"search": f"openfda.generic_name:({med_name})", "limit": 1}
-        )
-        data = response.json()
+        data = query_openfda("generic_name", med_name, deadline)
         
         # If no results, try brand name search
         if "results" not in data or len(data.get("results", [])) == 0:
-            response = requests.get(
-                "https://api.fda.gov/drug/label.json",
-                params={"search": f"openfda.brand_name:({med_name})", "limit": 1}
-            )
-            data = response.json()
+            data = query_openfda("brand_name", med_name, deadline)
         
         # If still no results, try substance name search
         if "results" not in data or len(data.get("results", [])) == 0:
-            response = requests.get(
-                "https://api.fda.gov/drug/label.json",
-                params={"search": f"openfda.substance_name:({med_name})", "limit": 1}
-            )
-            data = response.json()
+            data = query_openfda("substance_name", med_name, deadline)
             
         if "results" in data and len(data.get("results", [])) > 0:
             result = data["results"][0]
@@ -179,11 +322,44 @@ def fetch_drug_info(med_name):
         else:
             # If no data found in OpenFDA, use Gemini to fill in basic information
             return use_gemini_for_basic_info(med_name)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"OpenFDA API error: {str(e)}")
         # Fallback to Gemini if OpenFDA fails
         return use_gemini_for_basic_info(med_name)
 
+def fetch_reminder_drug_info(med_name, admitted=False):
+    """Fetch drug info to store with a reminder; the reminder is saved without it while lookups are
+    being shed or if the request budget runs out. admitted: the request already holds an in-flight slot"""
+    cached_info = get_condition_medication_info(med_name) or drug_info_cache.get(med_name)
+    if cached_info is not None:
+        return cached_info
+    # Setting a reminder is a cheap request, so its upstream lookup needs a slot of its own
+    decision = None if admitted else admission.check_upstream()
+    if decision is not None and not decision.allowed:
+        return None
+    try:
+        info = fetch_drug_info(med_name)
+    except DeadlineExceeded:
+        print(f"Latency budget exhausted while fetching info for {med_name}")
+        return None
+    finally:
+        if decision is not None:
+            admission.release(decision)
+    # Not worth keeping with the reminder either
+    return None if info == lookup_too_slow_message(med_name) else info
+
+def lookup_topic(user_msg):
+    """The medication or condition a "tell me about ..." / "what is ..." message asks about"""
+    return user_msg.lower().replace("tell me about ", "").replace("what is ", "").strip()
+
+def is_cached_lookup(intent, topic):
+    """Whether a disease or drug lookup can be answered from the caches, without going upstream"""
+    if intent == "drug_info":
+        return get_condition_medication_info(topic) is not None or drug_info_cache.get(topic) is not None
+    return disease_info_cache.get(topic) is not None
+
 def get_condition_medication_info(med_name):
     """Check if the user is asking about a medication for a specific condition"""
     med_name_lower = med_name.lower()
@@ -224,6 +400,10 @@ Here are the recommended medications for {condition}:
     
     return None
 
+def lookup_too_slow_message(topic):
+    """Reply for a lookup that ran out of the request's latency budget (starts with ❌, so it is never cached)"""
+    return f"❌ **Looking up {topic} took too long.** Please try again in a moment."
+
 def use_gemini_for_basic_info(med_name):
     """Use Gemini AI to provide basic information when OpenFDA doesn't have data"""
     if not GEMINI_ENABLED:
@@ -242,7 +422,7 @@ def use_gemini_for_basic_info(med_name):
         Format the response in clear Markdown with appropriate headers.
         """
         
-        response = model.generate_content(prompt)
+        response = generate_with_gemini(prompt)
         
         if response and hasattr(response, 'text'):
             if "not appear to be a standard medication" in response.text:
@@ -256,25 +436,50 @@ def use_gemini_for_basic_info(med_name):
 """
         else:
             return f"❌ **No information found for {med_name} in our database.**"
+    except DeadlineExceeded:
+        # Not the same as Gemini knowing nothing about it: asking again may well work
+        print(f"Latency budget exhausted while asking Gemini about {med_name}")
+        return lookup_too_slow_message(med_name)
     except Exception as e:
         print(f"Gemini API error for basic info: {str(e)}")
         return f"❌ **No information found for {med_name} in our database.**"
 
 # Function to get information about a disease using multiple methods
 def get_disease_info(disease_name):
+    """Get information about a disease, from the lookup caches if possible"""
+    cached_info = disease_info_cache.get(disease_name)
+    if cached_info is not None:
+        disease_info, canonical_disease = cached_info
+        return disease_info, canonical_disease
+    
+    # Then the same question in other words we already have an answer for
+    similar = semantic_cache.lookup("disease_info", disease_name)
+    if similar:
+        cached_info = disease_info_cache.get(similar)
+        if cached_info is not None:
+            disease_info, canonical_disease = cached_info
+            return disease_info, canonical_disease
+    
+    return disease_info_flight.do(disease_name, lambda: load_disease_info(disease_name))
+
+def load_disease_info(disease_name):
+    """Fetch a disease from upstream and cache it if the lookup succeeded"""
+    disease_info, canonical_disease = get_disease_info_from_upstream(disease_name)
+    # Only successful lookups are cached; failures may be transient
+    if canonical_disease:
+        disease_info_cache.set(disease_name, [disease_info, canonical_disease])
+        semantic_cache.add("disease_info", disease_name)
+    return disease_info, canonical_disease
+
+def get_disease_info_from_upstream(disease_name):
     """Get information about a disease using multiple fallback methods"""
     if not GEMINI_ENABLED and not FALLBACKS_ENABLED:
         return f"I don't have information about {disease_name} in my database.", None
     
-    # Check if we have predefined medications for this disease
-    disease_meds = None
-    canonical_disease = None
+    deadline = deadlines.current()
     
-    for disease, medications in DISEASE_MEDICATIONS.items():
-        if disease.lower() in disease_name.lower() or disease_name.lower() in disease.lower():
-            disease_meds = medications
-            canonical_disease = disease  # Use our canonical name
-            break
+    # Check if we have predefined medications for this disease
+    canonical_disease, disease_meds = find_disease_medications(disease_name)
     
     # Try using Gemini first if available
     if GEMINI_ENABLED:
@@ -293,7 +498,7 @@ def get_disease_info(disease_name):
             If this is not a recognized medical condition, please say "This does not appear to be a standard medical condition."
             """
             
-            response = model.generate_content(prompt)
+            response = generate_with_gemini(prompt)
             
             if response and hasattr(response, 'text'):
                 if "not appear to be a standard medical condition" in response.text:
@@ -305,24 +510,21 @@ def get_disease_info(disease_name):
 """
                     # Add medication info if available
                     if disease_meds:
-                        disease_info += "\n## Recommended Medications\n\n"
-                        for med in disease_meds:
-                            disease_info += f"### {med['name']}\n"
-                            disease_info += f"**Purpose**: {med['purpose']}\n"
-                            disease_info += f"**Dosage**: {med['dosage']}\n"
-                            disease_info += f"**Warning**: {med['warning']}\n\n"
-                        
-                        disease_info += "*Would you like me to set a reminder for any of these medications? Please specify which medication.*"
+                        disease_info += format_recommended_medications(disease_meds)
                     else:
                         disease_info += "\n*Would you like to set a reminder for any medications related to this condition? Please specify which medication.*"
                     
                     return disease_info, canonical_disease or disease_name.lower()
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Gemini API error: {str(e)}")
     
     # Try fallback methods
     if FALLBACKS_ENABLED:
-        fallback_info, success = FallbackAPI.get_disease_info(disease_name)
+        fallback_info, success = FallbackAPI.get_disease_info(
+            disease_name, budget=deadline.timeout(FALLBACK_TIME_BUDGET)
+        )
         if success:
             return fallback_info, disease_name.lower()
 
@@ -331,20 +533,57 @@ def get_disease_info(disease_name):
         web_info = search_web_for_disease_info(disease_name)
         if web_info:
             return web_info, disease_name.lower()
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Web search error: {str(e)}")
 
     # If we reached here, all methods failed
     return f"I couldn't find specific information about {disease_name}. Please check the spelling or try a different condition.", None
 
+def find_disease_medications(disease_name):
+    """Return (canonical_disease, medications) for a disease we have predefined medications for"""
+    for disease, medications in DISEASE_MEDICATIONS.items():
+        if disease.lower() in disease_name.lower() or disease_name.lower() in disease.lower():
+            return disease, medications  # Use our canonical name
+    return None, None
+
+def format_recommended_medications(disease_meds):
+    """Format the predefined medications for a disease as markdown"""
+    section = "\n## Recommended Medications\n\n"
+    for med in disease_meds:
+        section += f"### {med['name']}\n"
+        section += f"**Purpose**: {med['purpose']}\n"
+        section += f"**Dosage**: {med['dosage']}\n"
+        section += f"**Warning**: {med['warning']}\n\n"
+    
+    section += "*Would you like me to set a reminder for any of these medications? Please specify which medication.*"
+    return section
+
+def get_partial_disease_info(disease_name):
+    """Best answer we can give from local data when the request budget runs out"""
+    canonical_disease, disease_meds = find_disease_medications(disease_name)
+    if disease_meds:
+        disease_info = f"""## Information About {disease_name.title()}
+
+I'm still fetching a full description of {disease_name} - please ask again in a moment for the details.
+"""
+        return disease_info + format_recommended_medications(disease_meds), canonical_disease
+    
+    return f"I'm still fetching information about **{disease_name}**. Please ask again in a moment.", None
+
 def search_web_for_disease_info(disease_name):
     """Search the web for disease information as a last resort"""
     try:
         from googlesearch import search
         query = f"{disease_name} disease information site:wikipedia.org"
-        results = list(search(query, num_results=1))
+        timeout = deadlines.current().timeout(WEB_SEARCH_TIMEOUT)
+        with telemetry.span("googlesearch", kind="upstream"):
+            results = list(search(query, num_results=1, timeout=timeout))
         if results:
             return f"## Information About {disease_name.title()}\n\nI couldn't find detailed information in my database, but you can learn more here: [Learn More]({results[0]})", None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error during web search: {str(e)}")
     return None
@@ -381,6 +620,20 @@ def is_likely_disease(text):
     
     return False
 
+def detect_intent(user_msg, step, context):
+    """Classify a chat message into the intent chat() handles it with"""
+    msg = user_msg.lower()
+    if any(phrase in msg for phrase in ["view all", "all medication", "all reminder", "show reminder", "see my"]):
+        return "view_reminders"
+    if msg == "yes" and context.get("awaiting_reminder_confirmation"):
+        return "reminder_confirmation"
+    if "set a new medication reminder" in msg or "remind me" in msg or (step == 2 and context.get("awaiting_medication_name")) or (step == 3 and context.get("medication_name")):
+        return "set_reminder"
+    if msg.startswith("tell me about ") or msg.startswith("what is "):
+        topic = lookup_topic(msg)
+        return "disease_info" if is_likely_disease(topic) else "drug_info"
+    return "fallback"
+
 # Helper function to validate medication names
 def is_valid_medication_name(name):
     """Checks if the provided string is likely a valid medication name."""
@@ -421,6 +674,12 @@ def is_valid_medication_name(name):
     
     return True
 
+def medication_schedule(medication):
+    """A medication's recurrence rule; reminders saved before schedules were stored only have a time"""
+    if medication.get("schedule"):
+        return medication["schedule"]
+    return schedule.parse_time_field(medication.get("time"), tz=user_timezone())
+
 # Add the database helper functions that were omitted
 def get_or_create_user(user_id, data=None):
     """Get or create a user in the database"""
@@ -456,7 +715,7 @@ def create_user(name, email, password):
     user = {
         "name": name,
         "email": email,
-        "password_hash": generate_password_hash(password),
+        "password_hash": passwords.hash_password(password),
         "user_id": user_id,
         "created_at": datetime.now(),
         "conditions": [],
@@ -481,27 +740,43 @@ def get_user_medications(user_id):
     return list(medications_collection.find({"user_id": user_id}))
 
 def save_medication(user_id, medication):
-    """Save a medication to the database"""
+    """Save a medication to the database; returns its interaction warnings with the user's other medications"""
     medication["user_id"] = user_id
     
-    # Check if medication already exists
-    existing = medications_collection.find_one({
-        "user_id": user_id,
-        "name": medication["name"]
-    })
+    # One read of the user's medication names finds an existing entry and the drugs to check against
+    others = [med["name"] for med in medications_collection.find({"user_id": user_id}, {"name": 1}) if med.get("name")]
     
-    if existing:
+    if medication["name"] in others:
         # Update existing medication
         medications_collection.update_one(
-            {"_id": existing["_id"]},
+            {"user_id": user_id, "name": medication["name"]},
             {"$set": medication}
         )
-        return existing["_id"]
     else:
         # Insert new medication
         medication["created_at"] = datetime.now()
-        result = medications_collection.insert_one(medication)
-        return result.inserted_id
+        medications_collection.insert_one(medication)
+    
+    return interactions.check(medication["name"], others)
+
+def save_medications_bulk(user_id, medications):
+    """Upsert many medications for a user with a single bulk_write on the (user_id, name) index"""
+    from pymongo import UpdateOne
+    now = datetime.now()
+    operations = []
+    for medication in medications:
+        fields = {key: value for key, value in medication.items() if value is not None}
+        fields["user_id"] = user_id
+        operations.append(UpdateOne(
+            {"user_id": user_id, "name": medication["name"]},
+            {"$set": fields, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        ))
+    
+    if not operations:
+        return 0, 0
+    result = medications_collection.bulk_write(operations, ordered=False)
+    return result.upserted_count, result.modified_count
 
 def delete_medication(user_id, medication_id):
     """Delete a medication from the database"""
@@ -511,15 +786,24 @@ def delete_medication(user_id, medication_id):
     })
     return result.deleted_count > 0
 
-def save_chat_message(user_id, role, content):
-    """Save a chat message to the database"""
+def save_chat_message(user_id, role, content, intent=None, lookup_ok=None):
+    """Save a chat message to the database, with the turn's intent for analytics"""
     message = {
         "user_id": user_id,
         "role": role,
-        "content": content,
         "timestamp": datetime.now()
     }
+    # Large bot replies are stored once and referenced (see response_store.py)
+    if response_store.should_store(role, content):
+        message["content_ref"] = response_store.store(content)
+    else:
+        message["content"] = content
+    if intent:
+        message["intent"] = intent
+    if lookup_ok is not None:
+        message["lookup_ok"] = lookup_ok
     chat_history_collection.insert_one(message)
+    search_index.add(user_id, message["_id"], role, content, message["timestamp"])
 
 def get_chat_history(user_id, limit=50):
     """Get chat history for a user, converting timestamps to strings."""
@@ -534,7 +818,7 @@ def get_chat_history(user_id, limit=50):
         if isinstance(msg.get('timestamp'), datetime):
             msg['timestamp'] = msg['timestamp'].isoformat()
         history_list.append(msg)
-    return history_list
+    return response_store.resolve(history_list)
 
 # Add route definitions for app
 @app.route('/onboarding')
@@ -556,18 +840,36 @@ def login():
         
         user = get_user_by_email(email)
         
-        if user and check_password_hash(user['password_hash'], password):
+        try:
+            valid = bool(user) and passwords.verify_password(user['password_hash'], password)
+        except DeadlineExceeded:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        
+        if valid:
             # Update last login time
             users_collection.update_one(
                 {"_id": user["_id"]},
                 {"$set": {"last_login": datetime.now()}}
             )
             
+            # Upgrade hashes made with older parameters while the password is at hand
+            if passwords.needs_rehash(user['password_hash']):
+                try:
+                    users_collection.update_one(
+                        {"_id": user["_id"], "password_hash": user['password_hash']},
+                        {"$set": {"password_hash": passwords.hash_password(password)}}
+                    )
+                except DeadlineExceeded:
+                    pass
+            
             # Set session data
             flask_session.clear()
             flask_session['user_id'] = user['user_id']
             flask_session['name'] = user['name']
             flask_session['email'] = user['email']
+            if user.get('timezone'):
+                flask_session['timezone'] = user['timezone']
             flask_session.permanent = True
             
             flash('Login successful!', 'success')
@@ -601,7 +903,11 @@ def register():
             return render_template('register.html')
         
         # Create new user
-        user = create_user(name, email, password)
+        try:
+            user = create_user(name, email, password)
+        except DeadlineExceeded:
+            flash('We are handling a lot of sign-ups right now. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503
         
         # Log the user in
         flask_session['user_id'] = user['user_id']
@@ -639,6 +945,30 @@ def index():
 def reminders_page():
     return render_template("reminders.html")
 
+@app.template_global()
+def asset_url(name):
+    """URL of a file under static/ ("src/index.js"): its fingerprinted build, else the file itself or its CDN copy"""
+    built = assets.built_name(name)
+    if built:
+        return url_for("built_asset", filename=built)
+    return assets.cdn_url(name) or url_for("static", filename=name)
+
+@app.route("/assets/<path:filename>")
+def built_asset(filename):
+    """A built static asset (see assets.py), precompressed if the client accepts it"""
+    path, encoding = assets.precompressed(filename, request.accept_encodings)
+    response = send_from_directory(
+        assets.DIST_DIR, path,
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        max_age=assets.ASSET_MAX_AGE
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    # The name changes with the content, so browsers never need to revalidate
+    response.headers["Cache-Control"] = f"public, max-age={assets.ASSET_MAX_AGE}, immutable"
+    return response
+
 @app.route("/update-profile", methods=["POST"])
 @login_required
 def update_profile():
@@ -705,11 +1035,21 @@ def get_reminders():
     reminders = []
     
     for med in medications:
-        if med.get("time"):
+        rule = medication_schedule(med)
+        if rule:
             reminder = {
                 "id": med["name"].replace(" ", "_").lower(),
                 "name": med["name"],
-                "time": med["time"],
+                "time": med.get("time") or schedule.display_time(rule["times"][0]),
+                "schedule": schedule.describe(rule),
+                # Doses fire in the browser on these wall-clock times and days
+                "times": rule["times"],
+                "weekdays": rule.get("weekdays"),
+                "every_days": rule.get("every_days", 1),
+                "every_hours": rule.get("every_hours"),
+                "start": rule.get("start"),
+                "until": rule.get("until"),
+                "next_due_at": schedule.as_utc(med["next_due_at"]).isoformat() if med.get("next_due_at") else None,
                 "condition": med.get("condition", "general"),
                 "info": med.get("info", "")
             }
@@ -717,6 +1057,88 @@ def get_reminders():
     
     return jsonify(reminders=reminders)
 
+@app.route("/autocomplete-medication", methods=["GET"])
+@login_required
+def autocomplete_medication():
+    """Medication names starting with (a word starting with) ?q=, most used first"""
+    try:
+        limit = int(request.args.get("limit", autocomplete.AUTOCOMPLETE_MAX_RESULTS))
+    except ValueError:
+        return jsonify(success=False, message="limit must be a number"), 400
+    
+    response = jsonify(suggestions=medication_autocomplete.suggest(request.args.get("q", ""), limit))
+    # The vocabulary only changes with a deploy; let the browser reuse answers while the user retypes
+    response.headers["Cache-Control"] = "private, max-age=3600"
+    return response
+
+@app.route("/medication-interactions", methods=["GET"])
+@login_required
+def medication_interactions():
+    """Interaction warnings between all of the current user's medications, most severe first"""
+    user_id = flask_session.get('user_id')
+    names = [med["name"] for med in medications_collection.find({"user_id": user_id}, {"name": 1}) if med.get("name")]
+    return jsonify(warnings=interactions.audit(names))
+
+@app.route("/reminders/next-due", methods=["GET"])
+@login_required
+def next_due_reminders():
+    """The current user's next doses, soonest first, read from the (user_id, next_due_at) index"""
+    user_id = flask_session.get('user_id')
+    try:
+        limit = min(max(int(request.args.get("limit", 5)), 1), 50)
+    except ValueError:
+        return jsonify(success=False, message="limit must be a number"), 400
+    
+    now = datetime.now(timezone.utc)
+    # Courses that have ended have no next dose and are left out
+    medications = medications_collection.find(
+        {"user_id": user_id, "next_due_at": {"$ne": None}},
+        {"name": 1, "next_due_at": 1}
+    ).sort("next_due_at", 1).limit(limit)
+    due = [{
+        "id": med["name"].replace(" ", "_").lower(),
+        "name": med["name"],
+        "next_due_at": schedule.as_utc(med["next_due_at"]).isoformat(),
+        # Not reported as fired since it was due: a missed dose
+        "overdue": schedule.as_utc(med["next_due_at"]) < now,
+    } for med in medications]
+    return jsonify(success=True, due=due)
+
+@app.route("/reminder-fired", methods=["POST"])
+@login_required
+def reminder_fired():
+    """Record that a reminder went off (and whether the dose was taken), moving next_due_at on"""
+    user_id = flask_session.get('user_id')
+    data = request.json
+    
+    if not data or "id" not in data:
+        return jsonify(success=False, message="Invalid request")
+    
+    med_name = data["id"].lower().replace("_", " ")
+    medication = medications_collection.find_one({"user_id": user_id, "name": med_name})
+    rule = medication_schedule(medication) if medication else None
+    if not rule:
+        return jsonify(success=False, message="Medication not found")
+    
+    now = datetime.now(timezone.utc)
+    if data.get("taken"):
+        medications_collection.update_one({"_id": medication["_id"]}, {"$set": {"last_taken": now}})
+    
+    # Only a dose that is due moves the schedule on, so a dose reported by
+    # several tabs, or twice (when it fires, then when taken), counts once.
+    # Reminders saved before schedules were stored have no next_due_at yet.
+    due = schedule.as_utc(medication.get("next_due_at"))
+    if "next_due_at" not in medication or due and due <= now + timedelta(minutes=REMINDER_EARLY_MINUTES):
+        next_due = schedule.next_occurrence(rule, max(now, due or now))
+        # Compare-and-set on the due time read, so concurrent reports advance it once
+        result = medications_collection.update_one(
+            {"_id": medication["_id"], "next_due_at": due},
+            {"$set": {"next_due_at": next_due}}
+        )
+        if result.modified_count:
+            due = next_due
+    return jsonify(success=True, next_due_at=due.isoformat() if due else None)
+
 @app.route("/get-chat-history", methods=["GET"])
 @login_required
 def get_chat_history_route():
@@ -726,6 +1148,57 @@ def get_chat_history_route():
     history = get_chat_history(user_id)
     return jsonify(history=history)
 
+@app.route("/search-chat-history", methods=["GET"])
+@login_required
+def search_chat_history():
+    """Full-text search over the current user's chat history (see search_index.py)"""
+    user_id = flask_session.get('user_id')
+    try:
+        since = datetime.strptime(request.args["from"], "%Y-%m-%d") if request.args.get("from") else None
+        until = datetime.strptime(request.args["to"], "%Y-%m-%d") + timedelta(days=1) if request.args.get("to") else None
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify(success=False, message="from and to must be dates (YYYY-MM-DD) and limit a number"), 400
+    sort = request.args.get("sort", "relevance")
+    if sort not in ("relevance", "recent"):
+        return jsonify(success=False, message="sort must be relevance or recent"), 400
+    
+    try:
+        results = search_index.search(user_id, request.args.get("q", ""), since, until, sort, limit)
+    except search_index.QueryError as e:
+        return jsonify(success=False, message=str(e)), 400
+    except DeadlineExceeded:
+        # The index keeps what it built so far; the next search continues from there
+        return jsonify(success=False, message="Your history is still being indexed. Please try again in a moment."), 503
+    return jsonify(success=True, results=results)
+
+def export_response(user_id, fmt, token=None):
+    """Stream a chat history and reminders export, resuming after `token` if given"""
+    if fmt not in export.FORMATS:
+        return jsonify(success=False, message="format must be ndjson, csv or zip"), 400
+    try:
+        position = export.start(user_id, app.secret_key, token)
+    except export.InvalidCursor as e:
+        return jsonify(success=False, message=str(e)), 400
+    
+    # Generated after the request has finished, so it is not bound by the request's latency budget
+    return Response(
+        export.generate(fmt, user_id, position, app.secret_key),
+        mimetype=export.FORMATS[fmt][0],
+        headers={
+            "Content-Disposition": f"attachment; filename={export.filename(fmt, user_id)}",
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.route("/export-chat-history", methods=["GET"])
+@login_required
+def export_chat_history():
+    """Download the current user's full chat history and reminders (see export.py)"""
+    user_id = flask_session.get('user_id')
+    return export_response(user_id, request.args.get("format", "ndjson"), request.args.get("cursor"))
+
 @app.route("/update-reminder", methods=["POST"])
 @login_required
 def update_reminder():
@@ -743,8 +1216,17 @@ def update_reminder():
     
     # Update fields if provided
     update_data = {}
-    if "time" in data:
-        update_data["time"] = data["time"]
+    if data.get("schedule") or data.get("time"):
+        # A new schedule replaces the rule; a new time moves the existing doses
+        rule = schedule.parse_time_field(data.get("schedule") or data["time"], tz=user_timezone())
+        if not rule:
+            return jsonify(success=False, message="Couldn't understand the time or schedule")
+        if not data.get("schedule"):
+            existing = medications_collection.find_one({"user_id": user_id, "name": med_name})
+            current = medication_schedule(existing) if existing else None
+            if current:
+                rule = schedule.retime(current, rule["times"][0])
+        update_data.update(schedule.fields(rule))
     
     if "name" in data:
         update_data["name"] = data["name"]
@@ -775,18 +1257,103 @@ def delete_reminder():
     else:
         return jsonify(success=False, message="Medication not found")
 
+def read_import_entries():
+    """Read bulk import entries from a JSON body or a CSV upload/body"""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        entries = data.get("medications", data) if isinstance(data, dict) else data
+        return entries if isinstance(entries, list) else None
+    
+    upload = request.files.get("file")
+    text = upload.read().decode("utf-8-sig") if upload else request.get_data(as_text=True)
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    
+    # Use the header row if there is one, otherwise assume name,time,condition
+    header = [column.strip().lower() for column in rows[0]]
+    if "name" in header:
+        rows = rows[1:]
+    else:
+        header = ["name", "time", "condition"]
+    return [dict(zip(header, row)) for row in rows if any(cell.strip() for cell in row)]
+
+@app.route("/import-medications", methods=["POST"])
+@login_required
+def import_medications():
+    """API endpoint to add or update many medication reminders at once"""
+    user_id = flask_session.get('user_id')
+    
+    decision = admit_request(user_id, "bulk_import")
+    if not decision.allowed:
+        return admission_rejected_response(decision, "Too many imports right now. Please try again shortly.")
+    
+    entries = read_import_entries()
+    if entries is None:
+        return jsonify(success=False, message="Expected a list of medications")
+    if len(entries) > BULK_IMPORT_MAX_ITEMS:
+        return jsonify(success=False, message=f"At most {BULK_IMPORT_MAX_ITEMS} medications can be imported at once")
+    
+    # Validate and parse every entry in one pass; later duplicates of a name win
+    medications = {}
+    errors = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({"index": index, "message": "Entry must be an object"})
+            continue
+        name = str(entry.get("name") or "").strip()
+        time_text = str(entry.get("time") or "").strip()
+        condition = str(entry.get("condition") or "").strip().lower() or None
+        if not is_valid_medication_name(name):
+            errors.append({"index": index, "message": f"'{name}' doesn't seem like a valid medication name"})
+            continue
+        rule = schedule.parse_time_field(time_text, tz=user_timezone()) if time_text else None
+        if time_text and not rule:
+            errors.append({"index": index, "message": f"Couldn't understand the time '{time_text}'"})
+            continue
+        medications[name] = {"name": name, **(schedule.fields(rule) if rule else {}), "condition": condition}
+    
+    # Fetch drug info for all distinct names concurrently, within this request's budget
+    def enrich(name):
+        with telemetry.pool_slot("drug_enrich"):
+            return fetch_reminder_drug_info(name, admitted=True)
+    
+    names = list(medications)
+    futures = [enrichment_executor.submit(contextvars.copy_context().run, enrich, name) for name in names]
+    for name, future in zip(names, futures):
+        medications[name]["info"] = future.result()
+    
+    inserted, updated = save_medications_bulk(user_id, list(medications.values()))
+    
+    # Audit the whole list once rather than checking each imported drug against it
+    warnings = interactions.audit(med["name"] for med in medications_collection.find({"user_id": user_id}, {"name": 1}) if med.get("name"))
+    
+    return jsonify(
+        success=not errors or bool(medications),
+        imported=len(medications),
+        inserted=inserted,
+        updated=updated,
+        errors=errors,
+        warnings=warnings
+    )
+
 @app.route("/clear-chat-history", methods=["POST"])
 @login_required
 def clear_chat_history():
     """API endpoint to delete all chat history for the current user"""
     user_id = flask_session.get('user_id')
     try:
+        refs = [msg["content_ref"] for msg in chat_history_collection.find(
+            {"user_id": user_id, "content_ref": {"$exists": True}}, {"content_ref": 1}
+        )]
         result = chat_history_collection.delete_many({"user_id": user_id})
+        response_store.release(refs)
+        search_index.forget(user_id)
         print(f"Cleared {result.deleted_count} chat messages for user {user_id}")
         # Also reset the session context/step as the history is gone
         sessions_collection.update_one(
             {"user_id": user_id},
-            {"$set": {"step": 1, "context": {}}},
+            {"$set": {"expiry": retention.session_expiry(), "step": 1, "context": {}}},
             upsert=True
         )
         return jsonify(success=True, message="Chat history cleared successfully.")
@@ -802,9 +1369,6 @@ def chat():
     user_id = flask_session.get('user_id')
     user_name = flask_session.get('name', '')
     
-    # Save user message to chat history
-    save_chat_message(user_id, "user", user_msg)
-    
     # Get the current session state
     session_data = sessions_collection.find_one({"user_id": user_id}) or {
         "user_id": user_id,
@@ -815,59 +1379,71 @@ def chat():
     step = session_data.get("step", 1)
     context = session_data.get("context", {})
     
+    # Charge the user's budget for this intent before doing any work
+    intent = detect_intent(user_msg, step, context)
+    telemetry.tag(intent=intent)
+    # A lookup the caches can answer costs no upstream call, so it is admitted as a cheap request
+    admission_intent = intent
+    if intent in ("disease_info", "drug_info") and is_cached_lookup(intent, lookup_topic(user_msg)):
+        admission_intent = "cached_lookup"
+    decision = admit_request(user_id, admission_intent)
+    if not decision.allowed:
+        return admission_rejected_response(decision, admission_message(decision, admission_intent))
+    
+    # Save user message to chat history
+    save_chat_message(user_id, "user", user_msg, intent=intent)
+    
     # Generate bot response based on user input
     bot_response = ""
     reset_session = False # Flag to reset session after a successful flow
+    lookup_ok = None # Whether a disease or drug lookup found an answer
     
     # Check for view all medications request
-    if any(phrase in user_msg.lower() for phrase in ["view all", "all medication", "all reminder", "show reminder", "see my"]):
+    if intent == "view_reminders":
         bot_response = get_all_medications_summary(user_id)
         reset_session = True # Reset context after showing summary
     
     # Handle "yes" confirmation after asking about setting a reminder for a disease
-    elif user_msg.lower() == "yes" and context.get("awaiting_reminder_confirmation"):
+    elif intent == "reminder_confirmation":
         bot_response = f"Okay! Which medication related to **{context.get('current_disease', 'the condition')}** would you like to set a reminder for?"
         context["awaiting_medication_name"] = True
         context.pop("awaiting_reminder_confirmation", None) # Remove the confirmation flag
         sessions_collection.update_one(
             {"user_id": user_id},
-            {"$set": {"step": 2, "context": context}},
+            {"$set": {"expiry": retention.session_expiry(), "step": 2, "context": context}},
             upsert=True
         )
     
     # Handle setting a new medication reminder (covers multiple steps)
-    elif "set a new medication reminder" in user_msg.lower() or "remind me" in user_msg.lower() or (step == 2 and context.get("awaiting_medication_name")) or (step == 3 and context.get("medication_name")):
+    elif intent == "set_reminder":
         # Consolidate reminder setting logic
-        # Refined regex to capture name until time indicators or end of string
-        med_pattern = re.search(r'(?:remind\s+me\s+(?:to\s+take|about)\s+)(.*?)(?:\s+(?:at|for|on)\s+\d|\s*$)', user_msg, re.IGNORECASE)
-        time_pattern = re.search(r'(?:at|for|on)\s+(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?', user_msg, re.IGNORECASE) # Use IGNORECASE for time pattern too
+        # The schedule grammar (schedule.py) takes the dosing phrases out of
+        # the message; what is left is the medication name
+        med_pattern = re.search(r'remind\s+me\s+(?:to\s+take|about)\s+(.*)', user_msg, re.IGNORECASE)
     
         if step == 1:
             if med_pattern:
-                potential_med_name = med_pattern.group(1).strip()
+                rule, potential_med_name = schedule.extract(med_pattern.group(1).strip(), tz=user_timezone())
                 if is_valid_medication_name(potential_med_name):
                     context["medication_name"] = potential_med_name
-                    if time_pattern:
-                        # Medication and time provided in step 1
-                        hour = time_pattern.group(1)
-                        minute = time_pattern.group(2) or "00"
-                        ampm = time_pattern.group(3) or "AM" # Default to AM if not specified
-                        time_str = f"{hour}:{minute} {ampm.upper()}"
-                        save_medication(user_id, {
+                    if rule:
+                        # Medication and schedule provided in step 1
+                        warnings = save_medication(user_id, {
                             "name": context["medication_name"],
-                            "time": time_str,
-                            "info": fetch_drug_info(context["medication_name"])
+                            **schedule.fields(rule),
+                            "info": fetch_reminder_drug_info(context["medication_name"])
                         })
                         bot_response = f"""## ✅ Reminder Set Successfully!
-    Your reminder for **{context['medication_name']}** has been set for **{time_str}** daily.
+    Your reminder for **{context['medication_name']}** has been set for **{schedule.describe(rule)}**.
+    {interactions.describe(warnings)}
     Would you like to set another reminder or ask about a medication?"""
                         reset_session = True
                     else:
                         # Medication provided, ask for time
-                        bot_response = f"Got it! What time should I remind you to take **{context['medication_name']}**? (e.g., 8:00 AM)"
+                        bot_response = f"Got it! When should I remind you to take **{context['medication_name']}**? (e.g., 8:00 AM, twice daily or every 8 hours)"
                         sessions_collection.update_one(
                             {"user_id": user_id},
-                            {"$set": {"step": 3, "context": context}}, # Go to step 3 (awaiting time)
+                            {"$set": {"expiry": retention.session_expiry(), "step": 3, "context": context}}, # Go to step 3 (awaiting time)
                             upsert=True
                         )
                 else:
@@ -876,7 +1452,7 @@ def chat():
                     context["awaiting_medication_name"] = True
                     sessions_collection.update_one(
                         {"user_id": user_id},
-                        {"$set": {"step": 2, "context": context}}, # Go to step 2 (awaiting name)
+                        {"$set": {"expiry": retention.session_expiry(), "step": 2, "context": context}}, # Go to step 2 (awaiting name)
                         upsert=True
                     )
             else:
@@ -885,44 +1461,36 @@ def chat():
                 context["awaiting_medication_name"] = True
                 sessions_collection.update_one(
                     {"user_id": user_id},
-                    {"$set": {"step": 2, "context": context}}, # Go to step 2 (awaiting name)
+                    {"$set": {"expiry": retention.session_expiry(), "step": 2, "context": context}}, # Go to step 2 (awaiting name)
                     upsert=True
                 )
         elif step == 2 and context.get("awaiting_medication_name"):
-            # User provided medication name (potentially with time) after being asked
-            med_name_in_msg = user_msg.strip()
-            potential_time_str = ""
-            if time_pattern:
-                # Extract time if present
-                hour = time_pattern.group(1)
-                minute = time_pattern.group(2) or "00"
-                ampm = time_pattern.group(3) or "AM"
-                potential_time_str = f"{hour}:{minute} {ampm.upper()}"
-                # Remove the time part from the message to get the medication name
-                med_name_in_msg = re.sub(r'(?:at|for|on)\s+\d{1,2}:?\d{2}?\s*(am|pm|AM|PM)?', '', med_name_in_msg, flags=re.IGNORECASE).strip()
+            # User provided medication name (potentially with a schedule) after being asked
+            rule, med_name_in_msg = schedule.extract(user_msg.strip(), tz=user_timezone())
     
             # Validate the extracted/provided name before proceeding
             if is_valid_medication_name(med_name_in_msg):
                 context["medication_name"] = med_name_in_msg
                 context.pop("awaiting_medication_name", None)
     
-                if potential_time_str:
-                     # Medication and time provided in step 2
-                    save_medication(user_id, {
+                if rule:
+                     # Medication and schedule provided in step 2
+                    warnings = save_medication(user_id, {
                         "name": context["medication_name"],
-                        "time": potential_time_str,
-                        "info": fetch_drug_info(context["medication_name"])
+                        **schedule.fields(rule),
+                        "info": fetch_reminder_drug_info(context["medication_name"])
                     })
                     bot_response = f"""## ✅ Reminder Set Successfully!
-    Your reminder for **{context['medication_name']}** has been set for **{potential_time_str}** daily.
+    Your reminder for **{context['medication_name']}** has been set for **{schedule.describe(rule)}**.
+    {interactions.describe(warnings)}
     Would you like to set another reminder or ask about a medication?"""
                     reset_session = True
                 else:
                     # Only medication name provided, ask for time
-                    bot_response = f"Got it! What time should I remind you to take **{context['medication_name']}**? (e.g., 8:00 AM)"
+                    bot_response = f"Got it! When should I remind you to take **{context['medication_name']}**? (e.g., 8:00 AM, twice daily or every 8 hours)"
                     sessions_collection.update_one(
                         {"user_id": user_id},
-                        {"$set": {"step": 3, "context": context}}, # Go to step 3 (awaiting time)
+                        {"$set": {"expiry": retention.session_expiry(), "step": 3, "context": context}}, # Go to step 3 (awaiting time)
                         upsert=True
                     )
             else:
@@ -933,7 +1501,7 @@ def chat():
                 context.pop("medication_name", None) # Clear any potentially bad name from context
                 sessions_collection.update_one(
                     {"user_id": user_id},
-                    {"$set": {"step": 2, "context": context}},
+                    {"$set": {"expiry": retention.session_expiry(), "step": 2, "context": context}},
                     upsert=True
                 )
     
@@ -944,31 +1512,34 @@ def chat():
                  bot_response = "Something went wrong. Let's start over. What medication do you want to set a reminder for?"
                  reset_session = True
             else:
-                time_pattern_step3 = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?', user_msg, re.IGNORECASE) # Re-check time pattern here
-                if time_pattern_step3:
-                    hour = time_pattern_step3.group(1)
-                    minute = time_pattern_step3.group(2) or "00"
-                    ampm = time_pattern_step3.group(3) or "AM"
-                    time_str = f"{hour}:{minute} {ampm.upper()}"
-                    save_medication(user_id, {
+                # The whole message answers "when", so a bare hour counts as a time
+                rule = schedule.parse_time_field(user_msg, tz=user_timezone())
+                if rule:
+                    warnings = save_medication(user_id, {
                         "name": context["medication_name"],
-                        "time": time_str,
-                        "info": fetch_drug_info(context["medication_name"])
+                        **schedule.fields(rule),
+                        "info": fetch_reminder_drug_info(context["medication_name"])
                     })
                     bot_response = f"""## ✅ Reminder Set Successfully!
-    Your reminder for **{context['medication_name']}** has been set for **{time_str}** daily.
+    Your reminder for **{context['medication_name']}** has been set for **{schedule.describe(rule)}**.
+    {interactions.describe(warnings)}
     Would you like to set another reminder or ask about a medication?"""
                     reset_session = True
                 else:
-                    bot_response = "I couldn't understand the time. Please specify a time in the format like '8:00 AM' or '14:30'."
+                    bot_response = "I couldn't understand the time. Please give a time like '8:00 AM' or '14:30', or a schedule like 'twice daily' or 'every 8 hours'."
                     # Keep the session state as is (step 3, awaiting time)
     
     # Check if this is asking about a disease or medication (only if no other intent matched)
-    elif not bot_response and (user_msg.lower().startswith("tell me about ") or user_msg.lower().startswith("what is ")):
-        potential_topic = user_msg.lower().replace("tell me about ", "").replace("what is ", "").strip()
-    
-        if is_likely_disease(potential_topic):
-            disease_info, canonical_disease = get_disease_info(potential_topic)
+    elif intent in ("disease_info", "drug_info"):
+        potential_topic = lookup_topic(user_msg)
+    
+        if intent == "disease_info":
+            try:
+                disease_info, canonical_disease = get_disease_info(potential_topic)
+                lookup_ok = canonical_disease is not None
+            except DeadlineExceeded:
+                disease_info, canonical_disease = get_partial_disease_info(potential_topic)
+                lookup_ok = False
             if canonical_disease:
                 context["current_disease"] = canonical_disease
                 # Set flag to check for 'yes' in the next turn
@@ -979,26 +1550,33 @@ def chat():
     
             sessions_collection.update_one(
                 {"user_id": user_id},
-                {"$set": {"context": context}},
+                {"$set": {"expiry": retention.session_expiry(), "context": context}},
                 upsert=True
             )
             bot_response = disease_info
         else:
             # Treat as a medication query
-            med_info = fetch_drug_info(potential_topic)
+            try:
+                med_info = fetch_drug_info(potential_topic)
+                lookup_ok = not med_info.startswith("❌")
+            except DeadlineExceeded:
+                med_info = f"I'm still fetching information about **{potential_topic}**. Please ask again in a moment."
+                lookup_ok = False
             context["current_medication"] = potential_topic
             # Clear disease context if asking about medication
             context.pop("current_disease", None)
             context.pop("awaiting_reminder_confirmation", None)
             sessions_collection.update_one(
                 {"user_id": user_id},
-                {"$set": {"context": context}},
+                {"$set": {"expiry": retention.session_expiry(), "context": context}},
                 upsert=True
             )
             bot_response = med_info
     
     # Handle no matching intent or reset session
     if not bot_response:
+        intent = "fallback"
+        telemetry.tag(intent=intent)
         # If we are in a multi-step flow, don't show the generic welcome
         if step > 1 and context:
              bot_response = "Sorry, I didn't quite understand that. Could you please clarify?"
@@ -1032,15 +1610,77 @@ def chat():
     if reset_session:
         sessions_collection.update_one(
             {"user_id": user_id},
-            {"$set": {"step": 1, "context": {}}},
+            {"$set": {"expiry": retention.session_expiry(), "step": 1, "context": {}}},
             upsert=True
         )
     
     # Save bot message to chat history
-    save_chat_message(user_id, "bot", bot_response)
+    save_chat_message(user_id, "bot", bot_response, intent=intent, lookup_ok=lookup_ok)
     
     return jsonify(reply=bot_response)
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics endpoint, only served to scrapers that send METRICS_TOKEN"""
+    token = os.environ.get("METRICS_TOKEN")
+    # Without a token there is no way to tell a scraper from anyone else
+    if not token:
+        return Response("Not Found\n", status=404, mimetype="text/plain")
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    
+    body, content_type = telemetry.generate_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route("/admin/stats", methods=["GET"])
+@admin_required
+def admin_stats():
+    """Usage statistics from the analytics rollups (see analytics.py)"""
+    try:
+        days = min(max(int(request.args.get("days", 30)), 1), 365)
+    except ValueError:
+        return jsonify(success=False, message="days must be a number"), 400
+    return jsonify(success=True, **analytics.read_stats(days))
+
+@app.route("/admin/export/<user_id>", methods=["GET"])
+@admin_required
+def admin_export(user_id):
+    """Download any user's chat history and reminders, for support requests"""
+    if not get_user_by_id(user_id):
+        return jsonify(success=False, message="User not found"), 404
+    fmt = request.args.get("format", "ndjson")
+    cursor = request.args.get("cursor")
+    # Exports hold another user's medical data, so every one is logged
+    print(f"Admin export: {flask_session.get('user_id')} ({flask_session.get('email')}) exported {user_id} "
+          f"as {fmt}{' (resumed)' if cursor else ''} from {request.remote_addr}")
+    return export_response(user_id, fmt, cursor)
+
+@app.route("/admin/profile", methods=["GET"])
+@admin_required
+def admin_profile():
+    """Download sampled stacks as an SVG flamegraph, collapsed stacks, or a per-route summary"""
+    output = request.args.get("format", "svg")
+    if output == "summary":
+        return jsonify(success=True, enabled=profiler.PROFILING_ENABLED, profiles=profiler.summary())
+    
+    route = request.args.get("route")
+    intent = request.args.get("intent")
+    stacks = profiler.collapsed_stacks(route, intent)
+    if output == "collapsed":
+        return Response(profiler.render_collapsed(stacks), mimetype="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=medassist-profile.collapsed.txt"})
+    if output == "svg":
+        title = f"MedAssist profile: {route or 'all routes'}, {intent or 'all intents'}"
+        return Response(profiler.render_flamegraph(stacks, title), mimetype="image/svg+xml")
+    return jsonify(success=False, message="format must be svg, collapsed or summary"), 400
+
+@app.route("/admin/profile/reset", methods=["POST"])
+@admin_required
+def admin_profile_reset():
+    """Discard all collected profile samples"""
+    profiler.reset()
+    return jsonify(success=True)
+
 def get_all_medications_summary(user_id):
     """Generate a summary of all medications for a user"""
     medications = get_user_medications(user_id)
@@ -1059,7 +1699,8 @@ You can also visit the [Reminders Dashboard](/reminders) to manage your reminder
     for med in medications:
         # Ensure med name is a string and handle potential None values
         med_name = med.get("name", "Unnamed Medication")
-        med_time = med.get("time") # Keep time as is, might be None
+        rule = medication_schedule(med)
+        med_time = schedule.describe(rule) if rule else None
 
         if "condition" in med and med["condition"]:
             condition = med["condition"]
@@ -1082,7 +1723,7 @@ You can visit the [Reminders Dashboard](/reminders) to see countdowns and manage
             response += f"### For {condition.title()}\n"
             for i, med in enumerate(condition_meds, 1):
                 time_display = med.get("time") or "No time set" # Display 'No time set' if time is None
-                response += f"{i}. **{med['name']}** - Daily at **{time_display}**\n"
+                response += f"{i}. **{med['name']}** - **{time_display}**\n"
             response += "\n"
     
     # Add individual medications
@@ -1091,7 +1732,11 @@ You can visit the [Reminders Dashboard](/reminders) to see countdowns and manage
             response += "### Other Medications\n"
         for i, med in enumerate(individual_meds, 1):
             time_display = med.get("time") or "No time set" # Display 'No time set' if time is None
-            response += f"{i}. **{med['name']}** - Daily at **{time_display}**\n"
+            response += f"{i}. **{med['name']}** - **{time_display}**\n"
+    
+    warnings = interactions.audit(med["name"] for med in medications if med.get("name"))
+    if warnings:
+        response += "\n" + interactions.describe(warnings, limit=len(warnings)) + "\n"
     
     response += "\n*You can ask for details about any specific medication by name.*"
     return response
@@ -1115,7 +1760,7 @@ def enhance_with_gemini(med_name, basic_info):
         Make the information concise but comprehensive, and format it nicely with markdown headers.
         """
         
-        response = model.generate_content(prompt)
+        response = generate_with_gemini(prompt)
         
         if response and hasattr(response, 'text'):
             # Combine OpenFDA and Gemini information
@@ -1132,6 +1777,8 @@ def enhance_with_gemini(med_name, basic_info):
             return combined_info
         else:
             return basic_info
+    except DeadlineExceeded:
+        return basic_info
     except Exception as e:
         print(f"Gemini API error: {str(e)}")
         return basic_info
@@ -1217,5 +1864,24 @@ Diarrhea is loose, watery stools that occur more frequently than usual. It's typ
             
     return None
 
+def warm_shared_data():
+    """
+    Load read-only data before workers fork.
+    
+    With gunicorn's preload_app this runs once in the master, and the compiled
+    templates, the asset manifest, the medication name index and the drug
+    interaction index are shared copy-on-write by every worker.
+    """
+    for template_name in app.jinja_env.list_templates():
+        if template_name.endswith(".html"):
+            app.jinja_env.get_template(template_name)
+    assets.manifest()
+    medication_autocomplete.load()
+    interactions.index()
+
+def init_worker():
+    """Create per-process clients after fork (called from gunicorn's post_fork hook)"""
+    resources.init_worker()
+
 if __name__ == "__main__":
     app.run(debug=True)
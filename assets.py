@@ -0,0 +1,221 @@
+"""
+Static asset pipeline for MedAssist.
+
+The pages' CSS and JS live in static/src, and third-party libraries are kept
+in static/vendor (pinned versions, fetched from the CDNs listed in VENDOR).
+The build minifies the page assets and copies every file to static/dist under
+a name carrying a hash of its content (src/index.js -> src/index.3f9a1c2e7b.js),
+with gzip and brotli copies next to it, and records the names in
+static/dist/manifest.json. Stylesheets have the files they reference
+(Font Awesome's webfonts) rewritten to their built names.
+
+Templates link assets with asset_url() (see app.py), and /assets serves the
+built files with a year-long immutable Cache-Control: a changed file gets a
+new name, so browsers never revalidate. Without a build (local development)
+assets are served from static/ as they are, and libraries not vendored yet
+from their CDN. A library the build cannot fetch (no network, CDN down) is
+left out with a warning, and pages keep loading it from its CDN.
+
+Usage:
+    python assets.py build    # fetch missing libraries, then build static/dist
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import posixpath
+import threading
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+SOURCE_DIR = os.path.join(STATIC_DIR, "src")
+VENDOR_DIR = os.path.join(STATIC_DIR, "vendor")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# Built assets never change under the same name
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Vendored libraries: path under static/ -> the pinned CDN copy it is fetched from
+VENDOR = {
+    "vendor/font-awesome/css/all.min.css": "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css",
+    "vendor/marked/marked.min.js": "https://cdn.jsdelivr.net/npm/marked@12.0.2/marked.min.js",
+    "vendor/howler/howler.min.js": "https://cdnjs.cloudflare.com/ajax/libs/howler/2.2.3/howler.min.js",
+}
+
+# Built files of these types also get .gz and .br copies (fonts like woff2 are compressed already)
+PRECOMPRESS_EXTENSIONS = {".css", ".js", ".svg", ".ttf", ".eot", ".json"}
+PRECOMPRESS_MIN_BYTES = 1024
+
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def manifest():
+    """{path under static/: built path under static/dist} from the last build; empty without one"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    with open(MANIFEST_PATH, encoding="utf-8") as built:
+                        _manifest = json.load(built)
+                except (OSError, ValueError):
+                    _manifest = {}
+    return _manifest
+
+def built_name(name):
+    return manifest().get(name)
+
+def cdn_url(name):
+    """CDN copy of a library that has not been vendored yet, else None"""
+    if name in VENDOR and not os.path.isfile(os.path.join(STATIC_DIR, name)):
+        return VENDOR[name]
+    return None
+
+def precompressed(filename, accept_encodings):
+    """(file to send, Content-Encoding or None) for a built asset, given the request's Accept-Encoding"""
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accept_encodings[encoding] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+# --- build ---
+
+def _local_urls(css):
+    """Relative url() references of a stylesheet (not data: URIs or absolute URLs)"""
+    for match in CSS_URL_PATTERN.finditer(css):
+        url = match.group(2).strip()
+        if not re.match(r"^(?:[a-z]+:|/|#)", url, re.IGNORECASE):
+            yield url
+
+def _split_suffix(url):
+    """("../webfonts/fa.woff2", "?v=6#x") for "../webfonts/fa.woff2?v=6#x\""""
+    match = re.match(r"^([^?#]*)(.*)$", url)
+    return match.group(1), match.group(2)
+
+def vendor():
+    """Fetch the libraries in VENDOR missing from static/vendor, with the files their stylesheets reference
+
+    Returns the names of the libraries that could not be fetched.
+    """
+    import requests
+    from urllib.parse import urljoin
+    failed = []
+    for name, url in VENDOR.items():
+        if os.path.isfile(os.path.join(STATIC_DIR, name)):
+            continue
+        try:
+            files = {name: url}
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            contents = {name: response.content}
+            if name.endswith(".css"):
+                for ref in set(_local_urls(response.text)):
+                    path, _ = _split_suffix(ref)
+                    files[posixpath.normpath(posixpath.join(posixpath.dirname(name), path))] = urljoin(url, path)
+            for path, file_url in files.items():
+                if path not in contents:
+                    response = requests.get(file_url, timeout=30)
+                    response.raise_for_status()
+                    contents[path] = response.content
+        except requests.exceptions.RequestException as e:
+            print(f"Could not vendor {name}: {str(e)}")
+            failed.append(name)
+            continue
+        for path, content in contents.items():
+            target = os.path.join(STATIC_DIR, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as out:
+                out.write(content)
+    return failed
+
+def _minify(name, content):
+    """Minified page CSS and JS; vendored files are minified upstream"""
+    if not name.startswith("src/"):
+        return content
+    import rcssmin
+    import rjsmin
+    if name.endswith(".css"):
+        return rcssmin.cssmin(content.decode("utf-8")).encode("utf-8")
+    if name.endswith(".js"):
+        return rjsmin.jsmin(content.decode("utf-8")).encode("utf-8")
+    return content
+
+def _rewrite_urls(name, css, built):
+    """Point a stylesheet's relative url()s at the built names of the files they reference"""
+    local = set(_local_urls(css))
+    def replace(match):
+        url = match.group(2).strip()
+        path, suffix = _split_suffix(url)
+        target = built.get(posixpath.normpath(posixpath.join(posixpath.dirname(name), path)))
+        if url not in local or target is None:
+            return match.group(0)
+        # Built files keep their directory layout, so the reference stays relative
+        return f"url({posixpath.relpath(target, posixpath.dirname(name))}{suffix})"
+    return CSS_URL_PATTERN.sub(replace, css)
+
+def _write(path, content):
+    target = os.path.join(DIST_DIR, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "wb") as out:
+        out.write(content)
+
+def _precompress(path, content, brotli):
+    if os.path.splitext(path)[1] not in PRECOMPRESS_EXTENSIONS or len(content) < PRECOMPRESS_MIN_BYTES:
+        return
+    # mtime=0 so rebuilding unchanged content gives identical files
+    _write(path + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli:
+        _write(path + ".br", brotli.compress(content, quality=11))
+
+def _fingerprinted(name, content):
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{extension}"
+
+def build():
+    """Build static/dist and its manifest from static/src and static/vendor; returns the number of files"""
+    try:
+        import brotli
+    except ImportError:
+        print("Warning: brotli not installed. Built assets get gzip copies only.")
+        brotli = None
+
+    names = []
+    for root in (SOURCE_DIR, VENDOR_DIR):
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                names.append(os.path.relpath(os.path.join(directory, filename), STATIC_DIR).replace(os.sep, "/"))
+    # Stylesheets last, once the files they reference have their built names
+    names.sort(key=lambda name: (name.endswith(".css"), name))
+
+    built = {}
+    for name in names:
+        with open(os.path.join(STATIC_DIR, name), "rb") as source:
+            content = _minify(name, source.read())
+        if name.endswith(".css"):
+            content = _rewrite_urls(name, content.decode("utf-8"), built).encode("utf-8")
+        # Earlier builds are left in place, so pages rendered before a deploy can still load theirs
+        built[name] = _fingerprinted(name, content)
+        _write(built[name], content)
+        _precompress(built[name], content, brotli)
+
+    os.makedirs(DIST_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as out:
+        json.dump(built, out, indent=2, sort_keys=True)
+    return len(built)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "build":
+        failed = vendor()
+        if failed:
+            # Pages still work, only with a request to the CDN for these
+            print(f"Warning: {len(failed)} libraries could not be vendored. Pages will load them from their CDN: {', '.join(failed)}")
+        count = build()
+        print(f"Built {count} assets into {DIST_DIR}")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1 @@
+"""Benchmark suite for MedAssist (see benchmarks/run.py)."""
@@ -0,0 +1,101 @@
+"""
+Boot time and per-worker memory benchmark for MedAssist under gunicorn.
+
+Starts gunicorn with and without --preload for each requested worker count,
+waits until every worker has finished initializing, and reports total boot
+time plus RSS, PSS (RSS with shared pages divided among sharers) and USS
+(private memory) per worker. Linux only, since it reads /proc/<pid>/smaps_rollup.
+
+Usage:
+    python -m benchmarks.boot --workers 4,8
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Wraps the real gunicorn.conf.py and records when each worker is initialized
+CONFIG_TEMPLATE = """
+exec(open({config!r}).read())
+
+def post_worker_init(worker):
+    import os
+    open(os.path.join({marker_dir!r}, str(os.getpid())), "w").close()
+"""
+
+def memory_kb(pid):
+    """Return (rss, pss, uss) in kB for a process"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":"):
+                values[parts[0][:-1]] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return values.get("Rss", 0), values.get("Pss", 0), uss
+
+def measure(workers, preload, port, timeout):
+    work_dir = tempfile.mkdtemp(prefix="medassist-boot-")
+    marker_dir = os.path.join(work_dir, "ready")
+    os.makedirs(marker_dir)
+    config_path = os.path.join(work_dir, "gunicorn.conf.py")
+    with open(config_path, "w") as f:
+        f.write(CONFIG_TEMPLATE.format(config=os.path.join(REPO_ROOT, "gunicorn.conf.py"), marker_dir=marker_dir))
+
+    env = dict(os.environ)
+    env["GUNICORN_PRELOAD"] = "true" if preload else "false"
+    env["WEB_CONCURRENCY"] = str(workers)
+    env["PORT"] = str(port)
+    command = [sys.executable, "-m", "gunicorn", "-c", config_path, "--log-level", "warning", "app:app"]
+
+    started = time.monotonic()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    try:
+        while len(os.listdir(marker_dir)) < workers:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+            if time.monotonic() - started > timeout:
+                raise RuntimeError("Workers did not finish booting in time")
+            time.sleep(0.02)
+        boot_time = time.monotonic() - started
+
+        worker_pids = [int(name) for name in os.listdir(marker_dir)]
+        samples = [memory_kb(pid) for pid in worker_pids]
+        master = memory_kb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    count = len(samples)
+    return {
+        "boot_s": boot_time,
+        "rss_kb": sum(s[0] for s in samples) / count,
+        "pss_kb": sum(s[1] for s in samples) / count,
+        "uss_kb": sum(s[2] for s in samples) / count,
+        "total_pss_kb": sum(s[1] for s in samples) + master[1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure gunicorn boot time and per-worker memory")
+    parser.add_argument("--workers", default="4,8", help="Comma-separated worker counts")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'preload':>8} {'boot s':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'total PSS MB':>13}")
+    print("-" * 68)
+    for workers in [int(n) for n in args.workers.split(",")]:
+        for preload in (False, True):
+            row = measure(workers, preload, args.port, args.timeout)
+            print(f"{workers:>7} {str(preload):>8} {row['boot_s']:>8.2f} {row['rss_kb'] / 1024:>8.1f} "
+                  f"{row['pss_kb'] / 1024:>8.1f} {row['uss_kb'] / 1024:>8.1f} {row['total_pss_kb'] / 1024:>13.1f}")
+
+if __name__ == "__main__":
+    main()
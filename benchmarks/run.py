@@ -0,0 +1,232 @@
+"""
+Load-test and benchmark runner for MedAssist.
+
+Starts the Flask app (under gunicorn) against a local MongoDB and the
+stand-in upstream servers from benchmarks/upstreams.py, replays the scripted
+conversations from benchmarks/scenarios.py at a controlled concurrency and
+reports throughput and p50/p95/p99 latency per route.
+
+Usage:
+    python -m benchmarks.run --users 40 --concurrency 8 --iterations 2
+    python -m benchmarks.run --latency-ms 300 --error-rate 0.05 --json results.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --max-regression 0.25
+
+The run exits with status 1 if any route's p95 is more than --max-regression
+slower than in the baseline, or if the error rate exceeds --max-error-rate.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.upstreams import UpstreamStandIns, add_behaviour_arguments, behaviour_from_args
+from benchmarks.scenarios import SCENARIOS, DEFAULT_SCRIPT
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def start_app(args, standins):
+    """Start the app under gunicorn and wait until it answers"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update(standins.app_environment())
+    env["MONGODB_URI"] = args.mongodb_uri
+    env["FLASK_SECRET_KEY"] = "benchmark-secret"
+    command = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(args.workers),
+        "--threads", str(args.threads),
+        "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.monotonic()
+    while time.monotonic() - started < args.boot_timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with status {process.returncode}")
+        try:
+            requests.get(f"{base_url}/onboarding", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start in time")
+
+def reset_database(mongodb_uri):
+    import pymongo
+    client = pymongo.MongoClient(mongodb_uri)
+    db = client.get_database()
+    client.drop_database(db.name)
+    client.close()
+
+class VirtualUser:
+    """One registered user replaying the benchmark script with its own cookie jar"""
+
+    def __init__(self, base_url, index, timeout):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.email = f"bench-{index}-{uuid.uuid4().hex[:8]}@example.com"
+        self.timeout = timeout
+
+    def register(self):
+        self.session.post(f"{self.base_url}/register", data={
+            "name": "Bench User",
+            "email": self.email,
+            "password": "bench-password",
+            "confirm_password": "bench-password",
+        }, timeout=self.timeout)
+
+    def run(self, script, iterations):
+        samples = []
+        for _ in range(iterations):
+            for scenario in script:
+                for label, method, path, payload in SCENARIOS[scenario]:
+                    started = time.perf_counter()
+                    try:
+                        response = self.session.request(method, f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+                        ok = response.status_code < 400
+                    except requests.RequestException:
+                        ok = False
+                    samples.append((label, time.perf_counter() - started, ok))
+        return samples
+
+def summarize(samples, elapsed):
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for label, duration, ok in samples:
+        by_route[label].append(duration)
+        if not ok:
+            errors[label] += 1
+
+    report = {}
+    for label, durations in sorted(by_route.items()):
+        durations.sort()
+        report[label] = {
+            "count": len(durations),
+            "errors": errors[label],
+            "throughput_rps": len(durations) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(durations, 50) * 1000,
+            "p95_ms": percentile(durations, 95) * 1000,
+            "p99_ms": percentile(durations, 99) * 1000,
+        }
+    return report
+
+def print_report(report, elapsed, total):
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n")
+    print(f"{'route':<42} {'count':>6} {'err':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print("-" * 90)
+    for label, row in report.items():
+        print(f"{label:<42} {row['count']:>6} {row['errors']:>5} {row['throughput_rps']:>7.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+def compare_to_baseline(report, baseline, max_regression):
+    """Return a list of routes whose p95 regressed past the allowed ratio"""
+    regressions = []
+    for label, row in report.items():
+        previous = baseline.get("routes", {}).get(label)
+        if not previous or not previous["p95_ms"]:
+            continue
+        ratio = row["p95_ms"] / previous["p95_ms"] - 1
+        if ratio > max_regression:
+            regressions.append(f"{label}: p95 {previous['p95_ms']:.1f}ms -> {row['p95_ms']:.1f}ms (+{ratio:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MedAssist against local upstream stand-ins")
+    parser.add_argument("--users", type=int, default=20, help="Number of virtual users")
+    parser.add_argument("--concurrency", type=int, default=4, help="Virtual users running at once")
+    parser.add_argument("--iterations", type=int, default=1, help="Times each user replays the script")
+    parser.add_argument("--script", default=",".join(DEFAULT_SCRIPT), help="Comma-separated scenario names")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--mongodb-uri", default=os.environ.get("BENCH_MONGODB_URI", "mongodb://localhost:27017/medassist_bench"))
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the benchmark database first")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--boot-timeout", type=float, default=30)
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare p95 latencies against")
+    parser.add_argument("--save-baseline", help="Write this run's report as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Allowed p95 slowdown vs baseline")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="Allowed fraction of failed requests")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    script = [name.strip() for name in args.script.split(",") if name.strip()]
+    unknown = [name for name in script if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    if not args.keep_db:
+        reset_database(args.mongodb_uri)
+
+    standins = UpstreamStandIns(behaviour_from_args(args)).start()
+    process, base_url = start_app(args, standins)
+    try:
+        users = [VirtualUser(base_url, index, args.request_timeout) for index in range(args.users)]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda user: user.register(), users))
+
+            started = time.monotonic()
+            samples = []
+            for user_samples in pool.map(lambda user: user.run(script, args.iterations), users):
+                samples.extend(user_samples)
+            elapsed = time.monotonic() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        standins.stop()
+
+    report = summarize(samples, elapsed)
+    print_report(report, elapsed, len(samples))
+
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "save_baseline")},
+        "elapsed_s": elapsed,
+        "routes": report,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+
+    failed = False
+    error_count = sum(row["errors"] for row in report.values())
+    if samples and error_count / len(samples) > args.max_error_rate:
+        print(f"\nError rate {error_count / len(samples):.1%} exceeds {args.max_error_rate:.1%}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\nLatency regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Scripted multi-turn conversations replayed by the benchmark runner.
+
+Each scenario is a list of steps. A step is (label, method, path, payload);
+the label groups latency samples in the report, so /chat turns are broken
+down by what the user was doing.
+"""
+
+def chat(label, message):
+    return (f"POST /chat ({label})", "POST", "/chat", {"message": message})
+
+REMINDER_SETUP = [
+    chat("set_reminder", "Remind me to take Metformin at 8:00 AM"),
+    chat("set_reminder", "Set a new medication reminder"),
+    chat("set_reminder", "Lisinopril"),
+    chat("set_reminder", "9:30 PM"),
+    chat("view_reminders", "Show all my reminders"),
+]
+
+DISEASE_LOOKUP = [
+    chat("disease_info", "Tell me about dengue"),
+    chat("reminder_confirmation", "yes"),
+    chat("set_reminder", "Paracetamol at 8:00 PM"),
+    chat("disease_info", "Tell me about bronchitis"),
+    chat("drug_info", "Tell me about ibuprofen"),
+    chat("drug_info", "What is atorvastatin"),
+]
+
+HISTORY_LOAD = [
+    ("GET /get-chat-history", "GET", "/get-chat-history", None),
+    ("GET /get-profile", "GET", "/get-profile", None),
+]
+
+# Requests the chat input's typeahead makes while a medication name is typed
+MEDICATION_TYPEAHEAD = [
+    ("GET /autocomplete-medication", "GET", "/autocomplete-medication?q=me&limit=6", None),
+    ("GET /autocomplete-medication", "GET", "/autocomplete-medication?q=metf&limit=6", None),
+    ("GET /autocomplete-medication", "GET", "/autocomplete-medication?q=insulin%20gla&limit=6", None),
+]
+
+REMINDER_POLLING = [
+    ("GET /get-reminders", "GET", "/get-reminders", None),
+    ("GET /get-reminders", "GET", "/get-reminders", None),
+    ("GET /get-reminders", "GET", "/get-reminders", None),
+]
+
+SCENARIOS = {
+    "reminder_setup": REMINDER_SETUP,
+    "disease_lookup": DISEASE_LOOKUP,
+    "history_load": HISTORY_LOAD,
+    "reminder_polling": REMINDER_POLLING,
+    "medication_typeahead": MEDICATION_TYPEAHEAD,
+}
+
+# The conversation every virtual user replays, in order, once per iteration
+DEFAULT_SCRIPT = ["history_load", "medication_typeahead", "reminder_setup", "reminder_polling", "disease_lookup", "history_load", "reminder_polling"]
@@ -0,0 +1,113 @@
+"""
+Cold-start benchmark for MedAssist.
+
+Reports import time per module (from `python -X importtime -c "import app"`)
+and measures time-to-first-response: how long a fresh single-worker gunicorn
+process takes to answer its first request, which is what a sleeping free-tier
+instance pays on wake-up. Exits with status 1 if the median time-to-first-
+response or the app import time exceeds its budget.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 5 --budget-ms 1500 --import-budget-ms 600 --top 25
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times():
+    """Return [(module, self_us, cumulative_us)] for `import app`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import app failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append((module.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_response(path, timeout):
+    """Seconds from spawning gunicorn to the first successful response on `path`"""
+    port = free_port()
+    env = dict(os.environ)
+    env.update({"PORT": str(port), "WEB_CONCURRENCY": "1", "GUNICORN_PRELOAD": "false"})
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+               "--log-level", "warning", "app:app"]
+
+    started = time.monotonic()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    try:
+        while time.monotonic() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as response:
+                    response.read()
+                return time.monotonic() - started
+            except urllib.error.HTTPError:
+                # Any HTTP answer counts: the app is up and serving
+                return time.monotonic() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError("No response before timeout")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure MedAssist cold-start time")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--path", default="/onboarding", help="Path requested as the first request")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", "2000")),
+                        help="Maximum median time-to-first-response")
+    parser.add_argument("--import-budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "1000")),
+                        help="Maximum cumulative import time of the app module")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules to list")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    rows = import_times()
+    app_row = next((row for row in rows if row[0].strip() == "app"), None)
+    print("Slowest imports (cumulative) for `import app`:\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for module, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}")
+
+    samples = [time_to_first_response(args.path, args.timeout) for _ in range(args.runs)]
+    median_ms = statistics.median(samples) * 1000
+    import_ms = app_row[2] / 1000 if app_row else 0.0
+    print(f"\nimport app: {import_ms:.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"time to first response: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(samples) * 1000:.1f}, max {max(samples) * 1000:.1f}; budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if import_ms > args.import_budget_ms:
+        print("FAIL: app import time is over budget")
+        failed = True
+    if median_ms > args.budget_ms:
+        print("FAIL: time to first response is over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Local stand-in servers for the upstream APIs MedAssist depends on.
+
+Each stand-in answers with canned but realistically shaped responses for
+OpenFDA, Gemini, Wikipedia and health.gov, after a configurable delay and
+with a configurable error rate, so benchmarks never touch the real services.
+
+Usage (standalone):
+    python -m benchmarks.upstreams --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+"""
+
+import json
+import random
+import threading
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Drug names the OpenFDA stand-in "knows"; anything else is a miss
+KNOWN_DRUGS = {"metformin", "lisinopril", "ibuprofen", "atorvastatin", "amoxicillin", "omeprazole"}
+
+LOREM = (
+    "This is a stand-in description used for benchmarking. It is long enough to "
+    "exercise response formatting, markdown rendering and storage of bot replies. "
+)
+
+class UpstreamBehaviour:
+    """Latency and failure settings shared by all stand-in servers"""
+
+    def __init__(self, latency_ms=100, jitter_ms=0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep(max(0, self.latency_ms + jitter) / 1000)
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+def make_handler(name, respond, behaviour):
+    """Build a request handler class that delays, fails or delegates to `respond`"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            behaviour.delay()
+            if behaviour.should_fail():
+                # Gemini signals quota trouble with 429, the others with 5xx
+                status = 429 if name == "gemini" else 503
+                self._send(status, {"error": {"code": status, "message": "stand-in injected failure"}})
+                return
+            url = urlparse(self.path)
+            status, payload = respond(url.path, parse_qs(url.query), body)
+            self._send(status, payload)
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def respond_openfda(path, query, body):
+    search = query.get("search", [""])[0]
+    term = search.split(":", 1)[-1].strip("()").lower()
+    if term not in KNOWN_DRUGS:
+        return 404, {"error": {"code": "NOT_FOUND", "message": "No matches found!"}}
+    return 200, {"results": [{
+        "purpose": [f"{term.title()} stand-in purpose."],
+        "indications_and_usage": [LOREM * 3],
+        "warnings": [LOREM * 2],
+        "dosage_and_administration": [LOREM * 2],
+    }]}
+
+def respond_gemini(path, query, body):
+    try:
+        prompt = json.loads(body or b"{}")["contents"][0]["parts"][0]["text"]
+    except (ValueError, KeyError, IndexError):
+        prompt = ""
+    text = "## Overview\n" + LOREM * 4 + "\n## Symptoms\n- Fever\n- Fatigue\n\n## Treatment\n" + LOREM * 2
+    return 200, {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": len(prompt.split()), "candidatesTokenCount": len(text.split())},
+    }
+
+def respond_wikipedia(path, query, body):
+    term = (query.get("gsrsearch") or query.get("titles") or [""])[0]
+    return 200, {"query": {"pages": {"1": {
+        "pageid": 1, "title": term.title(), "index": 1, "extract": LOREM * 4,
+    }}}}
+
+def respond_health_gov(path, query, body):
+    keyword = query.get("keyword", [""])[0]
+    return 200, {"Result": {"Resources": {"Resource": [{
+        "Title": keyword.title(),
+        "Sections": {"Section": [{"Content": f"<p>{LOREM * 3}</p>"}]},
+    }]}}}
+
+RESPONDERS = {
+    "openfda": respond_openfda,
+    "gemini": respond_gemini,
+    "wikipedia": respond_wikipedia,
+    "health_gov": respond_health_gov,
+}
+
+class UpstreamStandIns:
+    """Run every stand-in server on its own local port"""
+
+    def __init__(self, behaviour, host="127.0.0.1"):
+        self.behaviour = behaviour
+        self.host = host
+        self.servers = {}
+
+    def start(self):
+        for name, respond in RESPONDERS.items():
+            server = ThreadingHTTPServer((self.host, 0), make_handler(name, respond, self.behaviour))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"standin-{name}", daemon=True).start()
+            self.servers[name] = server
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def url(self, name):
+        host, port = self.servers[name].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def app_environment(self):
+        """Environment variables pointing the app at the stand-ins"""
+        return {
+            "OPENFDA_API_URL": self.url("openfda") + "/drug/label.json",
+            "GEMINI_API_ENDPOINT": self.url("gemini"),
+            "GEMINI_API_KEY": "benchmark-key",
+            "WIKIPEDIA_API_URL": self.url("wikipedia") + "/w/api.php",
+            "HEALTH_GOV_API_URL": self.url("health_gov") + "/myhealthfinder/api/v3/topicsearch.json",
+        }
+
+def add_behaviour_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=100, help="Base upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- jitter on upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+
+def behaviour_from_args(args):
+    return UpstreamBehaviour(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run MedAssist upstream stand-ins")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+    standins = UpstreamStandIns(behaviour_from_args(args)).start()
+    for key, value in standins.app_environment().items():
+        print(f"export {key}='{value}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standins.stop()
@@ -0,0 +1,67 @@
+"""
+Response compression for MedAssist.
+
+Rendered pages and JSON such as the chat history shrink several times when
+compressed. compress() encodes a finished response with brotli when the
+client accepts it (and the brotli package is installed), else with gzip.
+
+Streamed responses (exports) are left alone so they still reach the client
+as they are generated, and so are file responses: built static assets are
+compressed ahead of time (see assets.py).
+"""
+
+import os
+import gzip
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    print("Warning: brotli not installed. Responses will be gzip-compressed only.")
+    BROTLI_AVAILABLE = False
+
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() != "false"
+# Smaller bodies gain less than the encoding costs
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+# Per-response levels; lower than the build's, which compresses once
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/javascript",
+    "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml",
+}
+
+def choose_encoding(accept_encodings):
+    """"br" or "gzip" from the request's Accept-Encoding, or None"""
+    if BROTLI_AVAILABLE and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+def compress(response, accept_encodings):
+    """Compress a finished response in place, if it is worth it and the client accepts it"""
+    if (not COMPRESSION_ENABLED or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_TYPES
+            or response.status_code < 200 or response.status_code in (204, 206, 304)):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    # Caches must keep the plain and compressed bodies apart
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+    # A strong ETag promises the same bytes, which the compressed body no longer is
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -3,10 +3,15 @@ MongoDB Setup Utility for MedAssist
 
 This script initializes the MongoDB database and collections for MedAssist.
 It's meant to be run once to set up the database structure.
+
+Usage:
+    python db_setup.py                       # create collections and indexes
+    python db_setup.py grant-admin <email>   # allow a user to use the admin endpoints
 """
 
 import pymongo
 import os
+import sys
 from datetime import datetime
 from werkzeug.security import generate_password_hash
 
@@ -71,6 +76,14 @@ def setup_database():
                         "last_login": {
                             "bsonType": ["date", "null"],
                             "description": "Last login timestamp"
+                        },
+                        "is_admin": {
+                            "bsonType": ["bool", "null"],
+                            "description": "Allowed to use the admin endpoints (set with grant-admin)"
+                        },
+                        "timezone": {
+                            "bsonType": ["string", "null"],
+                            "description": "IANA timezone reported by the user's browser; reminder times are local to it"
                         }
                     }
                 }
@@ -82,7 +95,8 @@ def setup_database():
             db.users.create_index("user_id", unique=True)
             print("Created indexes on users collection")
             
-            # Create a default admin user
+            # Create a default admin user; its password is published, so it
+            # gets no admin rights until granted with grant-admin
             default_admin = {
                 "email": "admin@medassist.com",
                 "password_hash": generate_password_hash("admin123"),
@@ -95,82 +109,129 @@ def setup_database():
             db.users.insert_one(default_admin)
             print("Created default admin user (admin@medassist.com / admin123)")
         
-        # Medications collection
-        if "medications" not in db.list_collection_names():
-            db.create_collection("medications", validator={
-                "$jsonSchema": {
-                    "bsonType": "object",
-                    "required": ["user_id", "name"],
-                    "properties": {
-                        "user_id": {
-                            "bsonType": "string",
-                            "description": "User ID this medication belongs to"
-                        },
-                        "name": {
-                            "bsonType": "string",
-                            "description": "Name of the medication"
-                        },
-                        "info": {
-                            "bsonType": ["string", "null"],
-                            "description": "Information about the medication"
-                        },
-                        "time": {
-                            "bsonType": ["string", "null"],
-                            "description": "Time for the daily reminder"
-                        },
-                        "condition": {
-                            "bsonType": ["string", "null"],
-                            "description": "Condition this medication is for"
-                        },
-                        "created_at": {
-                            "bsonType": "date",
-                            "description": "When this medication was added"
-                        },
-                        "last_taken": {
-                            "bsonType": ["date", "null"],
-                            "description": "When this medication was last taken"
-                        }
+        # Medications collection; reminders carry a recurrence rule and
+        # the time of their next dose (see schedule.py)
+        medications_validator = {
+            "$jsonSchema": {
+                "bsonType": "object",
+                "required": ["user_id", "name"],
+                "properties": {
+                    "user_id": {
+                        "bsonType": "string",
+                        "description": "User ID this medication belongs to"
+                    },
+                    "name": {
+                        "bsonType": "string",
+                        "description": "Name of the medication"
+                    },
+                    "info": {
+                        "bsonType": ["string", "null"],
+                        "description": "Information about the medication"
+                    },
+                    "time": {
+                        "bsonType": ["string", "null"],
+                        "description": "Time for the daily reminder"
+                    },
+                    "condition": {
+                        "bsonType": ["string", "null"],
+                        "description": "Condition this medication is for"
+                    },
+                    "created_at": {
+                        "bsonType": "date",
+                        "description": "When this medication was added"
+                    },
+                    "last_taken": {
+                        "bsonType": ["date", "null"],
+                        "description": "When this medication was last taken"
+                    },
+                    "schedule": {
+                        "bsonType": ["object", "null"],
+                        "description": "Recurrence rule of the reminder (see schedule.py)"
+                    },
+                    "next_due_at": {
+                        "bsonType": ["date", "null"],
+                        "description": "When the next dose is due (UTC); null once a course has ended"
                     }
                 }
-            })
+            }
+        }
+        if "medications" not in db.list_collection_names():
+            db.create_collection("medications", validator=medications_validator)
             print("Created medications collection")
             
             # Create indexes
             db.medications.create_index([("user_id", 1), ("name", 1)], unique=True)
             print("Created index on medications collection")
+        else:
+            db.command("collMod", "medications", validator=medications_validator)
+            print("Updated medications validator")
         
-        # Chat history collection
-        if "chat_history" not in db.list_collection_names():
-            db.create_collection("chat_history", validator={
-                "$jsonSchema": {
-                    "bsonType": "object",
-                    "required": ["user_id", "role", "content", "timestamp"],
-                    "properties": {
-                        "user_id": {
-                            "bsonType": "string",
-                            "description": "User ID this chat message belongs to"
-                        },
-                        "role": {
-                            "bsonType": "string",
-                            "description": "Role (user or bot)"
-                        },
-                        "content": {
-                            "bsonType": "string",
-                            "description": "Message content"
-                        },
-                        "timestamp": {
-                            "bsonType": "date",
-                            "description": "When this message was sent"
-                        }
+        # "What is due next" is a range scan on this index
+        db.medications.create_index([("user_id", 1), ("next_due_at", 1)])
+        
+        # Chat history collection; large bot replies carry a content_ref
+        # into bot_responses instead of their content (see response_store.py)
+        chat_history_validator = {
+            "$jsonSchema": {
+                "bsonType": "object",
+                "required": ["user_id", "role", "timestamp"],
+                "anyOf": [
+                    {"required": ["content"]},
+                    {"required": ["content_ref"]}
+                ],
+                "properties": {
+                    "user_id": {
+                        "bsonType": "string",
+                        "description": "User ID this chat message belongs to"
+                    },
+                    "role": {
+                        "bsonType": "string",
+                        "description": "Role (user or bot)"
+                    },
+                    "content": {
+                        "bsonType": "string",
+                        "description": "Message content"
+                    },
+                    "content_ref": {
+                        "bsonType": "string",
+                        "description": "SHA-256 of the content, stored in bot_responses"
+                    },
+                    "timestamp": {
+                        "bsonType": "date",
+                        "description": "When this message was sent"
+                    },
+                    "intent": {
+                        "bsonType": ["string", "null"],
+                        "description": "Chat intent of the turn (see detect_intent in app.py)"
+                    },
+                    "lookup_ok": {
+                        "bsonType": ["bool", "null"],
+                        "description": "Whether a disease or drug lookup found an answer"
                     }
                 }
-            })
+            }
+        }
+        if "chat_history" not in db.list_collection_names():
+            db.create_collection("chat_history", validator=chat_history_validator)
             print("Created chat_history collection")
             
             # Create indexes
             db.chat_history.create_index("user_id")
             db.chat_history.create_index("timestamp")
             print("Created indexes on chat_history collection")
+        else:
+            db.command("collMod", "chat_history", validator=chat_history_validator)
+            print("Updated chat_history validator")
+        
+        # Exports page through a user's messages in _id order (see export.py)
+        db.chat_history.create_index([("user_id", 1), ("_id", 1)])
+        # Search catches up on a user's messages in timestamp order (see search_index.py)
+        db.chat_history.create_index([("user_id", 1), ("timestamp", 1), ("_id", 1)])
+        
+        # Deduplicated bot responses, keyed by the SHA-256 of their content
+        if "bot_responses" not in db.list_collection_names():
+            db.create_collection("bot_responses")
+            print("Created bot_responses collection")
         
         # Sessions collection
         if "sessions" not in db.list_collection_names():
@@ -179,9 +240,40 @@ def setup_database():
             
             # Create indexes
             db.sessions.create_index("user_id")
-            db.sessions.create_index("expiry")  # For session expiration
             print("Created indexes on sessions collection")
         
+        # Expire sessions at their `expiry` (set on every update, see retention.py);
+        # older setups created a plain index on it
+        expiry_index = db.sessions.index_information().get("expiry_1")
+        if expiry_index is None or "expireAfterSeconds" not in expiry_index:
+            if expiry_index is not None:
+                db.sessions.drop_index("expiry_1")
+            db.sessions.create_index("expiry", expireAfterSeconds=0)
+            print("Created TTL index on sessions collection")
+        
+        # Lookup leases collection (cross-worker single-flight, see singleflight.py)
+        if "lookup_leases" not in db.list_collection_names():
+            db.create_collection("lookup_leases")
+            print("Created lookup_leases collection")
+            
+            # Expire abandoned leases
+            db.lookup_leases.create_index("expires_at", expireAfterSeconds=0)
+            print("Created TTL index on lookup_leases collection")
+        
+        # Persistent lookup cache (third cache tier, see lookup_cache.py)
+        if "lookup_cache" not in db.list_collection_names():
+            db.create_collection("lookup_cache")
+            print("Created lookup_cache collection")
+            
+            # Expire stale lookups
+            db.lookup_cache.create_index("expires_at", expireAfterSeconds=0)
+            print("Created TTL index on lookup_cache collection")
+        
+        # Analytics rollups (see analytics.py)
+        db.analytics_intents.create_index("day")
+        db.analytics_active_users.create_index("day")
+        print("Created indexes on analytics collections")
+        
         print("\nDatabase setup completed successfully!")
         return True
     
@@ -189,5 +281,17 @@ def setup_database():
         print(f"Error setting up database: {str(e)}")
         return False
 
+def grant_admin(email):
+    """Give the account with exactly this email access to the admin endpoints"""
+    client = pymongo.MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017/medassist"))
+    result = client.get_database().users.update_one({"email": email}, {"$set": {"is_admin": True}})
+    if result.matched_count:
+        print(f"Granted admin access to {email}")
+    else:
+        print(f"No user with email {email}")
+    return bool(result.matched_count)
+
 if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "grant-admin":
+        sys.exit(0 if grant_admin(sys.argv[2]) else 1)
     setup_database()
@@ -0,0 +1,64 @@
+"""
+Request deadline module for MedAssist.
+
+This module tracks how much of a request's latency budget is left, so that
+every downstream call (OpenFDA, Gemini, fallback APIs, web search) is only
+given the time that remains.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+
+# Total time (in seconds) a request may spend from entry to response
+REQUEST_LATENCY_BUDGET = float(os.environ.get("REQUEST_LATENCY_BUDGET", "10"))
+
+# Below this many seconds a downstream call is not worth starting
+MIN_CALL_TIMEOUT = 0.05
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's latency budget has run out"""
+
+class Deadline:
+    """Point in time by which the current request must have responded"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """Check whether there is too little time left for another call"""
+        return self.remaining() < MIN_CALL_TIMEOUT
+
+    def check(self):
+        """Raise DeadlineExceeded if the budget has run out"""
+        if self.expired():
+            raise DeadlineExceeded(f"latency budget of {self.budget}s exhausted")
+
+    def timeout(self, cap):
+        """Timeout for the next downstream call: the remaining time, at most `cap`"""
+        self.check()
+        return min(cap, self.remaining())
+
+_current_deadline = ContextVar("medassist_deadline", default=None)
+
+def start(budget=None):
+    """Start a new deadline for the current request"""
+    deadline = Deadline(REQUEST_LATENCY_BUDGET if budget is None else budget)
+    _current_deadline.set(deadline)
+    return deadline
+
+def clear():
+    """Forget the current request's deadline"""
+    _current_deadline.set(None)
+
+def current():
+    """Deadline of the current request, or an unlimited one outside a request"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return Deadline(float("inf"))
+    return deadline
@@ -0,0 +1,224 @@
+"""
+Streaming export of a user's chat history and medication reminders.
+
+Exports are generated from a server-side cursor in batches of
+EXPORT_BATCH_SIZE messages, so memory use does not depend on the size of the
+history. Messages moved out of chat_history by retention.py come first,
+read from the archive day by day (skipping any that were restored, which
+follow with the rest); an archival run during an export can move messages
+it has not reached yet out of it. Formats:
+
+- ndjson: one JSON object per line; medications first ("type":
+  "medication"), then messages ("type": "message").
+- csv: messages only.
+- zip: chat_history.csv and medications.csv.
+
+Every EXPORT_CURSOR_EVERY messages the export carries a signed cursor token
+(a {"type": "cursor"} line in NDJSON, the `cursor` column in CSV). Passing
+the last token received as ?cursor= continues the export right after that
+message. The export covers the messages that existed when it started, also
+across resumes, and a token only works for the user it was issued for.
+"""
+
+import os
+import csv
+import json
+import zipfile
+from itertools import chain
+from datetime import date, datetime
+from itsdangerous import URLSafeSerializer, BadSignature
+import resources
+import response_store
+import retention
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+EXPORT_CURSOR_EVERY = int(os.environ.get("EXPORT_CURSOR_EVERY", "1000"))
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "zip": ("application/zip", "zip"),
+}
+MESSAGE_COLUMNS = ["timestamp", "role", "intent", "content", "cursor"]
+MEDICATION_COLUMNS = ["name", "time", "condition", "info", "created_at", "last_taken"]
+
+chat_history_collection = resources.collection("chat_history")
+medications_collection = resources.collection("medications")
+
+class InvalidCursor(Exception):
+    """Raised for a cursor token that is forged or belongs to another export"""
+
+def _serializer(secret):
+    return URLSafeSerializer(secret, salt="medassist-chat-export")
+
+def start(user_id, secret, token=None):
+    """Position to export from: {"user_id", "phase", "day", "after", "upto"}
+
+    phase is "archive" (day is the archive date being read) or "active";
+    after and upto are message _ids as strings.
+    """
+    if token:
+        try:
+            position = _serializer(secret).loads(token)
+        except BadSignature:
+            raise InvalidCursor("cursor token is not valid")
+        if position.get("user_id") != user_id:
+            raise InvalidCursor("cursor token belongs to another export")
+        return position
+    from bson import ObjectId
+    newest = chat_history_collection.find_one({"user_id": user_id}, {"_id": 1}, sort=[("_id", -1)])
+    return {"user_id": user_id, "phase": "archive", "day": None, "after": None,
+            "upto": str(newest["_id"]) if newest else str(ObjectId())}
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _archived(position):
+    """(message, position after it) for the user's archived messages, oldest date first"""
+    if position.get("phase", "active") != "archive":
+        return
+    resume_day = date.fromisoformat(position["day"]) if position["day"] else None
+    for day in retention.archived_days():
+        if resume_day and day < resume_day:
+            continue
+        skip_to = position["after"] if day == resume_day else None
+        batch = []
+        for message in retention.read_archive_day(day, position["user_id"]):
+            if skip_to:
+                if str(message["_id"]) == skip_to:
+                    skip_to = None
+                continue
+            batch.append(message)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield from _not_restored(batch, day, position)
+                batch = []
+        yield from _not_restored(batch, day, position)
+
+def _not_restored(batch, day, position):
+    # Restored messages are exported from chat_history instead, one query per batch
+    if not batch:
+        return
+    restored = {m["_id"] for m in chat_history_collection.find({"_id": {"$in": [m["_id"] for m in batch]}}, {"_id": 1})}
+    for message in batch:
+        if message["_id"] not in restored:
+            yield message, {**position, "phase": "archive", "day": day.isoformat(), "after": str(message["_id"])}
+
+def _active(position):
+    """(message, position after it) for the user's messages in chat_history, oldest first"""
+    from bson import ObjectId
+    id_range = {"$lte": ObjectId(position["upto"])}
+    if position.get("phase", "active") == "active" and position["after"]:
+        id_range["$gt"] = ObjectId(position["after"])
+    cursor = chat_history_collection.find(
+        {"user_id": position["user_id"], "_id": id_range},
+        {"user_id": 0}
+    ).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    for message in cursor:
+        yield message, {**position, "phase": "active", "day": None, "after": str(message["_id"])}
+
+def iter_messages(position, secret):
+    """Yield (message, cursor token or None) for the messages after position, oldest first"""
+    serializer = _serializer(secret)
+    count = 0
+    batch = []
+    for item in chain(_archived(position), _active(position)):
+        batch.append(item)
+        if len(batch) < EXPORT_BATCH_SIZE:
+            continue
+        for exported in _emit(batch, serializer, count):
+            count += 1
+            yield exported
+        batch = []
+    for exported in _emit(batch, serializer, count):
+        count += 1
+        yield exported
+
+def _emit(batch, serializer, count):
+    # One bot_responses query per batch for the replies stored by reference
+    response_store.resolve([message for message, _ in batch])
+    for offset, (message, resume) in enumerate(batch, 1):
+        token = None
+        if (count + offset) % EXPORT_CURSOR_EVERY == 0:
+            token = serializer.dumps(resume)
+        yield {
+            "timestamp": _iso(message.get("timestamp")),
+            "role": message.get("role"),
+            "intent": message.get("intent"),
+            "content": message.get("content", ""),
+        }, token
+
+def iter_medications(user_id):
+    for medication in medications_collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).sort("name", 1):
+        yield {column: _iso(medication.get(column)) for column in MEDICATION_COLUMNS}
+
+def ndjson(user_id, position, secret):
+    if not position["after"]:
+        for medication in iter_medications(user_id):
+            yield json.dumps({"type": "medication", **medication}) + "\n"
+    for message, token in iter_messages(position, secret):
+        yield json.dumps({"type": "message", **message}) + "\n"
+        if token:
+            yield json.dumps({"type": "cursor", "cursor": token}) + "\n"
+    yield json.dumps({"type": "end"}) + "\n"
+
+class _Buffer:
+    """Write target whose contents are taken after every row"""
+
+    def __init__(self, empty):
+        self.empty = empty
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = self.empty.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _csv_rows(columns, rows):
+    buffer = _Buffer("")
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.take()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.take()
+
+def _message_rows(position, secret):
+    for message, token in iter_messages(position, secret):
+        yield {**message, "cursor": token or ""}
+
+def csv_export(position, secret):
+    return _csv_rows(MESSAGE_COLUMNS, _message_rows(position, secret))
+
+def zip_export(user_id, position, secret):
+    """Stream a zip archive; zipfile writes to unseekable outputs with data descriptors"""
+    output = _Buffer(b"")
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        entries = [("chat_history.csv", csv_export(position, secret))]
+        if not position["after"]:
+            entries.append(("medications.csv", _csv_rows(MEDICATION_COLUMNS, iter_medications(user_id))))
+        for name, chunks in entries:
+            with archive.open(name, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk.encode("utf-8"))
+                    data = output.take()
+                    if data:
+                        yield data
+    yield output.take()
+
+def generate(fmt, user_id, position, secret):
+    """Chunks of the export in format fmt (see FORMATS)"""
+    if fmt == "ndjson":
+        return ndjson(user_id, position, secret)
+    if fmt == "csv":
+        return csv_export(position, secret)
+    return zip_export(user_id, position, secret)
+
+def filename(fmt, user_id):
+    return f"medassist-export-{user_id}-{datetime.now().strftime('%Y%m%d')}.{FORMATS[fmt][1]}"
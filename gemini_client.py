@@ -0,0 +1,317 @@
+"""
+Gemini client layer for MedAssist.
+
+Every Gemini call goes through generate(), which:
+
+1. Reserves quota from a requests-per-minute and tokens-per-minute governor
+   shared by all processes on the machine (a local SQLite file), so workers
+   together stay under GEMINI_RPM / GEMINI_TPM. Non-interactive calls cannot
+   use the last GEMINI_INTERACTIVE_RESERVE fraction of either budget. Quota
+   is reserved once per call, retries included, and given back if the call
+   never reaches Gemini (shed while queueing for a slot).
+2. Waits for one of GEMINI_MAX_CONCURRENCY slots in this process. Waiters are
+   served by priority: interactive chat first, then background refreshes
+   (prefetch_popular.py), then batch population scripts. A waiter gains one
+   level for every GEMINI_PRIORITY_AGING seconds it has waited, so batch work
+   still gets through while chat is busy. Quota is waited for first, so a
+   call sleeping on it does not hold a slot others could use.
+3. Retries quota (429) and transient server errors with exponential backoff,
+   honouring the retry delay Gemini sends; a 429 pauses every process until
+   that delay has passed.
+
+Interactive calls never wait past the current request's deadline (see
+deadlines.py): if the queue or quota would make them miss it, they fail fast
+with DeadlineExceeded.
+"""
+
+import os
+import re
+import time
+import random
+import sqlite3
+import tempfile
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import deadlines
+from deadlines import DeadlineExceeded
+import resources
+import telemetry
+from local_db import LocalDatabase
+
+# Priorities (lower is served first)
+INTERACTIVE = 0
+BACKGROUND = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BATCH: "batch"}
+
+# Per-call timeout (in seconds); interactive calls also get no more than the request's remaining budget
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "8"))
+# Concurrent Gemini calls per process
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+# Seconds of waiting for a slot that count as one priority level
+GEMINI_PRIORITY_AGING = float(os.environ.get("GEMINI_PRIORITY_AGING", "10"))
+# Quota of the API key, shared by every process on the machine
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", "1000000"))
+# Fraction of each budget only interactive calls may use
+GEMINI_INTERACTIVE_RESERVE = float(os.environ.get("GEMINI_INTERACTIVE_RESERVE", "0.2"))
+# Tokens assumed for a response until the real usage is known
+GEMINI_OUTPUT_TOKEN_ESTIMATE = int(os.environ.get("GEMINI_OUTPUT_TOKEN_ESTIMATE", "600"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.environ.get("GEMINI_BACKOFF_BASE", "1"))
+GEMINI_BACKOFF_MAX = float(os.environ.get("GEMINI_BACKOFF_MAX", "60"))
+GEMINI_QUOTA_DB_PATH = os.environ.get(
+    "GEMINI_QUOTA_DB_PATH", os.path.join(tempfile.gettempdir(), "medassist-gemini-quota.sqlite3")
+)
+
+RETRY_DELAY_PATTERNS = (
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+)
+
+_priority = ContextVar("medassist_gemini_priority", default=INTERACTIVE)
+
+@contextmanager
+def priority(level):
+    """Run Gemini calls made in this block (and in threads it hands its context to) at `level`"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class _PrioritySlots:
+    """Bounded pool of call slots, handed to waiters in priority order, aged by how long they have waited"""
+
+    def __init__(self, size, aging=GEMINI_PRIORITY_AGING):
+        self.size = size
+        self.aging = aging
+        self.in_use = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _rank(self, entry, now):
+        level, seq, _, queued_at = entry
+        return (level - (now - queued_at) / self.aging if self.aging > 0 else level, seq)
+
+    def acquire(self, level, timeout):
+        """Take a slot, waiting at most timeout seconds; returns whether it was taken"""
+        with self._cond:
+            if self.in_use < self.size and not self._waiters:
+                self.in_use += 1
+                return True
+            # [priority, arrival order, granted, queued at]
+            entry = [level, next(self._seq), False, time.monotonic()]
+            self._waiters.append(entry)
+            telemetry.record_gemini_queue(PRIORITY_NAMES[level], 1)
+            give_up_at = time.monotonic() + timeout
+            try:
+                while not entry[2]:
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        self._waiters.remove(entry)
+                        return False
+                    self._cond.wait(None if remaining == float("inf") else remaining)
+                return True
+            finally:
+                telemetry.record_gemini_queue(PRIORITY_NAMES[level], -1)
+
+    def release(self):
+        with self._cond:
+            if self._waiters:
+                # Hand the slot straight to the most urgent waiter; the queue is short, so a scan will do
+                now = time.monotonic()
+                entry = min(self._waiters, key=lambda waiter: self._rank(waiter, now))
+                self._waiters.remove(entry)
+                entry[2] = True
+                self._cond.notify_all()
+            else:
+                self.in_use -= 1
+
+class QuotaGovernor:
+    """Requests- and tokens-per-minute buckets shared through a local SQLite file"""
+
+    def __init__(self, path=GEMINI_QUOTA_DB_PATH, rpm=GEMINI_RPM, tpm=GEMINI_TPM, reserve=GEMINI_INTERACTIVE_RESERVE):
+        self.buckets = {"requests": (rpm, rpm / 60), "tokens": (tpm, tpm / 60)}
+        self.reserve = reserve
+        self.db = LocalDatabase(path, schema=(
+            "CREATE TABLE IF NOT EXISTS quota ("
+            " name TEXT PRIMARY KEY,"
+            " level REAL NOT NULL,"
+            " updated_at REAL NOT NULL)",
+        ))
+
+    def reserve_call(self, tokens, level):
+        """Reserve one request and `tokens` tokens; returns 0 on success, else seconds to wait before retrying"""
+        conn = self.db.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT level FROM quota WHERE name = 'cooldown'").fetchone()
+            if row is not None and row[0] > now:
+                conn.execute("COMMIT")
+                return row[0] - now
+
+            wants = {"requests": 1, "tokens": tokens}
+            levels = {}
+            wait = 0
+            for name, (capacity, rate) in self.buckets.items():
+                row = conn.execute("SELECT level, updated_at FROM quota WHERE name = ?", (name,)).fetchone()
+                current = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                floor = 0 if level == INTERACTIVE else capacity * self.reserve
+                # A single call larger than the bucket only needs a full bucket
+                need = min(wants[name], capacity - floor)
+                if current - need < floor:
+                    wait = max(wait, (floor + need - current) / rate)
+                levels[name] = current
+            if wait == 0:
+                for name in self.buckets:
+                    levels[name] -= wants[name]
+            conn.executemany(
+                "INSERT OR REPLACE INTO quota (name, level, updated_at) VALUES (?, ?, ?)",
+                [(name, value, now) for name, value in levels.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, tokens):
+        """Give back a reservation for a call that was never made"""
+        conn = self.db.connection()
+        conn.execute("UPDATE quota SET level = level + 1 WHERE name = 'requests'")
+        conn.execute("UPDATE quota SET level = level + ? WHERE name = 'tokens'", (tokens,))
+
+    def charge_tokens(self, tokens):
+        """Correct the token bucket once a call's real usage is known (may go into debt)"""
+        self.db.connection().execute("UPDATE quota SET level = level - ? WHERE name = 'tokens'", (tokens,))
+
+    def cool_down(self, seconds):
+        """Pause all calls for `seconds` (after a quota error)"""
+        until = time.time() + seconds
+        self.db.connection().execute(
+            "INSERT INTO quota (name, level, updated_at) VALUES ('cooldown', ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET level = MAX(level, excluded.level), updated_at = excluded.updated_at",
+            (until, time.time())
+        )
+
+_slots = _PrioritySlots(GEMINI_MAX_CONCURRENCY)
+governor = QuotaGovernor()
+telemetry.set_pool_size("gemini", GEMINI_MAX_CONCURRENCY)
+
+def estimate_tokens(prompt):
+    # Roughly four characters per token for English text
+    return len(prompt) // 4 + GEMINI_OUTPUT_TOKEN_ESTIMATE
+
+def retry_delay(error):
+    """Retry delay (in seconds) sent with a Gemini error, if any"""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    message = str(error)
+    for pattern in RETRY_DELAY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def _classify(error):
+    """Return "rate_limited", "transient" or None (not retryable) for a Gemini error"""
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        return None
+    if isinstance(error, google_exceptions.ResourceExhausted):
+        return "rate_limited"
+    if isinstance(error, (google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                          google_exceptions.DeadlineExceeded)):
+        return "transient"
+    return None
+
+def _wait_for_quota(tokens, level, deadline, label):
+    while True:
+        try:
+            wait = governor.reserve_call(tokens, level)
+        except sqlite3.Error as e:
+            print(f"Gemini quota governor error: {str(e)}")
+            return
+        if wait <= 0:
+            return
+        if wait > deadline.remaining():
+            telemetry.record_gemini_call(label, "shed")
+            raise DeadlineExceeded("Gemini quota would not allow this call within the request's budget")
+        time.sleep(wait)
+
+def _refund(tokens):
+    try:
+        governor.refund(tokens)
+    except sqlite3.Error as e:
+        print(f"Gemini quota governor error: {str(e)}")
+
+def generate(prompt, level=None, timeout=GEMINI_TIMEOUT):
+    """Call Gemini's generate_content under the concurrency pool, quota governor and retry policy"""
+    level = _priority.get() if level is None else level
+    label = PRIORITY_NAMES[level]
+    deadline = deadlines.current()
+    tokens = estimate_tokens(prompt)
+
+    # One reservation covers the call and its retries
+    _wait_for_quota(tokens, level, deadline, label)
+    called = False
+    try:
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            deadline.check()
+            queued_at = time.monotonic()
+            if not _slots.acquire(level, deadline.remaining()):
+                telemetry.record_gemini_call(label, "shed")
+                raise DeadlineExceeded("timed out waiting for a Gemini slot")
+            telemetry.observe_gemini_wait(label, time.monotonic() - queued_at)
+            try:
+                with telemetry.pool_slot("gemini"):
+                    with telemetry.span("gemini", kind="upstream", priority=label, attempt=attempt):
+                        call_timeout = deadline.timeout(timeout)
+                        called = True
+                        response = resources.gemini_model().generate_content(
+                            prompt,
+                            request_options={"timeout": call_timeout}
+                        )
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                kind = _classify(e)
+                if kind is None or attempt == GEMINI_MAX_RETRIES:
+                    telemetry.record_gemini_call(label, kind or "error")
+                    raise
+                delay = retry_delay(e)
+                if kind == "rate_limited":
+                    governor.cool_down(delay if delay is not None else GEMINI_BACKOFF_BASE * 2 ** attempt)
+                backoff = delay if delay is not None else random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+                if backoff >= deadline.remaining():
+                    telemetry.record_gemini_call(label, kind)
+                    raise
+                telemetry.record_gemini_call(label, "retried")
+                print(f"Gemini {kind} error, retrying in {backoff:.1f}s: {str(e)}")
+                time.sleep(backoff)
+                continue
+            finally:
+                _slots.release()
+
+            usage = getattr(response, "usage_metadata", None)
+            used = getattr(usage, "total_token_count", None)
+            if used:
+                try:
+                    governor.charge_tokens(used - tokens)
+                except sqlite3.Error as e:
+                    print(f"Gemini quota governor error: {str(e)}")
+            telemetry.record_gemini_call(label, "ok")
+            return response
+    except DeadlineExceeded:
+        # Shed before reaching Gemini: the quota was not used
+        if not called:
+            _refund(tokens)
+        raise
@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for MedAssist.
+
+The app is preloaded in the master so read-only data (disease and medication
+tables, compiled templates) is loaded once and shared copy-on-write by all
+workers. MongoDB and Gemini clients are created in each worker after fork.
+"""
+
+import os
+import gc
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() != "false"
+
+# Metrics from all workers are aggregated through this directory (see telemetry.py).
+# It must be set before prometheus_client is imported, i.e. before the app is preloaded.
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), "medassist-metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+def when_ready(server):
+    if preload_app:
+        # Compile templates once in the master so workers share them
+        import app
+        app.warm_shared_data()
+        # Move everything loaded so far out of the GC's reach, so collections in
+        # the workers do not touch (and un-share) the preloaded objects
+        gc.freeze()
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,177 @@
+"""
+Drug-drug interaction checks for MedAssist.
+
+The dataset in DRUG_INTERACTIONS_PATH (data/drug_interactions.json) has:
+
+- aliases: brand and combination names mapped to their ingredients
+  ("percocet" -> oxycodone, acetaminophen; "paracetamol" -> acetaminophen)
+- classes: named groups of ingredients ("nsaid", "opioid", ...)
+- interactions: pairs of ingredients or classes, with a severity ("major" or
+  "moderate") and a description. A class paired with itself applies to any
+  two different members ("nsaid", "nsaid": two NSAIDs).
+
+It is loaded once per process into an adjacency index: for every normalized
+ingredient, a dict of the ingredients it interacts with. Checking a new
+medication against k others is k dict lookups per ingredient pair, and an
+audit of a whole list only visits the interactions of ingredients the list
+contains. Two medications sharing an ingredient (Paracetamol and Tylenol)
+are reported as a duplicate.
+
+Warnings are advisory; unknown names simply produce none.
+"""
+
+import os
+import re
+import json
+import threading
+
+DRUG_INTERACTIONS_PATH = os.environ.get(
+    "DRUG_INTERACTIONS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "drug_interactions.json")
+)
+# Warnings listed in a chat reply; the rest are counted
+INTERACTION_WARNINGS_SHOWN = 5
+
+SEVERITY_ORDER = {"major": 0, "moderate": 1}
+
+# Combination products: "Hydrocodone and Acetaminophen", "Sulfamethoxazole/Trimethoprim"
+COMBINATION_PATTERN = re.compile(r"\s+(?:and|with|plus)\s+|\s*[/+,&]\s*")
+# Strength and dosage form words that do not change the ingredient
+DOSE_PATTERN = re.compile(
+    r"\b(?:\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|iu|units?|%)?|mg|mcg|ml|iu|tablets?|tabs?|capsules?|caps?"
+    r"|er|xr|sr|dr|xl|cr|od|hcl|oral|injection|cream|gel|drops|syrup|suspension)\b"
+)
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+def normalize(name):
+    return " ".join(WORD_PATTERN.findall(name.lower()))
+
+class InteractionIndex:
+    """Adjacency index of interacting ingredients"""
+
+    def __init__(self, dataset):
+        self.aliases = {
+            normalize(name): [normalize(ingredient) for ingredient in ingredients]
+            for name, ingredients in dataset.get("aliases", {}).items()
+        }
+        classes = {name: [normalize(member) for member in members] for name, members in dataset.get("classes", {}).items()}
+        self.pairs = {}
+        for interaction in dataset.get("interactions", []):
+            first, second = interaction["drugs"]
+            for a in classes.get(first, [normalize(first)]):
+                for b in classes.get(second, [normalize(second)]):
+                    if a != b:
+                        self._add(a, b, interaction)
+
+    def _add(self, a, b, interaction):
+        # Several entries can cover a pair (through different classes); the most severe wins
+        for x, y in ((a, b), (b, a)):
+            current = self.pairs.setdefault(x, {}).get(y)
+            if current is None or SEVERITY_ORDER[interaction["severity"]] < SEVERITY_ORDER[current["severity"]]:
+                self.pairs[x][y] = interaction
+
+    def ingredients(self, name):
+        """Normalized ingredients of a medication name; an unknown name is its own ingredient"""
+        normalized = normalize(name)
+        if normalized in self.aliases:
+            return self.aliases[normalized]
+        found = []
+        for part in COMBINATION_PATTERN.split(name.lower()):
+            part = normalize(DOSE_PATTERN.sub(" ", part))
+            if not part:
+                continue
+            for ingredient in self.aliases.get(part, [part]):
+                if ingredient not in found:
+                    found.append(ingredient)
+        return found or [normalized]
+
+    def _warnings(self, a, a_ingredients, b, b_ingredients, seen):
+        for x in a_ingredients:
+            for y in b_ingredients:
+                if x == y:
+                    warning = {
+                        "type": "duplicate", "severity": "moderate",
+                        "description": f"Both contain {x}; taking both adds up to a higher dose than either alone."
+                    }
+                else:
+                    interaction = self.pairs.get(x, {}).get(y)
+                    if interaction is None:
+                        continue
+                    warning = {"type": "interaction", "severity": interaction["severity"], "description": interaction["description"]}
+                # One warning per pair of medications and reason, however many ingredients lead to it
+                key = (frozenset((a, b)), warning["description"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield {"medications": [a, b], "ingredients": [x, y], **warning}
+
+    def check(self, name, others):
+        """Warnings for adding medication `name` to a list of `others` (names)"""
+        ingredients = self.ingredients(name)
+        warnings, seen = [], set()
+        for other in others:
+            if normalize(other) != normalize(name):
+                warnings.extend(self._warnings(name, ingredients, other, self.ingredients(other), seen))
+        return sorted(warnings, key=_severity_key)
+
+    def audit(self, names):
+        """Warnings for every pair of medications in a list"""
+        holders = {}
+        for name in dict.fromkeys(names):
+            for ingredient in self.ingredients(name):
+                holders.setdefault(ingredient, []).append(name)
+
+        warnings, seen = [], set()
+        for x, x_names in holders.items():
+            for index, a in enumerate(x_names):
+                for b in x_names[index + 1:]:
+                    warnings.extend(self._warnings(a, [x], b, [x], seen))
+            neighbours = self.pairs.get(x, {})
+            # Walk the smaller side: this ingredient's interactions or the list's ingredients
+            for y in (neighbours if len(neighbours) < len(holders) else holders):
+                # Each unordered pair of ingredients once
+                if y <= x or y not in neighbours or y not in holders:
+                    continue
+                for a in x_names:
+                    for b in holders[y]:
+                        if a != b:
+                            warnings.extend(self._warnings(a, [x], b, [y], seen))
+        return sorted(warnings, key=_severity_key)
+
+def _severity_key(warning):
+    return (SEVERITY_ORDER[warning["severity"]], warning["type"] != "interaction", warning["medications"])
+
+_index = None
+_lock = threading.Lock()
+
+def index():
+    """The interaction index of this process, loaded on first use"""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                try:
+                    with open(DRUG_INTERACTIONS_PATH, encoding="utf-8") as dataset:
+                        _index = InteractionIndex(json.load(dataset))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Drug interaction dataset not loaded: {str(e)}")
+                    _index = InteractionIndex({})
+    return _index
+
+def check(name, others):
+    return index().check(name, others)
+
+def audit(names):
+    return index().audit(names)
+
+def describe(warnings, limit=INTERACTION_WARNINGS_SHOWN):
+    """Markdown section listing warnings for a chat reply ("" if there are none)"""
+    if not warnings:
+        return ""
+    lines = ["#### ⚠️ Possible Interactions"]
+    for warning in warnings[:limit]:
+        first, second = warning["medications"]
+        lines.append(f"- **{warning['severity'].title()}:** {first} + {second}: {warning['description']}")
+    if len(warnings) > limit:
+        lines.append(f"- ...and {len(warnings) - limit} more")
+    lines.append("*Please check with your doctor or pharmacist before taking these together.*")
+    return "\n".join(lines)
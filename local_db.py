@@ -0,0 +1,35 @@
+"""
+Local database helper for MedAssist.
+
+Several features keep small amounts of state in SQLite files on the local
+machine so that every gunicorn worker can share it (the lookup cache, the
+admission-control token buckets). This module hands out one connection per
+thread and per process, since SQLite connections must not cross fork.
+"""
+
+import os
+import sqlite3
+import threading
+
+class LocalDatabase:
+    """A SQLite file shared by all local processes"""
+
+    def __init__(self, path, schema=()):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        """Connection for the current thread and process, created on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=2, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=67108864")
+        for statement in self.schema:
+            conn.execute(statement)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,263 @@
+"""
+Lookup cache module for MedAssist.
+
+Drug and disease lookups are cached in three tiers that sit in front of the
+upstream APIs:
+
+1. A small LRU in each process's memory.
+2. A shared SQLite file on the local machine (WAL mode, memory-mapped reads)
+   that every gunicorn worker reads and writes, so a "dengue" answer fetched
+   by one worker is reused by all of them and stored only once.
+3. The `lookup_cache` collection in MongoDB, which outlives restarts and is
+   shared with offline jobs such as prefetch_popular.py.
+
+Cache failures never fail a request: any error is logged and treated as a miss.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import telemetry
+import resources
+from local_db import LocalDatabase
+
+SHARED_CACHE_PATH = os.environ.get(
+    "SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "medassist-lookup-cache.sqlite3")
+)
+# Off for processes whose machine no web worker reads from (see prefetch_popular.py)
+SHARED_CACHE_ENABLED = os.environ.get("SHARED_CACHE_ENABLED", "true").lower() != "false"
+# Upper bound on entries in the shared cache; least recently used entries are evicted
+SHARED_CACHE_MAX_ENTRIES = int(os.environ.get("SHARED_CACHE_MAX_ENTRIES", "5000"))
+# Entries per process kept in memory in front of the shared cache
+LOCAL_CACHE_SIZE = int(os.environ.get("LOCAL_CACHE_SIZE", "256"))
+# How long (in seconds) a cached lookup stays fresh
+LOOKUP_CACHE_TTL = float(os.environ.get("LOOKUP_CACHE_TTL", str(6 * 3600)))
+# How long (in seconds) a lookup is kept in MongoDB
+PERSISTENT_CACHE_TTL = float(os.environ.get("PERSISTENT_CACHE_TTL", str(3 * 24 * 3600)))
+
+# A hit only rewrites last_access if it is older than this, to keep reads mostly read-only
+ACCESS_UPDATE_INTERVAL = 60
+# Fraction of writes that check whether the shared cache is over its size bound
+EVICTION_CHECK_RATE = 0.05
+
+class SharedCache:
+    """Bounded LRU key/value store in a SQLite file shared by all local processes"""
+
+    def __init__(self, path=SHARED_CACHE_PATH, max_entries=SHARED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.db = LocalDatabase(path, schema=(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)",
+        ))
+
+    def _connection(self):
+        return self.db.connection()
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at, last_access FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, last_access = row
+            now = time.time()
+            if expires_at < now:
+                return None
+            if now - last_access > ACCESS_UPDATE_INTERVAL:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Shared cache read error: {str(e)}")
+            return None
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            if random.random() < EVICTION_CHECK_RATE:
+                self.evict()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Shared cache write error: {str(e)}")
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Shared cache delete error: {str(e)}")
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+class PersistentCache:
+    """Key/value store in a MongoDB collection with a TTL index on expires_at"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, key):
+        """Return (value, expires_at timestamp) for key, or None"""
+        from pymongo.errors import PyMongoError
+        try:
+            doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        except PyMongoError as e:
+            print(f"Persistent cache read error: {str(e)}")
+            return None
+        if doc is None:
+            return None
+        return doc["value"], doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+
+    def set(self, key, value, ttl):
+        from pymongo.errors import PyMongoError
+        now = datetime.now(timezone.utc)
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {"value": value, "updated_at": now, "expires_at": now + timedelta(seconds=ttl)},
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"Persistent cache write error: {str(e)}")
+
+    def delete(self, key):
+        from pymongo.errors import PyMongoError
+        try:
+            self.collection.delete_one({"_id": key})
+        except PyMongoError as e:
+            print(f"Persistent cache delete error: {str(e)}")
+
+class NoSharedCache:
+    """Stands in for the shared cache where it is disabled"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+class LookupCache:
+    """Per-process LRU backed by the shared and persistent caches, for one kind of lookup"""
+
+    def __init__(self, namespace, ttl=LOOKUP_CACHE_TTL, local_size=LOCAL_CACHE_SIZE, shared=None,
+                 persistent=None, persistent_ttl=PERSISTENT_CACHE_TTL):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_size = local_size
+        self.shared = shared if shared is not None else shared_cache
+        self.persistent = persistent if persistent is not None else persistent_cache
+        self.persistent_ttl = persistent_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key.strip().lower()}"
+
+    def _get_local(self, full_key):
+        with self._lock:
+            entry = self._local.get(full_key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._local[full_key]
+                return None
+            self._local.move_to_end(full_key)
+            return value
+
+    def _set_local(self, full_key, value, expires_at):
+        with self._lock:
+            self._local[full_key] = (value, expires_at)
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def get(self, key):
+        """Look key up in memory, then in the shared cache, then in MongoDB"""
+        return self._lookup(key, record=True)
+
+    def peek(self, key):
+        """Like get, but without counting towards the hit rate metrics (for polling)"""
+        return self._lookup(key, record=False)
+
+    def _lookup(self, key, record):
+        full_key = self._key(key)
+        value = self._get_local(full_key)
+        if record:
+            telemetry.record_cache(f"{self.namespace}:local", value is not None)
+        if value is not None:
+            return value
+
+        value = self.shared.get(full_key)
+        if record:
+            telemetry.record_cache(f"{self.namespace}:shared", value is not None)
+        if value is not None:
+            # The shared entry may be older, but keeping it locally for a full ttl is close enough
+            self._set_local(full_key, value, time.time() + self.ttl)
+            return value
+
+        entry = self.persistent.get(full_key)
+        if record:
+            telemetry.record_cache(f"{self.namespace}:persistent", entry is not None)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        ttl = min(self.ttl, expires_at - time.time())
+        self._set_local(full_key, value, time.time() + ttl)
+        self.shared.set(full_key, value, ttl)
+        return value
+
+    def expires_in(self, key):
+        """Seconds until the persistent entry for key expires, or None if there is none"""
+        entry = self.persistent.get(self._key(key))
+        return None if entry is None else entry[1] - time.time()
+
+    def set(self, key, value):
+        """Store value in all tiers"""
+        full_key = self._key(key)
+        self._set_local(full_key, value, time.time() + self.ttl)
+        self.shared.set(full_key, value, self.ttl)
+        self.persistent.set(full_key, value, self.persistent_ttl)
+
+    def delete(self, key):
+        full_key = self._key(key)
+        with self._lock:
+            self._local.pop(full_key, None)
+        self.shared.delete(full_key)
+        self.persistent.delete(full_key)
+
+shared_cache = SharedCache() if SHARED_CACHE_ENABLED else NoSharedCache()
+persistent_cache = PersistentCache(resources.collection("lookup_cache"))
+
+drug_info_cache = LookupCache("drug_info")
+disease_info_cache = LookupCache("disease_info")
+fallback_cache = LookupCache("fallback")
@@ -0,0 +1,304 @@
+"""
+Data migrations for MedAssist.
+
+A migration is a list of steps, each over one collection:
+
+- Server-side steps run one update_many (update document or pipeline) per
+  partition, so no document travels to this process.
+- Batch steps stream the matching documents with a cursor sorted by _id and
+  hand them to a function in batches of MIGRATION_BATCH_SIZE; the function
+  applies its changes with chunked unordered bulk writes (see bulk()).
+
+Each step splits its collection into _id ranges ($bucketAuto) that run in
+parallel on MIGRATION_WORKERS threads. Progress is checkpointed per partition
+in the `migrations` collection (the last _id done for batch steps), so an
+interrupted run resumes where it stopped. A step's query must only match
+documents still needing the change, which makes re-running a step harmless.
+
+With --dry-run, nothing is written: server-side steps count the documents
+their query matches and batch steps report how many documents they would
+change.
+
+Usage:
+    python migrations.py [--dry-run] [--workers N] [--partitions N] [name ...]
+    python migrations.py --list
+"""
+
+import os
+import re
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import resources
+import response_store
+import schedule
+
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "1000"))
+MIGRATION_WORKERS = int(os.environ.get("MIGRATION_WORKERS", "4"))
+MIGRATION_PARTITIONS = int(os.environ.get("MIGRATION_PARTITIONS", "8"))
+
+migrations_collection = resources.collection("migrations")
+
+class Step:
+    """One pass of a migration over a collection: a server-side `update` or a batch function `apply`"""
+
+    def __init__(self, name, collection, query, update=None, apply=None, projection=None):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.update = update
+        # apply(docs, dry_run) -> number of documents changed (or that would be)
+        self.apply = apply
+        self.projection = projection
+
+class Migration:
+    def __init__(self, name, description, steps):
+        self.name = name
+        self.description = description
+        self.steps = steps
+
+def bulk(collection, operations, dry_run, chunk_size=MIGRATION_BATCH_SIZE):
+    """Apply write operations in unordered chunks; returns how many there were"""
+    if not dry_run:
+        for start in range(0, len(operations), chunk_size):
+            resources.collection(collection).bulk_write(operations[start:start + chunk_size], ordered=False)
+    return len(operations)
+
+def _partition_bounds(step, partitions):
+    """Lower _id bound of each partition of the documents step.query matches"""
+    if partitions <= 1:
+        return [None]
+    buckets = list(resources.collection(step.collection).aggregate([
+        {"$match": step.query},
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": partitions}}
+    ]))
+    # The first and last partition are open-ended, so documents added since are covered too
+    return [None] + [bucket["_id"]["min"] for bucket in buckets[1:]]
+
+def _range_filter(step, low, high, after=None):
+    id_range = {}
+    if after is not None:
+        id_range["$gt"] = after
+    elif low is not None:
+        id_range["$gte"] = low
+    if high is not None:
+        id_range["$lt"] = high
+    return {**step.query, "_id": id_range} if id_range else dict(step.query)
+
+class _Checkpoint:
+    """Progress of one step, kept in the migration's document"""
+
+    def __init__(self, migration, step):
+        self.migration = migration
+        self.step = step
+        self.prefix = f"steps.{step.name}"
+
+    def load(self):
+        doc = migrations_collection.find_one({"_id": self.migration.name}, {self.prefix: 1}) or {}
+        return doc.get("steps", {}).get(self.step.name)
+
+    def start(self, partitions):
+        migrations_collection.update_one(
+            {"_id": self.migration.name},
+            {"$set": {self.prefix: {"partitions": partitions, "done": False}},
+             "$setOnInsert": {"started_at": datetime.now()}},
+            upsert=True
+        )
+
+    def advance(self, index, last=None, changed=0, done=False):
+        update = {"$inc": {f"{self.prefix}.partitions.{index}.changed": changed}}
+        fields = {}
+        if last is not None:
+            fields[f"{self.prefix}.partitions.{index}.last"] = last
+        if done:
+            fields[f"{self.prefix}.partitions.{index}.done"] = True
+        if fields:
+            update["$set"] = fields
+        migrations_collection.update_one({"_id": self.migration.name}, update)
+
+    def finish(self):
+        migrations_collection.update_one({"_id": self.migration.name}, {"$set": {f"{self.prefix}.done": True}})
+
+def _run_partition(step, checkpoint, index, partition, high, dry_run):
+    """Run one _id range of a step; returns how many documents it changed"""
+    collection = resources.collection(step.collection)
+    if step.update is not None:
+        query = _range_filter(step, partition["low"], high)
+        if dry_run:
+            return collection.count_documents(query)
+        changed = collection.update_many(query, step.update).modified_count
+        checkpoint.advance(index, changed=changed, done=True)
+        return changed
+
+    changed = 0
+    cursor = collection.find(
+        _range_filter(step, partition["low"], high, partition["last"]), step.projection
+    ).sort("_id", 1).batch_size(MIGRATION_BATCH_SIZE)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            changed += _run_batch(step, checkpoint, index, batch, dry_run)
+            batch = []
+    if batch:
+        changed += _run_batch(step, checkpoint, index, batch, dry_run)
+    if not dry_run:
+        checkpoint.advance(index, done=True)
+    return changed
+
+def _run_batch(step, checkpoint, index, batch, dry_run):
+    changed = step.apply(batch, dry_run)
+    if not dry_run:
+        checkpoint.advance(index, last=batch[-1]["_id"], changed=changed)
+    return changed
+
+def run_step(migration, step, dry_run=False, workers=MIGRATION_WORKERS, partitions=MIGRATION_PARTITIONS):
+    """Run (or resume) one step; returns how many documents it changed"""
+    checkpoint = _Checkpoint(migration, step)
+    state = None if dry_run else checkpoint.load()
+    if state and state.get("done"):
+        print(f"  {step.name}: already done")
+        return 0
+    if state:
+        plan = state["partitions"]
+        print(f"  {step.name}: resuming, {sum(not p['done'] for p in plan)} of {len(plan)} partitions left")
+    else:
+        plan = [{"low": low, "last": None, "changed": 0, "done": False} for low in _partition_bounds(step, partitions)]
+        if not dry_run:
+            checkpoint.start(plan)
+
+    highs = [partition["low"] for partition in plan[1:]] + [None]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(_run_partition, step, checkpoint, index, partition, highs[index], dry_run)
+            for index, partition in enumerate(plan) if not partition["done"]
+        ]
+        changed = sum(future.result() for future in futures)
+
+    if not dry_run:
+        checkpoint.finish()
+    print(f"  {step.name}: {changed} documents {'would change' if dry_run else 'changed'}")
+    return changed
+
+def run(migration, dry_run=False, workers=MIGRATION_WORKERS, partitions=MIGRATION_PARTITIONS):
+    """Run (or resume) every step of a migration in order"""
+    print(f"{migration.name}: {migration.description}{' (dry run)' if dry_run else ''}")
+    for step in migration.steps:
+        run_step(migration, step, dry_run, workers, partitions)
+    if not dry_run:
+        migrations_collection.update_one(
+            {"_id": migration.name}, {"$set": {"finished_at": datetime.now()}}, upsert=True
+        )
+
+def status():
+    """Finish time of every migration that completed"""
+    return {doc["_id"]: doc.get("finished_at") for doc in migrations_collection.find({}, {"finished_at": 1})}
+
+# --- 0001: personalization fix (formerly fix_chat_history.py) ---
+
+PERSONALIZATION_PATTERN = re.compile(r'\b(?:Avinash|user_name)\b')
+
+def _fix_inline_messages(messages, dry_run):
+    from pymongo import UpdateOne
+    return bulk("chat_history", [
+        UpdateOne({"_id": message["_id"]}, {"$set": {"content": PERSONALIZATION_PATTERN.sub("you", message["content"])}})
+        for message in messages
+    ], dry_run)
+
+def _fix_stored_responses(responses, dry_run):
+    """Point messages at a fixed copy of each stored response that needs one"""
+    chat_history_collection = resources.collection("chat_history")
+    changed = 0
+    for response in responses:
+        content = response_store.decode(response)
+        if not PERSONALIZATION_PATTERN.search(content):
+            continue
+        old_ref = response["_id"]
+        if dry_run:
+            changed += chat_history_collection.count_documents({"content_ref": old_ref})
+            continue
+        fixed = PERSONALIZATION_PATTERN.sub("you", content)
+        # Count the new references before moving them, so a crash leaks a reference instead of losing one
+        expected = chat_history_collection.count_documents({"content_ref": old_ref})
+        new_ref = response_store.store(fixed, refs=expected)
+        moved = chat_history_collection.update_many(
+            {"content_ref": old_ref}, {"$set": {"content_ref": new_ref}}
+        ).modified_count
+        if moved != expected:
+            response_store.store(fixed, refs=moved - expected)
+        response_store.release([old_ref] * moved)
+        changed += moved
+    return changed
+
+# --- 0002: recurrence rules for reminders saved with only a time ---
+
+def _add_medication_schedules(medications, dry_run):
+    from pymongo import UpdateOne
+    operations = []
+    for medication in medications:
+        rule = schedule.parse_time_field(medication["time"])
+        # A time nothing can be made of gets a null schedule, so the step does not match it again
+        fields = schedule.fields(rule) if rule else {"schedule": None, "next_due_at": None}
+        operations.append(UpdateOne({"_id": medication["_id"]}, {"$set": fields}))
+    return bulk("medications", operations, dry_run)
+
+MIGRATIONS = [
+    Migration("0001_fix_personalization", "Replace leaked user names in bot messages and reset chat sessions", [
+        Step(
+            "inline_messages", "chat_history",
+            {"role": "bot", "content": {"$regex": PERSONALIZATION_PATTERN.pattern}},
+            apply=_fix_inline_messages, projection={"content": 1}
+        ),
+        Step(
+            "stored_responses", "bot_responses", {},
+            apply=_fix_stored_responses, projection={"data": 1, "compressed": 1}
+        ),
+        Step(
+            "reset_sessions", "sessions",
+            {"$or": [{"step": {"$ne": 1}}, {"context": {"$ne": {}}}]},
+            update=[{"$set": {"step": 1, "context": {}, "last_updated": "$$NOW"}}]
+        ),
+    ]),
+    Migration("0002_medication_schedules", "Store a recurrence rule and next_due_at on reminders that only have a time", [
+        Step(
+            "parse_times", "medications",
+            {"schedule": {"$exists": False}, "time": {"$nin": [None, ""]}},
+            apply=_add_medication_schedules, projection={"time": 1}
+        ),
+    ]),
+]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run MedAssist data migrations")
+    parser.add_argument("names", nargs="*", help="Migrations to run (default: every unfinished one)")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would change without writing")
+    parser.add_argument("--workers", type=int, default=MIGRATION_WORKERS, help="Partitions run in parallel")
+    parser.add_argument("--partitions", type=int, default=MIGRATION_PARTITIONS, help="_id ranges per step")
+    parser.add_argument("--list", action="store_true", help="Show migrations and whether they finished")
+    args = parser.parse_args(argv)
+
+    finished = status()
+    if args.list:
+        for migration in MIGRATIONS:
+            print(f"{migration.name}: {finished.get(migration.name) or 'pending'} - {migration.description}")
+        return True
+
+    known = {migration.name for migration in MIGRATIONS}
+    unknown = [name for name in args.names if name not in known]
+    if unknown:
+        print(f"Unknown migrations: {', '.join(unknown)}")
+        return False
+    selected = [m for m in MIGRATIONS if m.name in args.names] if args.names else [m for m in MIGRATIONS if not finished.get(m.name)]
+    if not selected:
+        print("No migrations to run")
+    for migration in selected:
+        run(migration, dry_run=args.dry_run, workers=args.workers, partitions=args.partitions)
+    return True
+
+if __name__ == "__main__":
+    main()
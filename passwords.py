@@ -0,0 +1,110 @@
+"""
+Password hashing for MedAssist.
+
+Password hashes are deliberately expensive to compute, so they are computed
+in a small process pool instead of on the request thread: a burst of logins
+then queues for one of PASSWORD_HASH_WORKERS processes instead of pinning
+every gunicorn worker and stalling chat traffic. Waiting for the pool never
+goes past the request's deadline (see deadlines.py).
+
+Hashes are created with PASSWORD_HASH_METHOD (any method werkzeug accepts,
+e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"). A hash made with other
+parameters still verifies, and is replaced on the user's next login, so the
+cost can be tuned without forcing password resets.
+
+A hashing process that dies (killed for memory, say) breaks its pool; the
+pool is then rebuilt for the next call, and the call that hit it hashes on
+the request thread instead of failing the login.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+import deadlines
+from deadlines import DeadlineExceeded
+import telemetry
+
+# Method and cost parameters for new hashes, in werkzeug's "method:params" form
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# Hashing processes per web worker; 0 hashes on the request thread
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+
+class _Pool:
+    """Process pool with at most `size` jobs in flight, created lazily in each process"""
+
+    def __init__(self, size):
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size) if size > 0 else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            # Pools do not survive fork, so each worker starts its own
+            if self._executor is None or self._pid != os.getpid():
+                # spawn, since forking a threaded web worker is not safe
+                self._executor = ProcessPoolExecutor(self.size, mp_context=multiprocessing.get_context("spawn"))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken executor, so the next call starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def run(self, operation, func, *args):
+        """Run func(*args) in the pool, waiting no longer than the request's deadline for a free process"""
+        if self._slots is None:
+            return func(*args)
+        deadline = deadlines.current()
+        queued_at = time.monotonic()
+        if not self._slots.acquire(timeout=min(deadline.remaining(), threading.TIMEOUT_MAX)):
+            telemetry.observe_password_hash_wait(operation, time.monotonic() - queued_at)
+            raise DeadlineExceeded("timed out waiting for a password hashing process")
+        telemetry.observe_password_hash_wait(operation, time.monotonic() - queued_at)
+        try:
+            with telemetry.pool_slot("password_hash"), telemetry.span("password_hash", operation=operation):
+                executor = self._get_executor()
+                try:
+                    return executor.submit(func, *args).result()
+                except BrokenProcessPool:
+                    print(f"Password hashing pool broke; rebuilding it and running this {operation} in process")
+                    self._discard(executor)
+                    return func(*args)
+        finally:
+            self._slots.release()
+
+def _stored_prefix(method):
+    """The "method:params" prefix werkzeug stores for a method, with the
+    defaults it fills in for short forms ("scrypt" is stored as "scrypt:32768:8:1")"""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        return "scrypt:32768:8:1"
+    if name == "pbkdf2" and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+# Parsed rather than hashed, so importing this module costs no hash
+PASSWORD_HASH_PREFIX = _stored_prefix(PASSWORD_HASH_METHOD)
+
+_pool = _Pool(PASSWORD_HASH_WORKERS)
+telemetry.set_pool_size("password_hash", PASSWORD_HASH_WORKERS)
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _pool.run("hash", generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash"""
+    return _pool.run("verify", check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with other parameters than PASSWORD_HASH_METHOD"""
+    return password_hash.split("$", 1)[0] != PASSWORD_HASH_PREFIX
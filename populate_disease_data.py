@@ -7,13 +7,15 @@ to ensure the chatbot has reliable information to provide to users.
 
 import os
 import pymongo
-import google.generativeai as genai
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Gemini is configured from the environment, so import the client after loading it
+import gemini_client
+
 # List of common diseases to populate
 DISEASES = [
     "gastroenteritis", "diarrhea", "flu", "common cold", "diabetes", 
@@ -30,10 +32,6 @@ def populate_disease_data():
         return False
         
     try:
-        # Configure Gemini API
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
         # Connect to MongoDB
         client = pymongo.MongoClient(mongodb_uri)
         db = client.get_database()
@@ -77,7 +75,7 @@ def populate_disease_data():
             
             try:
                 # Get response from Gemini
-                response = model.generate_content(prompt)
+                response = gemini_client.generate(prompt, gemini_client.BATCH)
                 
                 if response and hasattr(response, 'text'):
                     # Store disease information in database
@@ -0,0 +1,158 @@
+"""
+Popularity-driven prefetch for MedAssist.
+
+Aggregates the "tell me about ..." / "what is ..." questions in chat_history
+over a rolling window, and looks the most requested medications and
+conditions up again so their answers sit fresh in the persistent
+`lookup_cache` collection the web workers fall back to. Popular questions are
+then answered warm instead of paying OpenFDA, Gemini and fallback API latency.
+The machine-local SQLite tier is skipped: the job runs on its own instance.
+
+Meant to run once a night during off-peak hours (see render.yaml). Lookups
+are paced to stay under a rate limit, and the job stops when the off-peak
+window ends.
+
+Usage:
+    python prefetch_popular.py
+    python prefetch_popular.py --days 7 --top 100 --rate 30 --force
+"""
+
+import os
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# This job runs on its own instance, whose local SQLite cache no web worker
+# reads; lookups are written to memory and MongoDB only. Set before the
+# caches are created on import.
+os.environ["SHARED_CACHE_ENABLED"] = "false"
+
+import app
+import deadlines
+import gemini_client
+from deadlines import DeadlineExceeded
+from lookup_cache import drug_info_cache, disease_info_cache
+
+# Rolling window of chat history to rank topics by
+PREFETCH_WINDOW_DAYS = int(os.environ.get("PREFETCH_WINDOW_DAYS", "14"))
+# Number of most requested topics to keep warm
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "50"))
+# Upstream lookups per minute
+PREFETCH_RATE_PER_MINUTE = float(os.environ.get("PREFETCH_RATE_PER_MINUTE", "20"))
+# Off-peak hours (UTC, start inclusive, end exclusive) during which the job may run
+PREFETCH_OFF_PEAK_HOURS = os.environ.get("PREFETCH_OFF_PEAK_HOURS", "2-6")
+# Entries that stay fresh for longer than this (in seconds) are not refreshed
+PREFETCH_REFRESH_AHEAD = float(os.environ.get("PREFETCH_REFRESH_AHEAD", str(36 * 3600)))
+# Latency budget (in seconds) for each lookup; more generous than a live request
+PREFETCH_LOOKUP_BUDGET = float(os.environ.get("PREFETCH_LOOKUP_BUDGET", "30"))
+
+def popular_topics(days, limit):
+    """Return [(topic, count)] of the most asked-about topics in the last `days` days"""
+    # chat_history timestamps are naive local times (see save_chat_message)
+    since = datetime.now() - timedelta(days=days)
+    pipeline = [
+        {"$match": {
+            "role": "user",
+            "timestamp": {"$gte": since},
+            "content": {"$regex": "^(tell me about|what is) ", "$options": "i"}
+        }},
+        {"$project": {"match": {"$regexFind": {
+            "input": {"$toLower": "$content"},
+            "regex": "^(?:tell me about|what is) (.*)$"
+        }}}},
+        {"$group": {"_id": {"$trim": {"input": {"$arrayElemAt": ["$match.captures", 0]}}}, "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$nin": ["", None]}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+    return [(doc["_id"], doc["count"]) for doc in app.chat_history_collection.aggregate(pipeline, allowDiskUse=True)]
+
+def off_peak_window(spec):
+    """Parse "start-end" UTC hours into (start, end)"""
+    start, end = (int(hour) for hour in spec.split("-"))
+    return start, end
+
+def in_window(window, now=None):
+    start, end = window
+    hour = (now or datetime.now(timezone.utc)).hour
+    return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+def prefetch(topic):
+    """Refresh one topic in the lookup caches; returns "disease" or "drug" and whether it succeeded"""
+    deadlines.start(PREFETCH_LOOKUP_BUDGET)
+    try:
+        if app.is_likely_disease(topic):
+            _, canonical_disease = app.disease_info_flight.do(topic, lambda: app.load_disease_info(topic))
+            return "disease", canonical_disease is not None
+        info = app.drug_info_flight.do(topic, lambda: app.load_drug_info(topic))
+        return "drug", not info.startswith("❌")
+    finally:
+        deadlines.clear()
+
+def needs_refresh(topic, force=False):
+    if app.is_likely_disease(topic):
+        cache = disease_info_cache
+    elif app.get_condition_medication_info(topic):
+        # Answered from the built-in condition table, never from upstream
+        return False
+    else:
+        cache = drug_info_cache
+    if force:
+        return True
+    expires_in = cache.expires_in(topic)
+    return expires_in is None or expires_in < PREFETCH_REFRESH_AHEAD
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch the most requested drug and disease lookups")
+    parser.add_argument("--days", type=int, default=PREFETCH_WINDOW_DAYS, help="Rolling window of chat history")
+    parser.add_argument("--top", type=int, default=PREFETCH_TOP_N, help="Topics to keep warm")
+    parser.add_argument("--rate", type=float, default=PREFETCH_RATE_PER_MINUTE, help="Upstream lookups per minute")
+    parser.add_argument("--off-peak", default=PREFETCH_OFF_PEAK_HOURS, help="UTC hours the job may run in, e.g. 2-6")
+    parser.add_argument("--force", action="store_true", help="Run outside the off-peak window and refresh everything")
+    args = parser.parse_args()
+
+    window = off_peak_window(args.off_peak)
+    if not args.force and not in_window(window):
+        print(f"Outside the off-peak window ({args.off_peak} UTC); use --force to run anyway")
+        return False
+
+    topics = popular_topics(args.days, args.top)
+    print(f"Found {len(topics)} popular topics in the last {args.days} days")
+
+    interval = 60 / args.rate
+    next_call = time.monotonic()
+    refreshed = skipped = failed = 0
+    for topic, count in topics:
+        if not args.force and not in_window(window):
+            print("Off-peak window ended; stopping")
+            break
+        if not needs_refresh(topic, args.force):
+            skipped += 1
+            continue
+
+        time.sleep(max(0, next_call - time.monotonic()))
+        next_call = time.monotonic() + interval
+        try:
+            # Queue behind interactive chat for Gemini slots and quota
+            with gemini_client.priority(gemini_client.BACKGROUND):
+                kind, ok = prefetch(topic)
+        except DeadlineExceeded:
+            kind, ok = "lookup", False
+        except Exception as e:
+            print(f"Error prefetching {topic}: {str(e)}")
+            kind, ok = "lookup", False
+        print(f"  {kind} {topic!r} ({count} requests): {'refreshed' if ok else 'failed'}")
+        if ok:
+            refreshed += 1
+        else:
+            failed += 1
+
+    print(f"\nPrefetch completed: {refreshed} refreshed, {skipped} still fresh, {failed} failed")
+    return True
+
+if __name__ == "__main__":
+    main()
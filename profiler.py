@@ -0,0 +1,245 @@
+"""
+Opt-in sampling profiler for MedAssist.
+
+A profiled request registers its thread with a background sampler that
+snapshots the thread's stack every PROFILE_INTERVAL seconds (via
+sys._current_frames). When the request ends its stacks are folded into a
+local SQLite file per (route, chat intent), so samples from all workers on
+the machine end up in one place. Admins download them as collapsed stacks
+(for flamegraph.pl, speedscope, etc.) or as a ready-made SVG flamegraph.
+
+Which requests are profiled:
+- a random PROFILE_SAMPLE_RATE fraction of all requests,
+- every request to a route listed in PROFILE_ROUTES (e.g. "/chat"),
+- every request sending the PROFILE_HEADER header with PROFILE_TOKEN as value.
+
+With all three unset the profiler costs one comparison per request and no
+sampler thread is started.
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+from collections import Counter
+from xml.sax.saxutils import escape
+from local_db import LocalDatabase
+
+PROFILE_DB_PATH = os.environ.get(
+    "PROFILE_DB_PATH", os.path.join(tempfile.gettempdir(), "medassist-profiles.sqlite3")
+)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROUTES = {route.strip() for route in os.environ.get("PROFILE_ROUTES", "").split(",") if route.strip()}
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-MedAssist-Profile")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+
+PROFILING_ENABLED = bool(PROFILE_SAMPLE_RATE > 0 or PROFILE_ROUTES or PROFILE_TOKEN)
+
+# Deepest stack kept per sample (outermost frames are dropped beyond this)
+MAX_STACK_DEPTH = 128
+
+_db = LocalDatabase(PROFILE_DB_PATH, schema=(
+    "CREATE TABLE IF NOT EXISTS stacks ("
+    " route TEXT NOT NULL,"
+    " intent TEXT NOT NULL,"
+    " stack TEXT NOT NULL,"
+    " samples INTEGER NOT NULL,"
+    " PRIMARY KEY (route, intent, stack))",
+    "CREATE TABLE IF NOT EXISTS requests ("
+    " route TEXT NOT NULL,"
+    " intent TEXT NOT NULL,"
+    " profiled INTEGER NOT NULL,"
+    " PRIMARY KEY (route, intent))",
+))
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+def collapse(frame):
+    """Collapsed-stack form of a frame chain, outermost frame first"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Sampler:
+    """Background thread sampling the stacks of registered threads"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so each worker starts its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="profiler", daemon=True).start()
+
+    def register(self, ident):
+        counts = Counter()
+        with self._lock:
+            self._ensure_thread()
+            self._threads[ident] = counts
+        self._wake.set()
+        return counts
+
+    def unregister(self, ident):
+        """Stop sampling a thread; returns a copy of its samples"""
+        with self._lock:
+            return Counter(self._threads.pop(ident, None) or ())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                threads = list(self._threads.items())
+                if not threads:
+                    self._wake.clear()
+            if not threads:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            stacks = [(ident, counts, collapse(frames[ident])) for ident, counts in threads if ident in frames]
+            del frames
+            with self._lock:
+                # Threads unregistered since the snapshot have had their samples read already
+                for ident, counts, stack in stacks:
+                    if self._threads.get(ident) is counts:
+                        counts[stack] += 1
+            time.sleep(self.interval)
+
+_sampler = Sampler()
+
+def should_profile(route, headers):
+    """Whether to profile a request to route with the given headers"""
+    if not PROFILING_ENABLED:
+        return False
+    if route in PROFILE_ROUTES:
+        return True
+    if PROFILE_TOKEN and headers.get(PROFILE_HEADER) == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def start(route, headers):
+    """Start profiling the current request if it is selected; returns a handle for finish(), or None"""
+    if not should_profile(route, headers):
+        return None
+    ident = threading.get_ident()
+    return ident, _sampler.register(ident)
+
+def finish(handle, route, intent):
+    """Stop profiling a request and fold its samples into the shared profile"""
+    ident, _ = handle
+    counts = _sampler.unregister(ident)
+    intent = intent or ""
+    try:
+        conn = _db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO stacks (route, intent, stack, samples) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (route, intent, stack) DO UPDATE SET samples = samples + excluded.samples",
+                [(route, intent, stack, samples) for stack, samples in counts.items()]
+            )
+            conn.execute(
+                "INSERT INTO requests (route, intent, profiled) VALUES (?, ?, 1)"
+                " ON CONFLICT (route, intent) DO UPDATE SET profiled = profiled + 1",
+                (route, intent)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except Exception as e:
+        # Profiling must never fail the request it observed
+        print(f"Profile write error: {str(e)}")
+
+def _filters(route=None, intent=None):
+    clauses, params = [], []
+    if route:
+        clauses.append("route = ?")
+        params.append(route)
+    if intent:
+        clauses.append("intent = ?")
+        params.append(intent)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def collapsed_stacks(route=None, intent=None):
+    """Aggregated samples as [(stack, samples)], with route and intent as the root frames"""
+    where, params = _filters(route, intent)
+    rows = _db.connection().execute(
+        f"SELECT route, intent, stack, samples FROM stacks{where} ORDER BY samples DESC", params
+    ).fetchall()
+    return [(f"{row_route};intent={row_intent or '-'};{stack}", samples) for row_route, row_intent, stack, samples in rows]
+
+def summary():
+    """Profiled request counts per route and intent"""
+    rows = _db.connection().execute("SELECT route, intent, profiled FROM requests ORDER BY profiled DESC").fetchall()
+    return [{"route": route, "intent": intent, "profiled_requests": profiled} for route, intent, profiled in rows]
+
+def reset():
+    conn = _db.connection()
+    conn.execute("DELETE FROM stacks")
+    conn.execute("DELETE FROM requests")
+
+def render_collapsed(stacks):
+    return "".join(f"{stack} {samples}\n" for stack, samples in stacks)
+
+def _color(name):
+    # Stable warm colour per frame name, as in classic flamegraphs
+    seed = sum(ord(char) for char in name)
+    return f"rgb({205 + seed % 50},{(seed * 7) % 200},{(seed * 13) % 55})"
+
+def render_flamegraph(stacks, title="MedAssist profile", width=1200, row_height=16):
+    """Render collapsed stacks as a self-contained SVG flamegraph"""
+    root = {"children": {}, "samples": 0}
+    for stack, samples in stacks:
+        node = root
+        node["samples"] += samples
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"children": {}, "samples": 0})
+            node["samples"] += samples
+
+    total = root["samples"] or 1
+    rects = []
+    depth_max = [0]
+
+    def layout(node, name, x, depth):
+        node_width = node["samples"] / total * width
+        if node_width < 0.5:
+            return
+        depth_max[0] = max(depth_max[0], depth)
+        rects.append((name, x, depth, node_width, node["samples"]))
+        child_x = x
+        for child_name, child in sorted(node["children"].items()):
+            layout(child, child_name, child_x, depth + 1)
+            child_x += child["samples"] / total * width
+
+    layout(root, "all", 0, 0)
+    height = (depth_max[0] + 1) * row_height + 40
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="{width / 2}" y="20" text-anchor="middle" font-size="14">{escape(title)}</text>',
+    ]
+    for name, x, depth, rect_width, samples in rects:
+        y = height - (depth + 1) * row_height
+        label = escape(name)
+        tooltip = f"{label} ({samples} samples, {samples / total * 100:.1f}%)"
+        fits = int(rect_width / 7)
+        text = escape(name if len(name) <= fits else name[:max(fits - 2, 0)] + "..") if fits >= 3 else ""
+        parts.append(
+            f'<g><title>{tooltip}</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{rect_width:.1f}" height="{row_height - 1}" fill="{_color(name)}"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{text}</text></g>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
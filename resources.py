@@ -0,0 +1,98 @@
+"""
+Per-process resources for MedAssist.
+
+MongoDB clients and the Gemini client hold sockets and background threads,
+so they must not be created in a gunicorn master and inherited across fork.
+This module creates them lazily, once per process, and recreates them if it
+notices it is running in a different process than the one that built them.
+
+pymongo and google.generativeai are only imported on first use, which keeps
+them (google.generativeai in particular) off the cold-start path.
+"""
+
+import os
+import threading
+import telemetry
+
+# MongoDB Configuration
+MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/medassist")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+
+# Gemini Configuration
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "your-api-key-here")
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
+GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-2.0-flash")
+
+_lock = threading.Lock()
+_state = {"pid": None, "client": None, "database": None, "model": None}
+
+def _ensure_process():
+    """Drop resources inherited from a parent process"""
+    pid = os.getpid()
+    if _state["pid"] != pid:
+        # Never close an inherited client: its sockets belong to the parent
+        _state.update(pid=pid, client=None, database=None, model=None)
+
+def mongo_client():
+    """MongoClient owned by the current process"""
+    client = _state["client"]
+    if client is not None and _state["pid"] == os.getpid():
+        return client
+    with _lock:
+        _ensure_process()
+        if _state["client"] is None:
+            import pymongo
+            client = pymongo.MongoClient(
+                MONGODB_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                event_listeners=telemetry.mongo_event_listeners()
+            )
+            # Publish the database before the client, which the lock-free fast path checks
+            _state["database"] = client.get_database()
+            _state["client"] = client
+            telemetry.set_pool_size("mongo", MONGO_MAX_POOL_SIZE)
+        return _state["client"]
+
+def database():
+    """Default database of MONGODB_URI for the current process"""
+    mongo_client()
+    return _state["database"]
+
+def gemini_model():
+    """Gemini model client owned by the current process"""
+    with _lock:
+        _ensure_process()
+        if _state["model"] is None:
+            import google.generativeai as genai
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=GEMINI_API_KEY, transport="rest",
+                                client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=GEMINI_API_KEY)
+            _state["model"] = genai.GenerativeModel(GEMINI_MODEL_NAME)
+            print(f"Gemini API configured successfully with model: {GEMINI_MODEL_NAME} (pid {os.getpid()})")
+        return _state["model"]
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection that resolves to the current process's client on use"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(database()[self._name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
+
+def collection(name):
+    """Collection handle that is safe to create at import time and use after fork"""
+    return LazyCollection(name)
+
+def init_worker():
+    """Create this worker's clients up front (called from gunicorn's post_fork hook)"""
+    mongo_client()
+    try:
+        gemini_model()
+    except Exception as e:
+        print(f"Warning: Gemini API configuration failed: {str(e)}")
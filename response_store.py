@@ -0,0 +1,130 @@
+"""
+Content-addressed storage for bot responses.
+
+Many bot replies (disease write-ups, the welcome message, medication
+summaries) are identical across users. Replies of at least
+BOT_RESPONSE_MIN_SIZE bytes are stored once in the `bot_responses`
+collection, keyed by the SHA-256 of their text and zlib-compressed when that
+pays off; chat_history messages then carry a `content_ref` instead of the
+text. Each stored response counts the messages referring to it, so it can be
+dropped when the last of them is deleted.
+
+Run `python response_store.py` once to move existing bot messages over.
+"""
+
+import os
+import zlib
+import hashlib
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import resources
+
+# Bot messages shorter than this (in UTF-8 bytes) are stored inline
+BOT_RESPONSE_MIN_SIZE = int(os.environ.get("BOT_RESPONSE_MIN_SIZE", "512"))
+# Whether stored responses are zlib-compressed
+BOT_RESPONSE_COMPRESS = os.environ.get("BOT_RESPONSE_COMPRESS", "true").lower() != "false"
+# Compression is kept only if it saves at least this fraction of the size
+MIN_COMPRESSION_SAVING = 0.1
+
+responses_collection = resources.collection("bot_responses")
+
+def content_id(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def should_store(role, content):
+    """Whether a chat message should be stored by reference"""
+    return role == "bot" and isinstance(content, str) and len(content.encode("utf-8")) >= BOT_RESPONSE_MIN_SIZE
+
+def _encode(content):
+    raw = content.encode("utf-8")
+    if BOT_RESPONSE_COMPRESS:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) <= len(raw) * (1 - MIN_COMPRESSION_SAVING):
+            return compressed, True
+    return content, False
+
+def decode(doc):
+    if doc.get("compressed"):
+        return zlib.decompress(doc["data"]).decode("utf-8")
+    return doc["data"]
+
+def store(content, refs=1):
+    """Store content (once), add `refs` references to it and return its reference"""
+    ref = content_id(content)
+    data, compressed = _encode(content)
+    responses_collection.update_one(
+        {"_id": ref},
+        {
+            "$setOnInsert": {
+                "data": data,
+                "compressed": compressed,
+                "size": len(content.encode("utf-8")),
+                "created_at": datetime.now()
+            },
+            "$inc": {"refs": refs}
+        },
+        upsert=True
+    )
+    return ref
+
+def resolve(messages):
+    """Replace content_ref with content in chat messages, with one query for all references"""
+    refs = {message["content_ref"] for message in messages if message.get("content_ref")}
+    if not refs:
+        return messages
+    contents = {doc["_id"]: decode(doc) for doc in responses_collection.find(
+        {"_id": {"$in": list(refs)}}, {"data": 1, "compressed": 1}
+    )}
+    for message in messages:
+        ref = message.pop("content_ref", None)
+        if ref:
+            message["content"] = contents.get(ref, "")
+    return messages
+
+def release(refs):
+    """Drop one reference per entry in refs, deleting responses nobody refers to any more"""
+    from pymongo import UpdateOne
+    counts = {}
+    for ref in refs:
+        counts[ref] = counts.get(ref, 0) + 1
+    if not counts:
+        return
+    responses_collection.bulk_write(
+        [UpdateOne({"_id": ref}, {"$inc": {"refs": -count}}) for ref, count in counts.items()],
+        ordered=False
+    )
+    responses_collection.delete_many({"_id": {"$in": list(counts)}, "refs": {"$lte": 0}})
+
+def migrate_existing(batch_size=500):
+    """Move the text of existing large bot messages into bot_responses"""
+    from pymongo import UpdateOne
+    chat_history_collection = resources.collection("chat_history")
+    cursor = chat_history_collection.find(
+        {"role": "bot", "content": {"$exists": True}, "content_ref": {"$exists": False}},
+        {"content": 1}
+    )
+    updates = []
+    moved = 0
+    for message in cursor:
+        if not should_store("bot", message.get("content")):
+            continue
+        ref = store(message["content"])
+        updates.append(UpdateOne(
+            {"_id": message["_id"]},
+            {"$set": {"content_ref": ref}, "$unset": {"content": ""}}
+        ))
+        if len(updates) >= batch_size:
+            chat_history_collection.bulk_write(updates, ordered=False)
+            moved += len(updates)
+            updates = []
+    if updates:
+        chat_history_collection.bulk_write(updates, ordered=False)
+        moved += len(updates)
+    return moved
+
+if __name__ == "__main__":
+    print(f"Moved {migrate_existing()} bot messages to bot_responses")
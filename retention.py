@@ -0,0 +1,239 @@
+"""
+Data retention for MedAssist.
+
+Keeps the hot collections small enough to stay in MongoDB's memory:
+
+- sessions: every update sets `expiry` to SESSION_TTL_DAYS from now, and a
+  TTL index (see db_setup.py) drops conversation state nobody has touched
+  since. Losing it only resets the chat flow to its first step.
+- chat_history: messages older than CHAT_ARCHIVE_DAYS are moved to gzipped
+  NDJSON files, one file per message date (e.g. 2024-01-31.ndjson.gz), then
+  deleted from MongoDB and the collection is compacted. Large bot replies
+  are archived with their full text and their bot_responses reference is
+  released.
+
+Each batch is flushed to disk before its messages are deleted, so an
+interrupted run never loses a message; it may archive some twice, which
+readers skip. Restored messages are indexed for search again, and those past
+the cutoff go back to the archive on the next run. User exports (export.py)
+read the archive too.
+
+CHAT_ARCHIVE_STORE picks where the files go: "disk" writes them under
+CHAT_ARCHIVE_DIR, which must be on persistent storage shared with the web
+service; "gridfs" writes them to the chat_archive GridFS bucket in MongoDB,
+which is rarely read and so stays out of the working set. render.yaml runs
+the archive daily as a cron job, which has no persistent disk, so it uses
+"gridfs".
+
+Usage:
+    python retention.py archive
+    python retention.py restore 2024-01-01 2024-01-31 [user_id]
+"""
+
+import os
+import sys
+import gzip
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import resources
+import response_store
+import search_index
+
+# Conversation state untouched for this many days is dropped
+SESSION_TTL_DAYS = int(os.environ.get("SESSION_TTL_DAYS", "30"))
+# Chat messages older than this many days are archived
+CHAT_ARCHIVE_DAYS = int(os.environ.get("CHAT_ARCHIVE_DAYS", "180"))
+# Where archive files are kept: "disk" (CHAT_ARCHIVE_DIR) or "gridfs" (MongoDB)
+CHAT_ARCHIVE_STORE = os.environ.get("CHAT_ARCHIVE_STORE", "disk").lower()
+CHAT_ARCHIVE_DIR = os.environ.get("CHAT_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive", "chat_history"))
+# Messages written and deleted per batch
+CHAT_ARCHIVE_BATCH = int(os.environ.get("CHAT_ARCHIVE_BATCH", "5000"))
+# Whether to compact chat_history after archiving (not allowed on every MongoDB tier)
+CHAT_ARCHIVE_COMPACT = os.environ.get("CHAT_ARCHIVE_COMPACT", "true").lower() != "false"
+
+chat_history_collection = resources.collection("chat_history")
+sessions_collection = resources.collection("sessions")
+
+def session_expiry():
+    """Expiry to store with a session update"""
+    return datetime.now() + timedelta(days=SESSION_TTL_DAYS)
+
+def backfill_session_expiry():
+    """Give sessions written before expiries were stored one, so the TTL index covers them"""
+    result = sessions_collection.update_many({"expiry": {"$exists": False}}, {"$set": {"expiry": session_expiry()}})
+    return result.modified_count
+
+def archive_name(day):
+    return f"{day.isoformat()}.ndjson.gz"
+
+def archive_path(day):
+    return os.path.join(CHAT_ARCHIVE_DIR, archive_name(day))
+
+def _bucket():
+    import gridfs
+    return gridfs.GridFSBucket(resources.database(), bucket_name="chat_archive")
+
+def _write_batch(day, messages):
+    """Append messages to their day's archive file and make sure they were stored"""
+    from bson import json_util
+    data = b"".join(
+        json_util.dumps(message, json_options=json_util.CANONICAL_JSON_OPTIONS).encode("utf-8") + b"\n"
+        for message in messages
+    )
+    if CHAT_ARCHIVE_STORE == "gridfs":
+        # GridFS files cannot be appended to: every batch is another file of the same name
+        _bucket().upload_from_stream(archive_name(day), gzip.compress(data), metadata={"day": day.isoformat()})
+        return
+    os.makedirs(CHAT_ARCHIVE_DIR, exist_ok=True)
+    # Every batch is its own gzip member; readers see one continuous stream
+    with open(archive_path(day), "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+            archive.write(data)
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def _archive_batch(day, messages):
+    refs = [message["content_ref"] for message in messages if message.get("content_ref")]
+    response_store.resolve(messages)
+    _write_batch(day, messages)
+    ids = [message["_id"] for message in messages]
+    chat_history_collection.delete_many({"_id": {"$in": ids}})
+    response_store.release(refs)
+    # Other machines drop them from their index when a search hits them
+    search_index.remove(ids)
+    return len(messages)
+
+def archive_chat_history(days=CHAT_ARCHIVE_DAYS):
+    """Move chat messages older than `days` days to the archive; returns how many were moved"""
+    cutoff = datetime.now() - timedelta(days=days)
+    cursor = chat_history_collection.find({"timestamp": {"$lt": cutoff}}).sort("timestamp", 1)
+    archived = 0
+    batch, batch_day = [], None
+    for message in cursor:
+        day = message["timestamp"].date()
+        if batch and (day != batch_day or len(batch) >= CHAT_ARCHIVE_BATCH):
+            archived += _archive_batch(batch_day, batch)
+            batch = []
+        batch.append(message)
+        batch_day = day
+    if batch:
+        archived += _archive_batch(batch_day, batch)
+    return archived
+
+def compact_chat_history():
+    """Give the space freed by archiving back to the storage engine"""
+    from pymongo.errors import OperationFailure
+    try:
+        chat_history_collection.database.command("compact", "chat_history")
+        return True
+    except OperationFailure as e:
+        print(f"Skipping compaction: {str(e)}")
+        return False
+
+def archived_days():
+    """Dates that have an archive file, oldest first"""
+    if CHAT_ARCHIVE_STORE == "gridfs":
+        names = resources.database()["chat_archive.files"].distinct("filename")
+    elif os.path.isdir(CHAT_ARCHIVE_DIR):
+        names = os.listdir(CHAT_ARCHIVE_DIR)
+    else:
+        return []
+    days = []
+    for name in names:
+        if name.endswith(".ndjson.gz"):
+            try:
+                days.append(date.fromisoformat(name[:-len(".ndjson.gz")]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+def _archive_lines(day):
+    if CHAT_ARCHIVE_STORE == "gridfs":
+        bucket = _bucket()
+        for stored in bucket.find({"filename": archive_name(day)}).sort("uploadDate", 1):
+            # One batch at a time, at most CHAT_ARCHIVE_BATCH messages
+            yield from gzip.decompress(bucket.open_download_stream(stored._id).read()).decode("utf-8").splitlines()
+        return
+    path = archive_path(day)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        yield from archive
+
+def read_archive_day(day, user_id=None):
+    """Yield the messages archived for one date in the order they were written, each once"""
+    from bson import json_util
+    # Holds at most one day of ids; messages archived twice by an interrupted run are skipped
+    seen = set()
+    for line in _archive_lines(day):
+        message = json_util.loads(line)
+        if user_id is not None and message.get("user_id") != user_id:
+            continue
+        if message["_id"] in seen:
+            continue
+        seen.add(message["_id"])
+        yield message
+
+def read_archive(start, end, user_id=None):
+    """Yield archived messages dated start..end (inclusive), optionally for one user"""
+    day = start
+    while day <= end:
+        yield from read_archive_day(day, user_id)
+        day += timedelta(days=1)
+
+def restore(start, end, user_id=None):
+    """Copy archived messages back into chat_history; returns how many were restored"""
+    restored = 0
+    batch = []
+    for message in read_archive(start, end, user_id):
+        batch.append(message)
+        if len(batch) >= 1000:
+            restored += _restore_batch(batch)
+            batch = []
+    if batch:
+        restored += _restore_batch(batch)
+    return restored
+
+def _restore_batch(messages):
+    from pymongo import ReplaceOne
+    # Indexed with their full text, once they are back in chat_history
+    entries = [(message.get("user_id"), message["_id"], message.get("role"), message.get("content"), message.get("timestamp"))
+               for message in messages]
+    for message in messages:
+        if response_store.should_store(message.get("role"), message.get("content")):
+            message["content_ref"] = response_store.store(message.pop("content"))
+    # Keyed on _id, so messages archived twice are restored once
+    result = chat_history_collection.bulk_write(
+        [ReplaceOne({"_id": message["_id"]}, message, upsert=True) for message in messages],
+        ordered=False
+    )
+    # Messages that were already back hold their reference already
+    response_store.release([
+        message["content_ref"] for index, message in enumerate(messages)
+        if index not in result.upserted_ids and message.get("content_ref")
+    ])
+    search_index.add_many(entries)
+    return len(result.upserted_ids)
+
+def run():
+    print(f"Set an expiry on {backfill_session_expiry()} sessions")
+    archived = archive_chat_history()
+    destination = "GridFS bucket chat_archive" if CHAT_ARCHIVE_STORE == "gridfs" else CHAT_ARCHIVE_DIR
+    print(f"Archived {archived} chat messages older than {CHAT_ARCHIVE_DAYS} days to {destination}")
+    if archived and CHAT_ARCHIVE_COMPACT:
+        compact_chat_history()
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "restore":
+        start, end = (datetime.strptime(value, "%Y-%m-%d").date() for value in sys.argv[2:4])
+        user_id = sys.argv[4] if len(sys.argv) > 4 else None
+        print(f"Restored {restore(start, end, user_id)} chat messages")
+    elif len(sys.argv) == 2 and sys.argv[1] == "archive":
+        run()
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,320 @@
+"""
+Dosing schedule grammar for MedAssist.
+
+parse() reads phrases such as "8:00 AM", "twice daily", "every 8 hours",
+"Mon/Wed/Fri at 9", "at 8am and 8pm for 14 days" or "every other day at
+bedtime" into a recurrence rule, in one pass of a single compiled pattern:
+
+    {"times": ["08:00", "20:00"],   # wall-clock doses, 24-hour
+     "weekdays": [0, 2, 4] or None, # Monday is 0; None means every day
+     "every_days": 1,               # 2 for every other day, counted from start
+     "every_hours": None,           # 8 for every 8 hours, from the first dose
+     "start": "2026-10-19",
+     "until": "2026-11-01" or None, # last day of a course
+     "timezone": "Europe/Berlin",   # the user's; times and days are local to it
+     "text": "twice daily for 14 days"}
+
+Bare hours only count as times after "at" or with am/pm ("take 2 tablets" is
+not 2 AM); "at 9" is 9:00 on the 24-hour clock, "at 9pm" is 21:00. An hour
+interval keeps only its first dose in `times` and repeats from it ("every 5
+hours at 8" is 08:00, 13:00, 18:00, 23:00, then 04:00 the next day). A phrase
+with an impossible value ("every 0 hours", "for 0 days", "30 times a day")
+makes the whole text unparseable rather than being ignored.
+
+next_occurrence() expands a rule to its next dose after a moment; the result
+is stored on the medication as `next_due_at` (in UTC) so "what is due next"
+is an index lookup (see db_setup.py). Rules saved before they carried a
+timezone are taken as UTC.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIME = "08:00"
+
+# Dose times for "N times a day" when no time is given; shifted if one is
+DEFAULT_SLOTS = {
+    1: ["08:00"],
+    2: ["08:00", "20:00"],
+    3: ["08:00", "14:00", "20:00"],
+    4: ["08:00", "12:00", "16:00", "20:00"],
+}
+
+NAMED_TIMES = {
+    "morning": "08:00", "noon": "12:00", "midday": "12:00", "afternoon": "14:00",
+    "evening": "18:00", "night": "21:00", "bedtime": "21:00", "midnight": "00:00",
+}
+
+NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tues": 1, "tue": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thurs": 3, "thur": 3, "thu": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6,
+}
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+_NUMBER = r"(?:\d+|a|an|one|two|three|four|five|six)"
+_DAY_NAME = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+
+# Alternatives are tried in order at each position, so longer phrases come first
+GRAMMAR = re.compile(r"""
+    (?P<duration>\bfor\s+(?P<duration_n>""" + _NUMBER + r""")\s+(?P<duration_unit>day|week|month)s?\b)
+  | (?P<every_hours>\b(?:every\s+(?P<hours_n>\d+)\s+hours?|q\s?(?P<q_hours>\d+)\s?h)\b)
+  | (?P<every_days>\bevery\s+(?:other\s+day|(?P<days_n>\d+)\s+days)\b)
+  | (?P<frequency>\b(?:
+        (?P<freq_n>""" + _NUMBER + r"""|once|twice|thrice)(?:\s+times?)?\s+(?:a|per|each)\s+day
+      | (?P<freq_daily>once|twice|thrice)\s+daily
+      | (?P<abbrev>q\.?d|b\.?i\.?d|t\.?i\.?d|q\.?i\.?d)\.?
+      | daily | every\s+day | each\s+day
+    )\b)
+  | (?P<weekday_set>\b(?:on\s+)?(?P<weekday_set_name>weekdays|weekends)\b)
+  | (?P<weekday>\b(?P<weekday_name>""" + _DAY_NAME + r""")s?\b)
+  | (?P<named_time>\b(?:in\s+the\s+|at\s+|before\s+)?(?P<named>""" + "|".join(NAMED_TIMES) + r""")\b)
+  | (?P<clock>
+        \bat\s+(?P<at_h>\d{1,2})(?::(?P<at_m>\d{2}))?(?:\s*(?P<at_ampm>[ap])\.?m\.?)?(?![\w:])
+      | \b(?P<hm_h>\d{1,2}):(?P<hm_m>\d{2})(?:\s*(?P<hm_ampm>[ap])\.?m\.?)?(?![\w:])
+      | \b(?P<ap_h>\d{1,2})\s*(?P<ap_ampm>[ap])\.?m\b\.?
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
+ABBREVIATIONS = {"qd": 1, "bid": 2, "tid": 3, "qid": 4}
+# "N times a day" beyond this is not a dosing schedule
+MAX_PER_DAY = 24
+FREQUENCY_WORDS = {"once": 1, "twice": 2, "thrice": 3}
+
+# A form field or reply holding nothing but a time: "8", "8:30", "9 pm"
+BARE_TIME_PATTERN = re.compile(r"\d{1,2}(?::\d{2})?(?:\s*[ap]\.?m\.?)?", re.IGNORECASE)
+
+# Words left dangling once the schedule phrases are cut out of a message
+CONNECTOR_PATTERN = re.compile(r"(?:^|\s)(?:and|at|on|every|for|each|the|,|/|&)(?=\s|$)", re.IGNORECASE)
+
+def _clock(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+def _number(text):
+    return int(text) if text.isdigit() else NUMBERS.get(text.lower(), FREQUENCY_WORDS.get(text.lower()))
+
+def _minutes(clock):
+    hour, minute = clock.split(":")
+    return int(hour) * 60 + int(minute)
+
+def _spread(per_day):
+    """per_day dose times evenly spread over the day from DEFAULT_TIME"""
+    first = _minutes(DEFAULT_TIME)
+    return [_clock_from_minutes(first + dose * 1440 // per_day) for dose in range(per_day)]
+
+def _clock_from_minutes(minutes):
+    minutes %= 1440
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def valid_timezone(name):
+    """Whether name is an IANA timezone ("Europe/Berlin") this machine knows"""
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+def _zone(rule):
+    return ZoneInfo(rule.get("timezone") or "UTC")
+
+def as_utc(moment):
+    """Aware UTC datetime; naive ones are UTC already, as pymongo returns them"""
+    if moment is None:
+        return None
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def _shifted(slots, first):
+    offset = _minutes(first) - _minutes(slots[0])
+    return [_clock_from_minutes(_minutes(slot) + offset) for slot in slots]
+
+def extract(text, today=None, tz="UTC"):
+    """Return (rule or None, text with the schedule phrases removed); tz is the user's timezone"""
+    today = today or datetime.now(ZoneInfo(tz)).date()
+    times, weekdays, spans = [], set(), []
+    per_day = every_hours = None
+    every_days = 1
+    course_days = None
+    # Set by a schedule phrase with an impossible value; the text is then not a schedule
+    invalid = False
+
+    for match in GRAMMAR.finditer(text or ""):
+        # The alternative's own group closes last, after any group nested in it
+        kind = match.lastgroup
+        if kind == "duration":
+            count = _number(match.group("duration_n"))
+            if count < 1:
+                invalid = True
+                continue
+            unit = match.group("duration_unit").lower()
+            course_days = count * {"day": 1, "week": 7, "month": 30}[unit]
+        elif kind == "every_hours":
+            hours = int(match.group("hours_n") or match.group("q_hours"))
+            if not hours:
+                invalid = True
+                continue
+            every_hours = hours
+        elif kind == "every_days":
+            days = int(match.group("days_n") or 2)
+            if days < 1:
+                invalid = True
+                continue
+            every_days = days
+        elif kind == "frequency":
+            if match.group("freq_n"):
+                count = _number(match.group("freq_n"))
+                if not 1 <= count <= MAX_PER_DAY:
+                    invalid = True
+                    continue
+                per_day = count
+            elif match.group("freq_daily"):
+                per_day = FREQUENCY_WORDS[match.group("freq_daily").lower()]
+            elif match.group("abbrev"):
+                per_day = ABBREVIATIONS[match.group("abbrev").lower().replace(".", "")]
+            else:
+                per_day = 1
+        elif kind == "weekday_set":
+            weekdays.update(range(5) if match.group("weekday_set_name").lower() == "weekdays" else (5, 6))
+        elif kind == "weekday":
+            weekdays.add(WEEKDAYS[match.group("weekday_name").lower()])
+        elif kind == "named_time":
+            times.append(NAMED_TIMES[match.group("named").lower()])
+        else:
+            clock = _clock(*(match.group("at_h"), match.group("at_m"), match.group("at_ampm"))) if match.group("at_h") else \
+                _clock(match.group("hm_h"), match.group("hm_m"), match.group("hm_ampm")) if match.group("hm_h") else \
+                _clock(match.group("ap_h"), None, match.group("ap_ampm"))
+            if clock is None:
+                continue
+            times.append(clock)
+        spans.append(match.span())
+
+    if invalid:
+        return None, text
+    if every_hours:
+        times = [times[0] if times else DEFAULT_TIME]
+    elif per_day and len(times) < per_day:
+        slots = DEFAULT_SLOTS.get(per_day) or _spread(per_day)
+        times = _shifted(slots, times[0]) if times else slots
+    elif not times and (weekdays or every_days > 1):
+        times = [DEFAULT_TIME]
+    if not times:
+        return None, text
+
+    remainder = text
+    for start, end in reversed(spans):
+        remainder = remainder[:start] + " " + remainder[end:]
+    remainder = " ".join(CONNECTOR_PATTERN.sub(" ", remainder).split())
+
+    return {
+        "times": sorted(set(times)),
+        "weekdays": sorted(weekdays) or None,
+        "every_days": every_days,
+        "every_hours": every_hours,
+        "start": today.isoformat(),
+        "until": (today + timedelta(days=course_days - 1)).isoformat() if course_days is not None else None,
+        "timezone": tz,
+        "text": " ".join(text[start:end] for start, end in spans),
+    }, remainder
+
+def parse(text, today=None, tz="UTC"):
+    """Recurrence rule for a schedule phrase, or None if it names no dose time or frequency"""
+    return extract(text, today, tz)[0]
+
+def parse_time_field(text, today=None, tz="UTC"):
+    """Like parse(), for text that is nothing but a time or schedule (a form field, a reply): a bare hour ("8") is a time too"""
+    text = (text or "").strip()
+    if BARE_TIME_PATTERN.fullmatch(text):
+        text = f"at {text}"
+    return parse(text, today, tz)
+
+def retime(rule, clock):
+    """Rule with the same days as `rule`, its doses moved together so the first is at clock ("HH:MM")"""
+    times = sorted(set(_shifted(rule["times"], clock)))
+    return {**rule, "times": times, "text": " and ".join(display_time(t) for t in times)}
+
+def _on_day(rule, day):
+    start = date.fromisoformat(rule["start"])
+    if day < start:
+        return False
+    if rule.get("weekdays") and day.weekday() not in rule["weekdays"]:
+        return False
+    return (day - start).days % rule.get("every_days", 1) == 0
+
+def _at(day, clock, tz):
+    hour, minute = clock.split(":")
+    return datetime.combine(day, time(int(hour), int(minute)), tzinfo=tz)
+
+def _next_interval_dose(rule, after, tz, until):
+    step = timedelta(hours=rule["every_hours"])
+    first = _at(date.fromisoformat(rule["start"]), rule["times"][0], tz).astimezone(timezone.utc)
+    due = first if after < first else first + step * ((after - first) // step + 1)
+    # Enough doses to reach any weekday
+    for _ in range(7 * 24 // rule["every_hours"] + 2):
+        day = due.astimezone(tz).date()
+        if until and day > until:
+            return None
+        if _on_day(rule, day):
+            return due
+        due += step
+    return None
+
+def next_occurrence(rule, after):
+    """First dose strictly after `after`, as an aware UTC datetime, or None once the course has ended"""
+    tz = _zone(rule)
+    after = as_utc(after)
+    until = date.fromisoformat(rule["until"]) if rule.get("until") else None
+    if rule.get("every_hours"):
+        return _next_interval_dose(rule, after, tz, until)
+    day = max(after.astimezone(tz).date(), date.fromisoformat(rule["start"]))
+    # Enough days to reach any weekday, even every few days
+    for _ in range(7 * max(rule.get("every_days", 1), 1) + 1):
+        if until and day > until:
+            return None
+        if _on_day(rule, day):
+            for clock in rule["times"]:
+                due = _at(day, clock, tz)
+                if due > after:
+                    return due.astimezone(timezone.utc)
+        day += timedelta(days=1)
+    return None
+
+def display_time(clock):
+    """"20:00" -> "8:00 PM", the format reminders are shown in"""
+    hour, minute = (int(part) for part in clock.split(":"))
+    return f"{hour % 12 or 12}:{minute:02d} {'PM' if hour >= 12 else 'AM'}"
+
+def describe(rule):
+    """Human-readable summary, e.g. "8:00 AM and 8:00 PM daily until Nov 01, 2026\""""
+    times = [display_time(clock) for clock in rule["times"]]
+    text = times[0] if len(times) == 1 else ", ".join(times[:-1]) + " and " + times[-1]
+    if rule.get("every_hours"):
+        text = ("every hour" if rule["every_hours"] == 1 else f"every {rule['every_hours']} hours") + f" from {text}"
+    if rule.get("weekdays"):
+        days = [WEEKDAY_NAMES[day] for day in rule["weekdays"]]
+        text += " on " + (days[0] if len(days) == 1 else ", ".join(days[:-1]) + " and " + days[-1])
+    elif rule.get("every_days", 1) == 2:
+        text += " every other day"
+    elif rule.get("every_days", 1) > 2:
+        text += f" every {rule['every_days']} days"
+    elif not rule.get("every_hours"):
+        text += " daily"
+    if rule.get("until"):
+        text += " until " + date.fromisoformat(rule["until"]).strftime("%b %d, %Y")
+    return text
+
+def fields(rule, now=None):
+    """Medication fields for a schedule: the rule, its first dose time for display, and next_due_at"""
+    return {
+        "schedule": rule,
+        "time": display_time(rule["times"][0]),
+        "next_due_at": next_occurrence(rule, now or datetime.now(timezone.utc)),
+    }
@@ -0,0 +1,278 @@
+"""
+Full-text search over chat history.
+
+Messages are indexed in a SQLite FTS5 table (with prefix indexes) in a local
+file shared by all workers on the machine, so a search never scans
+chat_history:
+
+- save_chat_message adds every new message as it is written, and
+  retention.py indexes the messages it restores from the archive.
+- Before searching, a user's index catches up with the messages written
+  since the last search (by any worker or instance) through the
+  (user_id, timestamp) index on chat_history. Each catch-up re-reads an
+  overlap of SEARCH_CATCH_UP_OVERLAP seconds, since messages from other
+  instances can arrive slightly out of order; messages already indexed are
+  ignored. The first search of a user whose messages predate the index
+  builds it this way, in batches that respect the request's deadline.
+- Messages that left chat_history are dropped: by forget() when a user
+  clears their history here, by remove() when retention.py archives them on
+  this machine, and otherwise when a search hits a message that no longer
+  exists (cleared through another instance, archived elsewhere).
+
+Every user gets a numeric range of rowids, so a query only visits that
+user's postings, whatever the size of the index.
+
+Query syntax: words must all appear, "quoted phrases" must appear as
+written, and a trailing * matches a prefix (dos* finds dose, doses and
+dosage). Words are not stemmed, since stemming breaks prefix matching of
+drug names. Results are ranked by BM25 or sorted by date.
+"""
+
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+import deadlines
+import resources
+import response_store
+from local_db import LocalDatabase
+
+SEARCH_INDEX_PATH = os.environ.get(
+    "SEARCH_INDEX_PATH", os.path.join(tempfile.gettempdir(), "medassist-search.sqlite3")
+)
+# Messages indexed per transaction while catching up
+SEARCH_CATCH_UP_BATCH = int(os.environ.get("SEARCH_CATCH_UP_BATCH", "500"))
+# Seconds before the last indexed message that each catch-up reads again
+SEARCH_CATCH_UP_OVERLAP = int(os.environ.get("SEARCH_CATCH_UP_OVERLAP", "120"))
+SEARCH_MAX_RESULTS = 100
+# Times a search is re-run to refill results dropped because their messages are gone
+SEARCH_PRUNE_ROUNDS = 3
+
+# Rowids of a user's messages are user_no << USER_SHIFT plus a per-user sequence
+USER_SHIFT = 32
+
+QUERY_TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_db = LocalDatabase(SEARCH_INDEX_PATH, schema=(
+    "CREATE TABLE IF NOT EXISTS users ("
+    " user_id TEXT PRIMARY KEY,"
+    " user_no INTEGER NOT NULL UNIQUE,"
+    " next_seq INTEGER NOT NULL DEFAULT 0)",
+    # Timestamp of the newest message indexed by catching up
+    "CREATE TABLE IF NOT EXISTS sync_state ("
+    " user_id TEXT PRIMARY KEY,"
+    " synced_ts REAL)",
+    "CREATE TABLE IF NOT EXISTS docs ("
+    " id INTEGER PRIMARY KEY,"
+    " message_id TEXT NOT NULL UNIQUE,"
+    " role TEXT,"
+    " ts REAL)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+    " content, tokenize='unicode61', prefix='2 3')",
+))
+
+chat_history_collection = resources.collection("chat_history")
+
+class QueryError(ValueError):
+    """Raised for a search query with nothing to search for"""
+
+def to_match_expression(query):
+    """Translate a user query into an FTS5 MATCH expression (every term quoted, so no syntax errors)"""
+    terms = []
+    for match in QUERY_TOKEN_PATTERN.finditer(query):
+        phrase, word = match.groups()
+        if phrase is not None:
+            words = WORD_PATTERN.findall(phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        prefix = word.endswith("*")
+        words = WORD_PATTERN.findall(word)
+        if not words:
+            continue
+        term = '"' + " ".join(words) + '"'
+        terms.append(term + "*" if prefix else term)
+    if not terms:
+        raise QueryError("search query has no words")
+    return " AND ".join(terms)
+
+def _user_range(conn, user_id, create=True):
+    """(user_no, next_seq) for user_id, registering the user if asked"""
+    row = conn.execute("SELECT user_no, next_seq FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    if row is None and create:
+        (user_no,) = conn.execute("SELECT COALESCE(MAX(user_no), 0) + 1 FROM users").fetchone()
+        conn.execute("INSERT INTO users (user_id, user_no) VALUES (?, ?)", (user_id, user_no))
+        row = (user_no, 0)
+    return row
+
+def _index(conn, user_id, messages, synced_ts=None):
+    """Index messages [(message_id, role, content, timestamp)] of one user (call inside a transaction)"""
+    user_no, next_seq = _user_range(conn, user_id)
+    for message_id, role, content, timestamp in messages:
+        if not content:
+            continue
+        rowid = (user_no << USER_SHIFT) + next_seq
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO docs (id, message_id, role, ts) VALUES (?, ?, ?, ?)",
+            (rowid, message_id, role, timestamp.timestamp() if timestamp else None)
+        ).rowcount
+        if inserted:
+            conn.execute("INSERT INTO messages (rowid, content) VALUES (?, ?)", (rowid, content))
+            next_seq += 1
+    conn.execute("UPDATE users SET next_seq = ? WHERE user_id = ?", (next_seq, user_id))
+    if synced_ts is not None:
+        conn.execute(
+            "INSERT INTO sync_state (user_id, synced_ts) VALUES (?, ?)"
+            " ON CONFLICT (user_id) DO UPDATE SET synced_ts = MAX(COALESCE(synced_ts, 0), excluded.synced_ts)",
+            (user_id, synced_ts)
+        )
+
+def _write(work):
+    conn = _db.connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        work(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+def add(user_id, message_id, role, content, timestamp):
+    """Index a message as it is saved; errors are logged, the next search catches up"""
+    try:
+        _write(lambda conn: _index(conn, user_id, [(str(message_id), role, content, timestamp)]))
+    except sqlite3.Error as e:
+        print(f"Search index write error: {str(e)}")
+
+def add_many(messages):
+    """Index messages [(user_id, message_id, role, content, timestamp)] in one transaction; errors are logged"""
+    by_user = {}
+    for user_id, message_id, role, content, timestamp in messages:
+        by_user.setdefault(user_id, []).append((str(message_id), role, content, timestamp))
+    def work(conn):
+        for user_id, entries in by_user.items():
+            _index(conn, user_id, entries)
+    try:
+        _write(work)
+    except sqlite3.Error as e:
+        print(f"Search index write error: {str(e)}")
+
+def forget(user_id):
+    """Drop a user's messages from the index (after their history was cleared)"""
+    def work(conn):
+        row = _user_range(conn, user_id, create=False)
+        if row is None:
+            return
+        low = row[0] << USER_SHIFT
+        high = low + (1 << USER_SHIFT) - 1
+        conn.execute("DELETE FROM messages WHERE rowid BETWEEN ? AND ?", (low, high))
+        conn.execute("DELETE FROM docs WHERE id BETWEEN ? AND ?", (low, high))
+        conn.execute("DELETE FROM sync_state WHERE user_id = ?", (user_id,))
+    try:
+        _write(work)
+    except sqlite3.Error as e:
+        print(f"Search index delete error: {str(e)}")
+
+def remove(message_ids):
+    """Drop messages from the index (after they were archived or deleted)"""
+    message_ids = [str(message_id) for message_id in message_ids]
+    def work(conn):
+        # Chunks stay under SQLite's limit on query parameters
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM messages WHERE rowid IN (SELECT id FROM docs WHERE message_id IN ({placeholders}))", chunk)
+            conn.execute(f"DELETE FROM docs WHERE message_id IN ({placeholders})", chunk)
+    try:
+        _write(work)
+    except sqlite3.Error as e:
+        print(f"Search index delete error: {str(e)}")
+
+def catch_up(user_id):
+    """Index the user's messages written since the last catch-up; returns how many were read"""
+    row = _db.connection().execute("SELECT synced_ts FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+    query = {"user_id": user_id}
+    if row and row[0] is not None:
+        # Messages written elsewhere can arrive out of order; the overlap is read again and ignored if indexed
+        query["timestamp"] = {"$gte": datetime.fromtimestamp(row[0]) - timedelta(seconds=SEARCH_CATCH_UP_OVERLAP)}
+    cursor = chat_history_collection.find(
+        query, {"role": 1, "content": 1, "content_ref": 1, "timestamp": 1}
+    ).sort([("timestamp", 1), ("_id", 1)]).batch_size(SEARCH_CATCH_UP_BATCH)
+
+    deadline = deadlines.current()
+    read = 0
+    batch = []
+    for message in cursor:
+        batch.append(message)
+        if len(batch) >= SEARCH_CATCH_UP_BATCH:
+            read += _catch_up_batch(user_id, batch)
+            batch = []
+            # Progress so far is kept; the next search continues from here
+            deadline.check()
+    if batch:
+        read += _catch_up_batch(user_id, batch)
+    return read
+
+def _catch_up_batch(user_id, batch):
+    response_store.resolve(batch)
+    messages = [(str(m["_id"]), m.get("role"), m.get("content"), m.get("timestamp")) for m in batch]
+    # Sorted by timestamp, so the last message with one is the newest
+    timestamps = [timestamp for _, _, _, timestamp in messages if timestamp]
+    synced_ts = timestamps[-1].timestamp() if timestamps else None
+    _write(lambda conn: _index(conn, user_id, messages, synced_ts=synced_ts))
+    return len(batch)
+
+def _prune(rows):
+    """Message ids of search hits that are no longer in chat_history, dropped from the index"""
+    from bson import ObjectId
+    ids = [row[0] for row in rows]
+    if not ids:
+        return set()
+    existing = {str(m["_id"]) for m in chat_history_collection.find({"_id": {"$in": [ObjectId(i) for i in ids]}}, {"_id": 1})}
+    missing = {i for i in ids if i not in existing}
+    if missing:
+        remove(missing)
+    return missing
+
+def search(user_id, query, since=None, until=None, sort="relevance", limit=20):
+    """Search a user's messages; returns [{"id", "role", "timestamp", "snippet", "score"}]"""
+    expression = to_match_expression(query)
+    catch_up(user_id)
+    conn = _db.connection()
+    row = _user_range(conn, user_id, create=False)
+    if row is None:
+        return []
+    low = row[0] << USER_SHIFT
+    clauses = ["messages MATCH ?", "messages.rowid BETWEEN ? AND ?"]
+    params = [expression, low, low + (1 << USER_SHIFT) - 1]
+    if since:
+        clauses.append("docs.ts >= ?")
+        params.append(since.timestamp())
+    if until:
+        clauses.append("docs.ts < ?")
+        params.append(until.timestamp())
+    # Rowids grow with each message, so newest first needs no sort
+    order = "messages.rowid DESC" if sort == "recent" else "rank"
+    params.append(min(max(limit, 1), SEARCH_MAX_RESULTS))
+    for _ in range(SEARCH_PRUNE_ROUNDS):
+        rows = conn.execute(
+            "SELECT docs.message_id, docs.role, docs.ts, snippet(messages, 0, '**', '**', '…', 12), rank"
+            " FROM messages JOIN docs ON docs.id = messages.rowid"
+            f" WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT ?",
+            params
+        ).fetchall()
+        # Hits on archived or deleted messages are dropped; the next round refills the page
+        missing = _prune(rows)
+        rows = [row for row in rows if row[0] not in missing]
+        if not missing:
+            break
+    return [{
+        "id": message_id,
+        "role": role,
+        "timestamp": datetime.fromtimestamp(ts).isoformat() if ts is not None else None,
+        "snippet": snippet,
+        # bm25 ranks are negative; flip them so higher means more relevant
+        "score": round(-rank, 3),
+    } for message_id, role, ts, snippet, rank in rows]
@@ -0,0 +1,288 @@
+"""
+Semantic near-duplicate lookup for MedAssist.
+
+"what is dengue", "tell me about dengue fever" and "dengue symptoms?" are
+different cache keys but deserve the same answer. This module maps a new
+question to a previously answered one that is similar enough, so the caller
+can reuse that answer from the lookup caches instead of asking Gemini again.
+
+Questions are normalized (question phrasing and filler words removed, plurals
+folded) and embedded on the CPU as weighted hashed words: every word is
+feature-hashed into SEMANTIC_WORD_HASHES of SEMANTIC_CACHE_DIM signed
+dimensions, generic words ("fever", "disease") with a low weight, and the
+vector is L2-normalized. Whole words are the features, not character
+n-grams, so look-alike names ("hypothyroidism", "hyperthyroidism") share
+nothing. "dengue fever" and "dengue" score about 0.96; "lung cancer" and
+"breast cancer" about 0.5.
+
+Each namespace keeps its keys in a NumPy matrix; a query takes the cosine
+top-k over the whole matrix while it is small, and over the candidates of
+random-hyperplane LSH signatures once it grows past LSH_MIN_ENTRIES
+(signatures kept sorted per table and binary-searched), which keeps searches
+around 5 ms at a million entries. Memory is roughly 0.7 KB per entry, mostly
+the float16 vectors. The top candidates are then scored again exactly from
+their words, so a hash collision never passes for a match, and a match must
+agree on distinguishing words: numbers, single letters, roman numerals and
+qualifiers such as "acute" or "chronic" ("type 1 diabetes" never answers
+"type 2 diabetes").
+
+Drug names are not looked up here (see fetch_drug_info in app.py): a
+reworded drug name is usually a different drug.
+
+Keys are recorded in a local SQLite file, so every worker on the machine
+picks up the keys the others have answered.
+"""
+
+import os
+import re
+import math
+import zlib
+import sqlite3
+import tempfile
+import threading
+import time
+import telemetry
+from local_db import LocalDatabase
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    print("Warning: numpy not installed. The semantic cache will be disabled.")
+    NUMPY_AVAILABLE = False
+
+SEMANTIC_CACHE_ENABLED = NUMPY_AVAILABLE and os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() != "false"
+SEMANTIC_CACHE_PATH = os.environ.get(
+    "SEMANTIC_CACHE_PATH", os.path.join(tempfile.gettempdir(), "medassist-semantic-cache.sqlite3")
+)
+# Minimum cosine similarity for two questions to share an answer
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_DIM = int(os.environ.get("SEMANTIC_CACHE_DIM", "256"))
+# Dimensions each word is hashed into, so two words rarely collide on all of them
+SEMANTIC_WORD_HASHES = 4
+# Keys kept per namespace; later keys are not indexed
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000000"))
+# How often (in seconds) a process picks up keys added by other workers
+SEMANTIC_CACHE_SYNC_INTERVAL = float(os.environ.get("SEMANTIC_CACHE_SYNC_INTERVAL", "2"))
+
+# Below this many entries every key is scored; above it only LSH candidates are.
+# A candidate missed by LSH only costs an upstream call, never a wrong answer.
+LSH_MIN_ENTRIES = 20000
+LSH_TABLES = 20
+LSH_BITS = 12
+TOP_K = 5
+
+FILLER_WORDS = {
+    "what", "whats", "is", "are", "tell", "me", "about", "the", "a", "an", "of", "for",
+    "please", "info", "information", "on", "can", "you", "explain", "describe",
+    "symptoms", "symptom", "signs", "treatment", "treatments", "causes",
+}
+# Words that say little about which condition is meant; they count, but little
+GENERIC_WORDS = {"fever", "disease", "infection", "syndrome", "virus", "disorder", "condition"}
+GENERIC_WEIGHT = 0.3
+# Words two questions must agree on to share an answer, besides numbers and single letters
+QUALIFIER_WORDS = {
+    "acute", "chronic", "primary", "secondary", "high", "low", "mild", "severe",
+    "gestational", "juvenile", "neonatal", "congenital", "type",
+    "ii", "iii", "iv", "vi", "vii", "viii", "ix",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _fold(word):
+    """Singular of a plural word ("stones" -> "stone"); "diabetes" and "measles" fold the same way every time"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def normalize(text):
+    """Lowercase, drop punctuation, question phrasing and filler words, fold plurals"""
+    return " ".join(_fold(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in FILLER_WORDS)
+
+def _weights(normalized):
+    weights = {}
+    for word in normalized.split():
+        weights[word] = GENERIC_WEIGHT if word in GENERIC_WORDS else 1.0
+    return weights
+
+def distinguishing_tokens(normalized):
+    """Tokens a match must agree on exactly: numbers, single letters and qualifiers"""
+    return frozenset(
+        token for token in normalized.split() if token.isdigit() or len(token) == 1 or token in QUALIFIER_WORDS
+    )
+
+def similarity(first, second):
+    """Exact cosine similarity of two normalized questions' weighted words"""
+    a, b = _weights(first), _weights(second)
+    dot = sum(weight * b[word] for word, weight in a.items() if word in b)
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+def embed(normalized, dim=SEMANTIC_CACHE_DIM):
+    """Signed hashed words of a normalized question, weighted and L2-normalized"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word, weight in _weights(normalized).items():
+        for seed in range(SEMANTIC_WORD_HASHES):
+            digest = zlib.crc32(f"{seed}:{word}".encode("utf-8"))
+            vector[digest % dim] += weight if digest & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class VectorIndex:
+    """Keys and their vectors for one namespace, searchable by cosine similarity"""
+
+    def __init__(self, dim=SEMANTIC_CACHE_DIM, seed=0):
+        self.dim = dim
+        self.count = 0
+        self.keys = []
+        self.vectors = np.zeros((1024, dim), dtype=np.float16)
+        self.signatures = np.zeros((1024, LSH_TABLES), dtype=np.uint16)
+        planes = np.random.default_rng(seed).standard_normal((LSH_TABLES * LSH_BITS, dim))
+        self.planes = planes.astype(np.float32)
+        self.bit_weights = (1 << np.arange(LSH_BITS)).astype(np.uint16)
+        # Per table, the signatures of the first `sorted_count` entries in sorted order
+        self.sorted_count = 0
+        self.sorted_signatures = None
+        self.sorted_ids = None
+
+    def _signature(self, vectors):
+        bits = (vectors @ self.planes.T > 0).reshape(len(vectors), LSH_TABLES, LSH_BITS)
+        return (bits * self.bit_weights).sum(axis=2, dtype=np.uint16)
+
+    def add(self, key, vector):
+        if self.count == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+        self.vectors[self.count] = vector
+        self.signatures[self.count] = self._signature(vector[None, :].astype(np.float32))[0]
+        self.keys.append(key)
+        self.count += 1
+
+    def _sort(self):
+        signatures = self.signatures[:self.count].T
+        self.sorted_ids = np.argsort(signatures, axis=1, kind="stable").astype(np.int32)
+        self.sorted_signatures = np.take_along_axis(signatures, self.sorted_ids, axis=1)
+        self.sorted_count = self.count
+
+    def _candidates(self, vector):
+        """Entries sharing an LSH bucket with vector in at least one table"""
+        # Re-sort once the unsorted tail grows past a fraction of the index
+        if self.count - self.sorted_count > max(4096, self.count // 16):
+            self._sort()
+        query = self._signature(vector[None, :])[0]
+        found = []
+        for table in range(LSH_TABLES):
+            row = self.sorted_signatures[table]
+            low = np.searchsorted(row, query[table], side="left")
+            high = np.searchsorted(row, query[table], side="right")
+            found.append(self.sorted_ids[table, low:high])
+        tail = self.signatures[self.sorted_count:self.count]
+        found.append(np.flatnonzero((tail == query).any(axis=1)) + self.sorted_count)
+        return np.unique(np.concatenate(found))
+
+    def search(self, vector, k=TOP_K):
+        """Return up to k (key, score) pairs, most similar first"""
+        if self.count == 0:
+            return []
+        if self.count < LSH_MIN_ENTRIES:
+            candidates = np.arange(self.count)
+        else:
+            candidates = self._candidates(vector)
+            if len(candidates) == 0:
+                return []
+        scores = self.vectors[candidates].astype(np.float32) @ vector
+        top = np.arange(len(scores)) if len(scores) <= k else np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.keys[candidates[i]], float(scores[i])) for i in top]
+
+class SemanticCache:
+    """Map questions to similar, already answered ones, per namespace"""
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.threshold = threshold
+        self.db = LocalDatabase(path, schema=(
+            "CREATE TABLE IF NOT EXISTS question_vectors ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " cache_key TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " UNIQUE (namespace, key))",
+        ))
+        self._indexes = {}
+        self._known = set()
+        self._last_id = 0
+        self._last_sync = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _sync(self):
+        """Pick up keys recorded by any process since the last sync (call with the lock held)"""
+        if self._pid != os.getpid():
+            # Forked from a process that may have half-built indexes; start over
+            self._pid = os.getpid()
+            self._indexes, self._known, self._last_id = {}, set(), 0
+        elif time.monotonic() - self._last_sync < SEMANTIC_CACHE_SYNC_INTERVAL:
+            return
+        self._last_sync = time.monotonic()
+        rows = self.db.connection().execute(
+            "SELECT id, namespace, key, cache_key, vector FROM question_vectors WHERE id > ? ORDER BY id",
+            (self._last_id,)
+        ).fetchall()
+        for row_id, namespace, key, cache_key, blob in rows:
+            self._index_key(namespace, key, cache_key, np.frombuffer(blob, dtype=np.float16))
+            self._last_id = row_id
+
+    def _index_key(self, namespace, key, cache_key, vector):
+        if (namespace, key) in self._known:
+            return
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = self._indexes[namespace] = VectorIndex()
+        if index.count >= SEMANTIC_CACHE_MAX_ENTRIES:
+            return
+        index.add(cache_key, vector)
+        self._known.add((namespace, key))
+
+    def lookup(self, namespace, question):
+        """Return the lookup cache key of the most similar previously answered question, or None"""
+        if not SEMANTIC_CACHE_ENABLED:
+            return None
+        normalized = normalize(question)
+        if not normalized:
+            return None
+        try:
+            with self._lock:
+                self._sync()
+                index = self._indexes.get(namespace)
+                matches = index.search(embed(normalized)) if index else []
+        except sqlite3.Error as e:
+            print(f"Semantic cache read error: {str(e)}")
+            return None
+
+        guard = distinguishing_tokens(normalized)
+        best, best_score = None, self.threshold
+        for key, _ in matches:
+            candidate = normalize(key)
+            score = similarity(normalized, candidate)
+            if score >= best_score and distinguishing_tokens(candidate) == guard:
+                best, best_score = key, score
+        telemetry.record_cache(f"{namespace}:semantic", best is not None)
+        return best
+
+    def add(self, namespace, question):
+        """Record that question has an answer in the lookup caches (under its own text as key)"""
+        if not SEMANTIC_CACHE_ENABLED:
+            return
+        normalized = normalize(question)
+        if not normalized:
+            return
+        vector = embed(normalized).astype(np.float16)
+        try:
+            self.db.connection().execute(
+                "INSERT OR IGNORE INTO question_vectors (namespace, key, cache_key, vector) VALUES (?, ?, ?, ?)",
+                (namespace, normalized, question.strip().lower(), vector.tobytes())
+            )
+        except sqlite3.Error as e:
+            print(f"Semantic cache write error: {str(e)}")
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,166 @@
+"""
+Single-flight request coalescing for MedAssist.
+
+When many users ask about the same topic at once, only the first request for
+a key does the upstream work; concurrent duplicates wait for its result
+instead of calling Gemini, FallbackAPI or OpenFDA themselves.
+
+- Within a worker, duplicates wait on the leader's in-memory result.
+- Across workers, the leader holds a short-lived lease document in the
+  `lookup_leases` collection; other workers poll the shared lookup cache
+  (see lookup_cache.py) until the leader's result appears or the lease ends.
+"""
+
+import os
+import time
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+import deadlines
+from deadlines import DeadlineExceeded
+import resources
+import telemetry
+
+# How long a worker may hold a lookup lease before others take over
+LOOKUP_LEASE_SECONDS = float(os.environ.get("LOOKUP_LEASE_SECONDS", "15"))
+
+# Polling interval bounds (in seconds) while waiting on another worker's lease
+POLL_INTERVAL_MIN = 0.05
+POLL_INTERVAL_MAX = 0.25
+
+leases_collection = resources.collection("lookup_leases")
+
+class _Call:
+    """An in-flight lookup that other threads in this process can wait on"""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent lookups of the same key, within and across workers"""
+
+    def __init__(self, namespace, cache, lease_seconds=LOOKUP_LEASE_SECONDS):
+        self.namespace = namespace
+        self.cache = cache
+        self.lease_seconds = lease_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute):
+        """
+        Return compute() for key, sharing one execution among concurrent callers.
+
+        compute is expected to store successful results in self.cache, which is
+        how followers in other workers receive them.
+        """
+        normalized = key.strip().lower()
+        with self._lock:
+            call = self._calls.get(normalized)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[normalized] = call
+
+        if not leader:
+            return self._wait_local(call)
+
+        try:
+            call.result = self._do_across_workers(normalized, compute)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                self._calls.pop(normalized, None)
+
+    def _wait_local(self, call):
+        """Wait for the leader thread in this process"""
+        remaining = deadlines.current().remaining()
+        if not call.event.wait(None if remaining == float("inf") else remaining):
+            raise DeadlineExceeded(f"timed out waiting for an in-flight {self.namespace} lookup")
+        if call.error is not None:
+            raise call.error
+        telemetry.record_singleflight(self.namespace, "local_follower")
+        return call.result
+
+    def _do_across_workers(self, key, compute):
+        owner = self._acquire_lease(key)
+        if owner is None:
+            # Another worker is already fetching this key; wait for its result
+            result = self._wait_remote(key)
+            if result is not None:
+                telemetry.record_singleflight(self.namespace, "remote_follower")
+                return result
+            # The lease ended without a cached result (the lookup failed): do it ourselves
+            owner = self._acquire_lease(key, force=True)
+
+        telemetry.record_singleflight(self.namespace, "leader")
+        try:
+            return compute()
+        finally:
+            self._release_lease(key, owner)
+
+    def _lease_id(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _acquire_lease(self, key, force=False):
+        """Try to take the cross-worker lease; returns an owner token, or None if it is held"""
+        from pymongo.errors import DuplicateKeyError, PyMongoError
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        lease_id = self._lease_id(key)
+        try:
+            if force:
+                leases_collection.replace_one(
+                    {"_id": lease_id}, {"owner": owner, "expires_at": expires_at}, upsert=True
+                )
+                return owner
+            leases_collection.insert_one({"_id": lease_id, "owner": owner, "expires_at": expires_at})
+            return owner
+        except DuplicateKeyError:
+            # Take over a lease whose holder died without releasing it
+            taken = leases_collection.find_one_and_update(
+                {"_id": lease_id, "expires_at": {"$lt": now}},
+                {"$set": {"owner": owner, "expires_at": expires_at}}
+            )
+            return owner if taken is not None else None
+        except PyMongoError as e:
+            # Without Mongo we can still coalesce within this worker
+            print(f"Lookup lease error for {lease_id}: {str(e)}")
+            return owner
+
+    def _release_lease(self, key, owner):
+        from pymongo.errors import PyMongoError
+        try:
+            leases_collection.delete_one({"_id": self._lease_id(key), "owner": owner})
+        except PyMongoError as e:
+            print(f"Lookup lease release error: {str(e)}")
+
+    def _wait_remote(self, key):
+        """Poll the shared cache until another worker's result appears or its lease ends"""
+        from pymongo.errors import PyMongoError
+        deadline = deadlines.current()
+        give_up_at = time.monotonic() + self.lease_seconds
+        interval = POLL_INTERVAL_MIN
+        while time.monotonic() < give_up_at:
+            result = self.cache.peek(key)
+            if result is not None:
+                return result
+            try:
+                lease = leases_collection.find_one({"_id": self._lease_id(key)}, {"expires_at": 1})
+            except PyMongoError:
+                lease = None
+            if lease is None or lease["expires_at"].replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+                # Leader finished (check the cache once more) or died
+                return self.cache.peek(key)
+            deadline.check()
+            time.sleep(min(interval, deadline.remaining()))
+            interval = min(interval * 2, POLL_INTERVAL_MAX)
+        return None
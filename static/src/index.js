@@ -0,0 +1,850 @@
+// Configure marked for safe rendering
+marked.setOptions({
+  breaks: true,
+  gfm: true,
+  smartLists: true
+});
+
+// User profile data
+let userProfile = {
+  name: "",
+  age: "",
+  conditions: [],
+  customCondition: "",
+  preferredReminderTime: "08:00"
+};
+
+// Sound for reminder alerts
+const reminderSound = new Howl({
+  src: ['https://assets.mixkit.co/sfx/preview/mixkit-alarm-digital-clock-beep-989.mp3'],
+  volume: 0.7,
+  loop: true, // Ensure loop is true
+  html5: true // Use HTML5 Audio to improve reliability on some browsers
+});
+
+// The browser's timezone, sent with reminder and chat requests so dose times are the user's wall-clock times
+const TIMEZONE = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+// Active reminders with timers
+const activeReminders = {};
+
+// Quick response suggestions based on context
+const quickResponseSets = {
+  default: [
+    { text: "View all medications", action: "view_all" },
+    { text: "Set a new reminder", action: "new_reminder" }
+  ],
+  medicationAdded: [
+    { text: "View medication details", action: "view_details" },
+    { text: "Set another reminder", action: "new_reminder" },
+    { text: "View all medications", action: "view_all" }
+  ],
+  conditionBased: {
+    diabetes: [
+      { text: "Diabetes medications", action: "Tell me about diabetes medications" },
+      { text: "Set insulin reminder", action: "Remind me about insulin" }
+    ],
+    hypertension: [
+      { text: "Blood pressure meds", action: "Tell me about hypertension medications" },
+      { text: "Set BP med reminder", action: "Remind me about my blood pressure medicine" }
+    ],
+    asthma: [
+      { text: "Asthma medications", action: "Tell me about asthma medications" },
+      { text: "Set inhaler reminder", action: "Remind me about my inhaler" }
+    ],
+    dengue: [
+      { text: "Dengue medications", action: "Tell me about dengue medications" },
+      { text: "Set fever med reminder", action: "Remind me about my dengue medicines" }
+    ]
+  }
+};
+
+// Variables to track chat state
+let currentMedication = "";
+let isWaitingForBotResponse = false;
+// Remove chatHistoryLoaded flag, we want to load every time
+// let chatHistoryLoaded = false;
+
+// Add an initial greeting when page loads
+document.addEventListener('DOMContentLoaded', function() {
+  // Fetch user profile first
+  fetchUserProfile().then(() => {
+      // Then load chat history
+      loadChatHistory(); // Load history every time the page loads
+  });
+
+  // Initialize button listeners
+  document.getElementById('view-all-btn').addEventListener('click', function() {
+    handleQuickResponse('view_all');
+  });
+
+  // Add listener for the new clear chat button
+  document.getElementById('clear-chat-btn').addEventListener('click', function() {
+    if (confirm("Are you sure you want to clear the entire chat history? This cannot be undone.")) {
+        clearChatHistory();
+    }
+  });
+
+  document.getElementById('user-profile-btn').addEventListener('click', showProfileModal);
+
+  // Profile modal setup
+  document.getElementById('saveProfileBtn').addEventListener('click', saveUserProfile);
+
+  // Set up condition card toggling including custom condition
+  document.querySelectorAll('.condition-card').forEach(card => {
+    card.addEventListener('click', function() {
+      this.classList.toggle('active');
+
+      // Show/hide custom condition input
+      if (this.dataset.condition === 'other') {
+        document.getElementById('customConditionContainer').classList.toggle('active', this.classList.contains('active'));
+      }
+    });
+  });
+
+  // Close modal when clicking outside
+  document.getElementById('userProfileModal').addEventListener('click', function(e) {
+    if (e.target === this) {
+      hideProfileModal();
+    }
+  });
+
+  // Populate profile form with saved data if available
+  populateProfileForm();
+
+  // Start checking for reminders
+  startReminderChecks();
+});
+
+function startReminderChecks() {
+  // Check for reminders immediately on load
+  checkForReminders();
+  // Check for reminders every 10 seconds for faster testing/response
+  // Change back to 60000 (1 minute) for production
+  setInterval(checkForReminders, 10000);
+}
+
+function checkForReminders() {
+  const now = new Date();
+  const currentHour = now.getHours();
+  const currentMinute = now.getMinutes();
+
+  // Fetch all reminders
+  fetch('/get-reminders', { headers: { 'X-Timezone': TIMEZONE } })
+    .then(res => res.json())
+    .then(data => {
+      const reminders = data.reminders || [];
+
+      reminders.forEach(reminder => {
+        // Every dose the schedule has today, e.g. 08:00 and 20:00 for twice daily
+        doseTimesOn(reminder, now).forEach(clock => {
+          const [reminderHour, reminderMinute] = clock.split(':').map(Number);
+          const alertKey = `${reminder.id}@${clock}`;
+
+          // Check if it's time for the reminder
+          // Use a small window (e.g., check if current time matches reminder time in the last 10 seconds)
+          // This helps avoid missing the exact minute due to interval timing
+          const reminderTimeToday = new Date();
+          reminderTimeToday.setHours(reminderHour, reminderMinute, 0, 0);
+
+          // Check if the current time is within 10 seconds *after* the reminder time
+          const diffSeconds = (now - reminderTimeToday) / 1000;
+
+          // Only trigger if it's the correct hour/minute and hasn't been shown recently
+          if (currentHour === reminderHour && currentMinute === reminderMinute && !activeReminders[alertKey]) {
+             // Check if the reminder time just passed (within the interval check window)
+             // This prevents triggering multiple times if the check runs slightly late
+             if (diffSeconds >= 0 && diffSeconds < 15) { // Check within 15 seconds past the minute
+                 showReminder(reminder);
+                 reportDose(reminder.id, false);
+                 // Mark as shown to prevent re-triggering immediately
+                 activeReminders[alertKey] = true;
+                 // Remove from active list after a while (e.g., 2 minutes)
+                 setTimeout(() => {
+                     delete activeReminders[alertKey];
+                 }, 120000);
+             }
+          }
+        });
+      });
+    })
+    .catch(err => console.error('Error checking reminders:', err));
+}
+
+function showReminder(reminder) {
+  // Stop any previous sound first
+  reminderSound.stop();
+  // Play sound (Howler handles looping)
+  reminderSound.play();
+
+  // Set notification content
+  document.getElementById('reminderBody').innerHTML = `
+    It's time to take <strong>${reminder.name}</strong>!
+  `;
+
+  // Show notification
+  const notification = document.getElementById('reminderNotification');
+  notification.dataset.reminderId = reminder.id;
+  notification.style.display = 'block';
+
+  // Also trigger browser notification if available
+  if ('Notification' in window) {
+    if (Notification.permission === 'granted') {
+      new Notification('Time to take your medication!', {
+        body: `It's time to take ${reminder.name}`,
+        icon: '/static/pill-icon.png',
+        requireInteraction: true // Keep notification until user interacts with it
+      });
+    } else if (Notification.permission !== 'denied') {
+      Notification.requestPermission().then(permission => {
+        if (permission === 'granted') {
+          new Notification('Time to take your medication!', {
+            body: `It's time to take ${reminder.name}`,
+            icon: '/static/pill-icon.png',
+            requireInteraction: true
+          });
+        }
+      });
+    }
+  }
+
+  // Auto-hide after 5 minutes if not dismissed - REMOVED, sound loops until dismissed
+  // setTimeout(() => {
+  //   if (notification.style.display === 'block') {
+  //     dismissReminder();
+  //   }
+  // }, 300000); // 5 minutes
+}
+
+function dismissReminder() {
+  document.getElementById('reminderNotification').style.display = 'none';
+  reminderSound.stop(); // Stop the looping sound
+}
+
+// Dose times ("HH:MM") of a reminder on the given day, following its schedule
+function doseTimesOn(reminder, day) {
+  const date = `${day.getFullYear()}-${String(day.getMonth() + 1).padStart(2, '0')}-${String(day.getDate()).padStart(2, '0')}`;
+  if (reminder.start && date < reminder.start) return [];
+  if (reminder.until && date > reminder.until) return [];
+  if (reminder.weekdays && !reminder.weekdays.includes((day.getDay() + 6) % 7)) return [];
+  if (reminder.start && reminder.every_days > 1) {
+    const [year, month, dayOfMonth] = reminder.start.split('-').map(Number);
+    const today = new Date(day.getFullYear(), day.getMonth(), day.getDate());
+    const elapsedDays = Math.round((today - new Date(year, month - 1, dayOfMonth)) / 86400000);
+    if (elapsedDays % reminder.every_days !== 0) return [];
+  }
+  if (reminder.every_hours && reminder.start) return intervalDoseTimesOn(reminder, day);
+  return reminder.times || [];
+}
+
+// Dose times of an "every N hours" reminder on the given day, counted from its first dose
+function intervalDoseTimesOn(reminder, day) {
+  const [year, month, dayOfMonth] = reminder.start.split('-').map(Number);
+  const [hours, minutes] = reminder.times[0].split(':').map(Number);
+  const first = new Date(year, month - 1, dayOfMonth, hours, minutes);
+  const step = reminder.every_hours * 3600000;
+  const dayStart = new Date(day.getFullYear(), day.getMonth(), day.getDate());
+  const dayEnd = new Date(day.getFullYear(), day.getMonth(), day.getDate() + 1);
+  const times = [];
+  let dose = new Date(first.getTime() + Math.max(0, Math.ceil((dayStart - first) / step)) * step);
+  while (dose < dayEnd) {
+    times.push(`${String(dose.getHours()).padStart(2, '0')}:${String(dose.getMinutes()).padStart(2, '0')}`);
+    dose = new Date(dose.getTime() + step);
+  }
+  return times;
+}
+
+// Tell the server a dose went off (or was taken) so its next due time moves on
+function reportDose(reminderId, taken) {
+  fetch('/reminder-fired', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Timezone': TIMEZONE },
+    body: JSON.stringify({ id: reminderId, taken: taken })
+  })
+    .catch(err => console.error('Error reporting dose:', err));
+}
+
+function takenReminder() {
+  reportDose(document.getElementById('reminderNotification').dataset.reminderId, true);
+  dismissReminder(); // Stops sound and hides notification
+  addMessage('You', `I took my medication (${document.getElementById('reminderBody').querySelector('strong').innerText})`, 'user');
+  addMessage('Bot', '## ✅ Great job!\n\nThank you for confirming. Your medication has been marked as taken.', 'bot');
+}
+
+function showProfileModal() {
+  const modal = document.getElementById('userProfileModal');
+  modal.classList.add('active');
+  populateProfileForm();
+}
+
+function hideProfileModal() {
+  const modal = document.getElementById('userProfileModal');
+  modal.classList.remove('active');
+}
+
+function populateProfileForm() {
+  document.getElementById('userName').value = userProfile.name || '';
+  document.getElementById('userAge').value = userProfile.age || '';
+  document.getElementById('preferredReminderTime').value = userProfile.preferredReminderTime || '08:00';
+  document.getElementById('customCondition').value = userProfile.customCondition || '';
+
+  // Reset all condition cards
+  document.querySelectorAll('.condition-card').forEach(card => {
+    card.classList.remove('active');
+  });
+
+  // Set active conditions
+  userProfile.conditions.forEach(condition => {
+    const card = document.querySelector(`.condition-card[data-condition="${condition}"]`);
+    if (card) card.classList.add('active');
+  });
+
+  // Show custom condition input if needed
+  if (userProfile.conditions.includes('other')) {
+    document.getElementById('customConditionContainer').classList.add('active');
+  } else {
+    document.getElementById('customConditionContainer').classList.remove('active');
+  }
+}
+
+function fetchUserProfile() {
+  return fetch('/get-profile')
+    .then(res => res.json())
+    .then(data => {
+      if (data.success) {
+        userProfile = data.profile;
+
+        // Populate profile form with server data
+        populateProfileForm();
+
+        // Update quick responses based on conditions
+        updateQuickResponses();
+      }
+    })
+    .catch(err => {
+      console.error('Error fetching user profile:', err);
+    });
+}
+
+function saveUserProfile() {
+  // Get values from form
+  userProfile.name = document.getElementById('userName').value;
+  userProfile.age = document.getElementById('userAge').value;
+  userProfile.preferredReminderTime = document.getElementById('preferredReminderTime').value;
+  userProfile.customCondition = document.getElementById('customCondition').value;
+
+  // Get selected conditions
+  userProfile.conditions = [];
+  document.querySelectorAll('.condition-card.active').forEach(card => {
+    userProfile.conditions.push(card.dataset.condition);
+  });
+
+  // Send to server instead of just localStorage
+  fetch('/update-profile', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(userProfile)
+  })
+    .then(res => res.json())
+    .then(data => {
+      if (data.success) {
+        // Hide modal
+        hideProfileModal();
+
+        // Update quick responses based on conditions
+        updateQuickResponses();
+
+        // Show confirmation
+        addMessage('Bot', `## Profile Updated!\n\nThanks${userProfile.name ? ' ' + userProfile.name : ''}! I'll personalize your medication reminders based on your profile information.\n\nYou can manage your reminders on the [Reminders Dashboard](/reminders).`, 'bot');
+      } else {
+        alert('Error updating profile: ' + data.message);
+      }
+    })
+    .catch(err => {
+      console.error('Error updating profile:', err);
+      alert('Error saving profile. Please try again.');
+    });
+}
+
+function updateQuickResponses(setName = 'default') {
+  const container = document.getElementById('quickResponses');
+  container.innerHTML = '';
+
+  let responses = [];
+
+  // Add condition-specific quick responses if user has conditions
+  if (userProfile.conditions && userProfile.conditions.length > 0) {
+    userProfile.conditions.forEach(condition => {
+      if (quickResponseSets.conditionBased[condition]) {
+        responses = [...responses, ...quickResponseSets.conditionBased[condition]];
+      }
+    });
+  }
+
+  // Add default responses for the specified set
+  responses = [...responses, ...quickResponseSets[setName] || quickResponseSets.default];
+
+  // Remove duplicates by action
+  const uniqueResponses = [];
+  const actionsSeen = new Set();
+  responses.forEach(response => {
+    if (!actionsSeen.has(response.action)) {
+      uniqueResponses.push(response);
+      actionsSeen.add(response.action);
+    }
+  });
+
+  // Display buttons
+  uniqueResponses.forEach(response => {
+    const btn = document.createElement('button');
+    btn.className = 'quick-response-btn';
+    btn.innerText = response.text;
+    btn.addEventListener('click', () => handleQuickResponse(response.action));
+    container.appendChild(btn);
+  });
+}
+
+function handleQuickResponse(action) {
+  switch(action) {
+    case 'view_all':
+      sendUserMessage("View all my medication reminders");
+      break;
+    case 'new_reminder':
+      sendUserMessage("I want to set a new medication reminder");
+      break;
+    case 'view_details':
+      if (currentMedication) {
+        sendUserMessage(`Tell me about ${currentMedication}`);
+      } else {
+        sendUserMessage("What medications do I have?");
+      }
+      break;
+    default:
+      sendUserMessage(action);
+  }
+}
+
+function sendUserMessage(text) {
+  document.getElementById('userInput').value = text;
+  sendMessage();
+}
+
+function sendMessage() {
+  const input = document.getElementById('userInput');
+  const message = input.value.trim();
+  if (message === '' || isWaitingForBotResponse) return;
+
+  addMessage('You', message, 'user');
+  input.value = '';
+
+  // Show typing indicator
+  showTypingIndicator();
+  isWaitingForBotResponse = true;
+
+  fetch('/chat', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Timezone': TIMEZONE },
+    body: JSON.stringify({ message })
+  })
+    .then(res => res.json())
+    .then(data => {
+      // Remove typing indicator
+      removeTypingIndicator();
+      isWaitingForBotResponse = false;
+
+      // Look for medication name in user message for context
+      if (message.toLowerCase().includes("remind") && 
+          !message.toLowerCase().includes("view all")) {
+        // Extract potential medication name (more careful extraction)
+        extractMedicationName(message);
+
+        // If a reminder was potentially set, update quick responses
+        if (data.reply.includes("✅") || data.reply.includes("Reminder Set")) {
+          updateQuickResponses('medicationAdded');
+        }
+      }
+
+      // The next message is a medication name if the bot just asked for one
+      awaitingMedicationName = /(what|which) medication|valid medication name/i.test(data.reply);
+
+      addMessage('Bot', data.reply, 'bot');
+    })
+    .catch(error => {
+      removeTypingIndicator();
+      isWaitingForBotResponse = false;
+      addMessage('Bot', '**Sorry, there was an error processing your request.** Please try again later.', 'bot');
+      console.error('Error:', error);
+    });
+}
+
+function extractMedicationName(message) {
+    // More sophisticated extraction to avoid capturing "tell me about" phrases
+    const reminderPattern = /remind\s+(?:me\s+)?(?:about\s+)?(?:my\s+)?([a-zA-Z\s]+)(?:\s+(?:at|for|on)\s+)?/i;
+    const match = message.match(reminderPattern);
+
+    if (match && match[1]) {
+        const potentialMed = match[1].trim();
+        // Avoid setting phrases like "tell me about" as the medication name
+        if (!potentialMed.startsWith("tell me") && 
+            !potentialMed.startsWith("what is") && 
+            potentialMed.length > 2) {
+            currentMedication = potentialMed;
+        }
+    }
+}
+
+function showTypingIndicator() {
+  const chatbox = document.getElementById('chatbox');
+  const indicator = document.createElement('div');
+  indicator.className = 'msg bot typing-indicator clearfix';
+  indicator.id = 'typing-indicator';
+  indicator.innerHTML = `
+    <span class="bot-avatar"><i class="fas fa-robot"></i></span>
+    <span></span>
+    <span></span>
+    <span></span>
+  `;
+  chatbox.appendChild(indicator);
+  chatbox.scrollTop = chatbox.scrollHeight;
+}
+
+function removeTypingIndicator() {
+  const indicator = document.getElementById('typing-indicator');
+  if (indicator) {
+    indicator.remove();
+  }
+}
+
+function addMessage(sender, text, type) {
+  const chatbox = document.getElementById('chatbox');
+  const msg = document.createElement('div');
+  msg.classList.add('msg', type, 'clearfix');
+
+  // Parse markdown for bot messages
+  if (type === 'bot') {
+    // Replace emoji markers with actual icons
+    text = text.replace(/📌/g, '<i class="fas fa-thumbtack icon"></i>');
+    text = text.replace(/📋/g, '<i class="fas fa-clipboard-list icon"></i>');
+    text = text.replace(/❌/g, '<i class="fas fa-times-circle icon"></i>');
+    text = text.replace(/⚠️/g, '<i class="fas fa-exclamation-triangle icon"></i>');
+    text = text.replace(/✅/g, '<i class="fas fa-check-circle icon"></i>');
+
+    // Don't replace 'you' with user's name - this causes problems
+    // instead, just use the text as-is
+
+    // Parse the markdown
+    const parsedContent = marked.parse(text);
+
+    let botIcon = '<span class="bot-avatar"><i class="fas fa-robot"></i></span>';
+    msg.innerHTML = `<strong>${botIcon} ${sender}:</strong> ${parsedContent}`;
+
+    // If the message contains medication schedule information, visualize it better
+    if (text.includes("Reminder set") || text.includes("scheduled at") || 
+        text.includes("Reminder Set") || text.includes("has been set for")) {
+      enhanceMedicationDisplay(msg);
+    }
+
+    // If the message contains conditions like "dengue", add visual disease cards
+    if (text.toLowerCase().includes("dengue") || 
+        text.toLowerCase().includes("malaria") || 
+        text.toLowerCase().includes("covid")) {
+      enhanceConditionDisplay(msg, text);
+    }
+  } else {
+    msg.innerHTML = `<strong>${sender}:</strong> ${text}`;
+  }
+
+  chatbox.appendChild(msg);
+  chatbox.scrollTop = chatbox.scrollHeight;
+}
+
+function enhanceMedicationDisplay(messageElement) {
+  // Look for medication name and time in the message
+  const content = messageElement.innerHTML;
+  const medNameMatch = content.match(/\*\*([^*]+)\*\*/);
+  const timeMatch = content.match(/at \*\*([^*]+)\*\*/);
+
+  if (medNameMatch && timeMatch) {
+    const medName = medNameMatch[1];
+    const medTime = timeMatch[1];
+
+    // Create a visual schedule element
+    const scheduleDiv = document.createElement('div');
+    scheduleDiv.className = 'medication-schedule';
+    scheduleDiv.innerHTML = `
+      <div class="medication-item">
+        <div class="medication-time">
+          <i class="fas fa-clock"></i> ${medTime}
+        </div>
+        <div class="medication-name">
+          <i class="fas fa-pills"></i> ${medName}
+        </div>
+      </div>
+    `;
+
+    // Insert the visual element
+    messageElement.appendChild(scheduleDiv);
+  }
+}
+
+function enhanceConditionDisplay(messageElement, text) {
+  // Check which condition is mentioned
+  const conditions = ["dengue", "malaria", "covid"];
+  let foundCondition = "";
+
+  for (const condition of conditions) {
+    if (text.toLowerCase().includes(condition)) {
+      foundCondition = condition;
+      break;
+    }
+  }
+
+  if (foundCondition) {
+    // Create condition-specific visual element
+    let icon, color, description;
+
+    switch(foundCondition) {
+      case "dengue":
+        icon = "fa-bug";
+        color = "#ff6b6b";
+        description = "Dengue fever is a mosquito-borne disease that requires proper hydration and fever management";
+        break;
+      case "malaria":
+        icon = "fa-mosquito";
+        color = "#5e72e4";
+        description = "Malaria is a serious mosquito-borne disease requiring specific antimalarial medications";
+        break;
+      case "covid":
+        icon = "fa-virus";
+        color = "#8854d0";
+        description = "COVID-19 is a respiratory illness that may require symptom management and isolation";
+        break;
+    }
+
+    const conditionDiv = document.createElement('div');
+    conditionDiv.className = 'condition-info';
+    conditionDiv.innerHTML = `
+      <div style="display: flex; align-items: center; background: ${color}15; border: 1px solid ${color}; border-radius: 10px; padding: 15px; margin: 10px 0;">
+        <div style="background: ${color}; width: 50px; height: 50px; border-radius: 50%; display: flex; align-items: center; justify-content: center; margin-right: 15px;">
+          <i class="fas ${icon}" style="color: white; font-size: 24px;"></i>
+        </div>
+        <div>
+          <div style="font-weight: bold; font-size: 18px; margin-bottom: 5px;">${foundCondition.charAt(0).toUpperCase() + foundCondition.slice(1)} Management</div>
+          <div style="font-size: 14px;">${description}</div>
+        </div>
+      </div>
+    `;
+
+    // Insert the visual element
+    messageElement.appendChild(conditionDiv);
+  }
+}
+
+// Add an event listener for the Enter key
+document.getElementById('userInput').addEventListener('keypress', function(e) {
+  if (e.key === 'Enter') {
+    hideMedicationSuggestions();
+    sendMessage();
+  }
+});
+
+// Medication name typeahead: suggests names for the part of the message
+// that names a medication, most used first (see autocomplete.py)
+const medicationNamePattern = /(?:remind\s+me\s+(?:to\s+take|about)|tell\s+me\s+about|what\s+is)\s+([a-z0-9][a-z0-9 \-]*)$/i;
+const suggestionCache = new Map();
+let awaitingMedicationName = false;
+let suggestionTimer = null;
+let medicationSuggestions = { fragment: null, names: [], selected: -1 };
+
+function medicationFragment(text) {
+  const match = text.match(medicationNamePattern);
+  if (match) return { start: match.index + match[0].length - match[1].length, text: match[1] };
+  if (awaitingMedicationName && /^[a-z0-9][a-z0-9 \-]*$/i.test(text)) return { start: 0, text: text };
+  return null;
+}
+
+document.getElementById('userInput').addEventListener('input', function() {
+  clearTimeout(suggestionTimer);
+  const fragment = medicationFragment(this.value);
+  if (!fragment || fragment.text.trim().length < 2) {
+    hideMedicationSuggestions();
+    return;
+  }
+  // Wait for a pause in typing before asking the server
+  suggestionTimer = setTimeout(() => loadMedicationSuggestions(fragment), 80);
+});
+
+document.getElementById('userInput').addEventListener('keydown', function(e) {
+  const { names, selected } = medicationSuggestions;
+  if (!names.length) return;
+  if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+    e.preventDefault();
+    const step = e.key === 'ArrowDown' ? 1 : -1;
+    medicationSuggestions.selected = (selected + step + names.length) % names.length;
+    renderMedicationSuggestions();
+  } else if ((e.key === 'Enter' || e.key === 'Tab') && selected >= 0) {
+    // Stops the keypress that would send the message
+    e.preventDefault();
+    chooseMedicationSuggestion(selected);
+  } else if (e.key === 'Escape') {
+    hideMedicationSuggestions();
+  }
+});
+
+document.getElementById('userInput').addEventListener('blur', hideMedicationSuggestions);
+
+function loadMedicationSuggestions(fragment) {
+  const query = fragment.text.trim().toLowerCase();
+  const show = names => {
+    // Ignore answers for what the user has typed past since
+    const current = medicationFragment(document.getElementById('userInput').value);
+    if (!current || current.text.trim().toLowerCase() !== query) return;
+    medicationSuggestions = { fragment: current, names: names, selected: -1 };
+    renderMedicationSuggestions();
+  };
+  if (suggestionCache.has(query)) {
+    show(suggestionCache.get(query));
+    return;
+  }
+  fetch(`/autocomplete-medication?q=${encodeURIComponent(query)}&limit=6`)
+    .then(res => res.json())
+    .then(data => {
+      const names = data.suggestions || [];
+      suggestionCache.set(query, names);
+      show(names);
+    })
+    .catch(err => console.error('Error loading medication suggestions:', err));
+}
+
+function renderMedicationSuggestions() {
+  const list = document.getElementById('medSuggestions');
+  const { names, selected } = medicationSuggestions;
+  list.innerHTML = '';
+  names.forEach((name, index) => {
+    const item = document.createElement('li');
+    item.textContent = name;
+    if (index === selected) item.classList.add('selected');
+    // mousedown, so the choice lands before the input loses focus
+    item.addEventListener('mousedown', e => {
+      e.preventDefault();
+      chooseMedicationSuggestion(index);
+    });
+    list.appendChild(item);
+  });
+  list.classList.toggle('active', names.length > 0);
+}
+
+function chooseMedicationSuggestion(index) {
+  const input = document.getElementById('userInput');
+  const { fragment, names } = medicationSuggestions;
+  input.value = input.value.slice(0, fragment.start) + names[index] + ' ';
+  hideMedicationSuggestions();
+  input.focus();
+}
+
+function hideMedicationSuggestions() {
+  clearTimeout(suggestionTimer);
+  medicationSuggestions = { fragment: null, names: [], selected: -1 };
+  const list = document.getElementById('medSuggestions');
+  list.innerHTML = '';
+  list.classList.remove('active');
+}
+
+function loadChatHistory() {
+  // Remove the check for chatHistoryLoaded
+  // if (chatHistoryLoaded) return;
+
+  console.log("Attempting to load chat history..."); // Add log
+  const chatbox = document.getElementById('chatbox');
+  // Clear the chatbox *before* fetching to avoid appending duplicates on reload
+  chatbox.innerHTML = '';
+  // Show a temporary loading message
+  chatbox.innerHTML = '<div class="msg bot"><span class="bot-avatar"><i class="fas fa-spinner fa-spin"></i></span> Loading history...</div>';
+
+
+  fetch('/get-chat-history')
+    .then(res => res.json())
+    .then(data => {
+      // Clear loading message
+      chatbox.innerHTML = '';
+
+      if (data.history && data.history.length > 0) {
+        console.log("Chat history found, loading messages."); // Add log
+
+        // Replay the chat history
+        data.history.forEach(msg => {
+          addMessage(msg.role === 'user' ? 'You' : 'Bot', msg.content, msg.role);
+        });
+
+        // chatHistoryLoaded = true; // No longer needed
+        chatbox.scrollTop = chatbox.scrollHeight; // Scroll to bottom after loading
+        updateQuickResponses(); // Update quick responses based on the last message context if needed
+      } else {
+        console.log("No chat history found, showing default greeting."); // Add log
+        // If no history, show the greeting
+        setTimeout(() => {
+            const greeting = userProfile.name ?
+              `## Welcome back, ${userProfile.name}! 👋\n\nI'm your personal medication assistant. How can I help you today?` :
+              '## Welcome to MedAssist! 👋\n\nI am your personal medication assistant. How can I help you today?';
+
+            addMessage('Bot', greeting, 'bot');
+            updateQuickResponses();
+        }, 50); // Short delay
+        // chatHistoryLoaded = true; // No longer needed
+      }
+    })
+    .catch(err => {
+      // Clear loading message
+      chatbox.innerHTML = '';
+      console.error('Error loading chat history:', err); // Log error
+      // Show default greeting with error message
+      setTimeout(() => {
+        const greeting = userProfile.name ?
+          `## Welcome back, ${userProfile.name}! 👋\n\nError loading history. How can I help you today?` :
+          '## Welcome to MedAssist! 👋\n\nError loading history. How can I help you today?';
+
+        addMessage('Bot', greeting, 'bot');
+        updateQuickResponses();
+      }, 50);
+      // chatHistoryLoaded = true; // No longer needed
+    });
+}
+
+// Function to clear chat history
+function clearChatHistory() {
+    console.log("Clearing chat history...");
+    fetch('/clear-chat-history', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            console.log("Chat history cleared successfully.");
+            const chatbox = document.getElementById('chatbox');
+            chatbox.innerHTML = ''; // Clear the display
+
+            // Show the default greeting again
+            const greeting = userProfile.name ?
+              `## Chat history cleared.\n\nHow can I help you today, ${userProfile.name}?` :
+              '## Chat history cleared.\n\nHow can I help you today?';
+
+            addMessage('Bot', greeting, 'bot');
+            updateQuickResponses('default'); // Reset quick responses
+        } else {
+            console.error("Failed to clear chat history on server:", data.message);
+            alert("Could not clear chat history. Please try again.");
+        }
+    })
+    .catch(err => {
+        console.error('Error clearing chat history:', err);
+        alert("An error occurred while clearing chat history.");
+    });
+}
+
+// Add logout button to the header
+document.querySelector('.header-actions').innerHTML += `
+  <a href="/logout" class="header-btn" id="logout-btn" title="Logout">
+    <i class="fas fa-sign-out-alt"></i>
+  </a>
+`;
@@ -0,0 +1,505 @@
+// Sound for reminder alerts
+const reminderSound = new Howl({
+  src: ['https://assets.mixkit.co/sfx/preview/mixkit-alarm-digital-clock-beep-989.mp3'],
+  volume: 0.7,
+  loop: true, // Ensure loop is true
+  html5: true // Use HTML5 Audio
+});
+
+// The browser's timezone, sent with reminder and chat requests so dose times are the user's wall-clock times
+const TIMEZONE = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+// Current reminder being edited
+let currentEditingReminder = null;
+// Track active alerts to prevent duplicates
+const activeAlerts = {};
+// Reminders shown on the page, by id, for their countdowns
+let remindersById = {};
+
+// DOM elements
+const remindersContainer = document.getElementById('remindersContainer');
+const editReminderModal = document.getElementById('editReminderModal');
+const editMedicationName = document.getElementById('editMedicationName');
+const editReminderTime = document.getElementById('editReminderTime');
+const cancelEditBtn = document.getElementById('cancelEditBtn');
+const saveEditBtn = document.getElementById('saveEditBtn');
+
+// Initialize the dashboard
+document.addEventListener('DOMContentLoaded', function() {
+  // Load reminders
+  loadReminders();
+
+  // Set up interval to update countdowns
+  setInterval(updateCountdowns, 1000);
+
+  // Set up interval to check for due reminders (more frequently for testing)
+  setInterval(checkDueReminders, 10000); // Check every 10 seconds
+
+  // Set up modal event listeners
+  cancelEditBtn.addEventListener('click', hideEditModal);
+  saveEditBtn.addEventListener('click', saveReminderEdit);
+
+  // Close modal when clicking outside
+  editReminderModal.addEventListener('click', function(e) {
+    if (e.target === this) {
+      hideEditModal();
+    }
+  });
+
+  // Request notification permission
+  if ('Notification' in window) {
+    Notification.requestPermission();
+  }
+});
+
+function loadReminders() {
+  fetch('/get-reminders', { headers: { 'X-Timezone': TIMEZONE } })
+    .then(res => res.json())
+    .then(data => {
+      displayReminders(data.reminders || []);
+    })
+    .catch(err => {
+      console.error('Error loading reminders:', err);
+      remindersContainer.innerHTML = `
+        <div class="no-reminders">
+          <i class="fas fa-exclamation-circle"></i>
+          <h2>Error Loading Reminders</h2>
+          <p>There was a problem loading your medication reminders. Please try again.</p>
+          <button class="cta-button" onclick="loadReminders()">Retry</button>
+        </div>
+      `;
+    });
+}
+
+function displayReminders(reminders) {
+  if (!reminders || reminders.length === 0) {
+    remindersContainer.innerHTML = `
+      <div class="no-reminders">
+        <i class="fas fa-calendar-times"></i>
+        <h2>No Reminders Set</h2>
+        <p>You don't have any medication reminders set up yet.</p>
+        <a href="/" class="cta-button">Set a Reminder</a>
+      </div>
+    `;
+    return;
+  }
+
+  // Group reminders by condition
+  const groupedReminders = {};
+
+  reminders.forEach(reminder => {
+    const condition = reminder.condition || 'general';
+    if (!groupedReminders[condition]) {
+      groupedReminders[condition] = [];
+    }
+    groupedReminders[condition].push(reminder);
+  });
+
+  // Build HTML for reminders
+  let html = '';
+  remindersById = {};
+
+  for (const condition in groupedReminders) {
+    groupedReminders[condition].forEach(reminder => {
+      remindersById[reminder.id] = reminder;
+      const timeFormatted = reminder.schedule || formatTime(reminder.time);
+
+      html += `
+        <div class="reminder-card" data-id="${reminder.id}">
+          <div class="reminder-header">
+            <div>
+              <div class="reminder-title">${reminder.name}</div>
+              <div class="reminder-condition">${capitalizeFirstLetter(condition)}</div>
+            </div>
+          </div>
+          <div class="reminder-time">
+            <i class="fas fa-clock"></i> ${timeFormatted}
+          </div>
+          <div class="countdown" id="countdown-${reminder.id}">
+            Calculating...
+          </div>
+          <div class="reminder-actions">
+            <button class="reminder-btn edit" onclick="editReminder('${reminder.id}')">
+              <i class="fas fa-edit"></i> Edit
+            </button>
+            <button class="reminder-btn delete" onclick="deleteReminder('${reminder.id}')">
+              <i class="fas fa-trash-alt"></i> Delete
+            </button>
+          </div>
+        </div>
+      `;
+    });
+  }
+
+  remindersContainer.innerHTML = html;
+
+  // Initial update of countdowns
+  updateCountdowns();
+}
+
+function updateCountdowns() {
+  const now = new Date();
+  const reminders = document.querySelectorAll('.reminder-card');
+
+  reminders.forEach(reminderCard => {
+    const reminderId = reminderCard.dataset.id;
+    const countdownElement = document.getElementById(`countdown-${reminderId}`);
+    if (!countdownElement) return;
+
+    const reminder = remindersById[reminderId];
+    if (!reminder) return;
+
+    // Calculate next reminder time from the schedule
+    const reminderTime = nextDose(reminder, now);
+    if (!reminderTime) {
+      countdownElement.classList.remove('urgent');
+      countdownElement.textContent = 'Course finished';
+      return;
+    }
+
+    // Calculate time difference
+    const diffMs = reminderTime - now;
+    const diffHours = Math.floor(diffMs / (1000 * 60 * 60));
+    const diffMinutes = Math.floor((diffMs % (1000 * 60 * 60)) / (1000 * 60));
+    const diffSeconds = Math.floor((diffMs % (1000 * 60)) / 1000);
+
+    // Format countdown text
+    let countdownText = '';
+    if (diffHours > 0) {
+      countdownText += `${diffHours}h `;
+    }
+    countdownText += `${diffMinutes}m ${diffSeconds}s`;
+
+    // Apply urgent styling if less than 30 minutes
+    if (diffHours === 0 && diffMinutes < 30) {
+      countdownElement.classList.add('urgent');
+    } else {
+      countdownElement.classList.remove('urgent');
+    }
+
+    countdownElement.textContent = `Next dose in: ${countdownText}`;
+  });
+}
+
+function checkDueReminders() {
+  const now = new Date();
+  const currentHour = now.getHours();
+  const currentMinute = now.getMinutes();
+
+  fetch('/get-reminders', { headers: { 'X-Timezone': TIMEZONE } })
+    .then(res => res.json())
+    .then(data => {
+      const reminders = data.reminders || [];
+
+      reminders.forEach(reminder => {
+        // Every dose the schedule has today, e.g. 08:00 and 20:00 for twice daily
+        doseTimesOn(reminder, now).forEach(clock => {
+          const [reminderHour, reminderMinute] = clock.split(':').map(Number);
+          const alertKey = `${reminder.id}@${clock}`;
+
+          // Check if it's time for the reminder and not already alerted
+          if (currentHour === reminderHour && currentMinute === reminderMinute && !activeAlerts[alertKey]) {
+              const reminderTimeToday = new Date();
+              reminderTimeToday.setHours(reminderHour, reminderMinute, 0, 0);
+              const diffSeconds = (now - reminderTimeToday) / 1000;
+
+              // Trigger if time just passed (within 15 seconds)
+              if (diffSeconds >= 0 && diffSeconds < 15) {
+                  playReminderAlert(reminder);
+                  reportDose(reminder.id, false);
+                  activeAlerts[alertKey] = true; // Mark as active
+                  // Allow re-alert after 2 minutes
+                  setTimeout(() => {
+                      delete activeAlerts[alertKey];
+                  }, 120000);
+              }
+          }
+        });
+      });
+    })
+    .catch(err => console.error('Error checking reminders:', err));
+}
+
+function playReminderAlert(reminder) {
+  // Stop any previous sound first
+  reminderSound.stop();
+  // Play alert sound (Howler handles looping)
+  reminderSound.play();
+
+  // Create an on-screen alert
+  const alertDiv = document.createElement('div');
+  alertDiv.classList.add('reminder-alert');
+  alertDiv.dataset.reminderId = reminder.id; // Store ID for dismissal
+  alertDiv.innerHTML = `
+    <div class="reminder-alert-content">
+      <div class="reminder-alert-title">
+        <i class="fas fa-bell"></i> Medication Reminder
+      </div>
+      <div class="reminder-alert-body">
+        It's time to take <strong>${reminder.name}</strong>!
+      </div>
+      <div class="reminder-alert-actions">
+        <button onclick="dismissAlert(this.closest('.reminder-alert'))">
+          Dismiss
+        </button>
+        <button class="primary" onclick="takenAlert(this.closest('.reminder-alert'))">
+          Taken
+        </button>
+      </div>
+    </div>
+  `;
+
+  document.body.appendChild(alertDiv);
+
+  // Visual alert using browser notification if supported
+  if ('Notification' in window) {
+    if (Notification.permission === 'granted') {
+      new Notification('Medication Reminder', {
+        body: `It's time to take ${reminder.name}!`,
+        icon: '/static/pill-icon.png',
+        requireInteraction: true
+      });
+    } else if (Notification.permission !== 'denied') {
+      Notification.requestPermission().then(permission => {
+        if (permission === 'granted') {
+          new Notification('Medication Reminder', {
+            body: `It's time to take ${reminder.name}!`,
+            icon: '/static/pill-icon.png',
+            requireInteraction: true
+          });
+        }
+      });
+    }
+  }
+}
+
+function dismissAlert(alertDiv) {
+  if (alertDiv && document.body.contains(alertDiv)) {
+    document.body.removeChild(alertDiv);
+  }
+  reminderSound.stop(); // Stop the looping sound
+  // Optional: Clear the active alert flag if needed immediately
+  // const reminderId = alertDiv?.dataset.reminderId;
+  // if (reminderId) delete activeAlerts[reminderId];
+}
+
+function takenAlert(alertDiv) {
+  const reminderName = alertDiv.querySelector('strong').innerText;
+  reportDose(alertDiv.dataset.reminderId, true);
+  dismissAlert(alertDiv); // Stops sound and hides notification
+
+  // Show confirmation message
+  const confirmDiv = document.createElement('div');
+  confirmDiv.classList.add('reminder-confirmation');
+  confirmDiv.innerHTML = `
+    <div class="reminder-confirmation-content">
+      <i class="fas fa-check-circle"></i>
+      <span>${reminderName} taken - Good job!</span>
+    </div>
+  `;
+
+  document.body.appendChild(confirmDiv);
+
+  // Remove confirmation after 3 seconds
+  setTimeout(() => {
+    if (document.body.contains(confirmDiv)) {
+      document.body.removeChild(confirmDiv);
+    }
+  }, 3000);
+}
+
+function editReminder(reminderId) {
+  fetch('/get-reminders', { headers: { 'X-Timezone': TIMEZONE } })
+    .then(res => res.json())
+    .then(data => {
+      const reminders = data.reminders || [];
+      const reminder = reminders.find(r => r.id === reminderId);
+
+      if (reminder) {
+        currentEditingReminder = reminder;
+
+        // Parse time format
+        let timeValue = reminder.time;
+        const timeParts = reminder.time.split(/[: ]/);
+        if (timeParts.length >= 2) {
+          let hours = parseInt(timeParts[0]);
+          const minutes = parseInt(timeParts[1]);
+          const ampm = timeParts[2]?.toUpperCase();
+
+          // Convert to 24-hour format for input
+          if (ampm === 'PM' && hours < 12) hours += 12;
+          if (ampm === 'AM' && hours === 12) hours = 0;
+
+          // Format for time input
+          timeValue = `${hours.toString().padStart(2, '0')}:${minutes.toString().padStart(2, '0')}`;
+        }
+
+        // Populate form
+        editMedicationName.value = reminder.name;
+        editReminderTime.value = timeValue;
+
+        // Show modal
+        showEditModal();
+      }
+    })
+    .catch(err => console.error('Error fetching reminder details:', err));
+}
+
+function deleteReminder(reminderId) {
+  if (confirm('Are you sure you want to delete this reminder?')) {
+    fetch('/delete-reminder', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ id: reminderId })
+    })
+      .then(res => res.json())
+      .then(data => {
+        if (data.success) {
+          // Reload reminders
+          loadReminders();
+        } else {
+          alert('Failed to delete reminder: ' + data.message);
+        }
+      })
+      .catch(err => {
+        console.error('Error deleting reminder:', err);
+        alert('An error occurred while deleting the reminder.');
+      });
+  }
+}
+
+function showEditModal() {
+  editReminderModal.classList.add('active');
+}
+
+function hideEditModal() {
+  editReminderModal.classList.remove('active');
+  currentEditingReminder = null;
+}
+
+function saveReminderEdit() {
+  if (!currentEditingReminder) return;
+
+  const updatedData = {
+    id: currentEditingReminder.id,
+    name: editMedicationName.value,
+    time: formatTimeForAPI(editReminderTime.value)
+  };
+
+  fetch('/update-reminder', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Timezone': TIMEZONE },
+    body: JSON.stringify(updatedData)
+  })
+    .then(res => res.json())
+    .then(data => {
+      if (data.success) {
+        hideEditModal();
+        loadReminders();
+      } else {
+        alert('Failed to update reminder: ' + data.message);
+      }
+    })
+    .catch(err => {
+      console.error('Error updating reminder:', err);
+      alert('An error occurred while updating the reminder.');
+    });
+}
+
+// Helper functions
+// Dose times ("HH:MM") of a reminder on the given day, following its schedule
+function doseTimesOn(reminder, day) {
+  const date = localDate(day);
+  if (reminder.start && date < reminder.start) return [];
+  if (reminder.until && date > reminder.until) return [];
+  if (reminder.weekdays && !reminder.weekdays.includes((day.getDay() + 6) % 7)) return [];
+  if (reminder.start && reminder.every_days > 1) {
+    const [year, month, dayOfMonth] = reminder.start.split('-').map(Number);
+    const today = new Date(day.getFullYear(), day.getMonth(), day.getDate());
+    const elapsedDays = Math.round((today - new Date(year, month - 1, dayOfMonth)) / 86400000);
+    if (elapsedDays % reminder.every_days !== 0) return [];
+  }
+  if (reminder.every_hours && reminder.start) return intervalDoseTimesOn(reminder, day);
+  return reminder.times || [];
+}
+
+// Dose times of an "every N hours" reminder on the given day, counted from its first dose
+function intervalDoseTimesOn(reminder, day) {
+  const [year, month, dayOfMonth] = reminder.start.split('-').map(Number);
+  const [hours, minutes] = reminder.times[0].split(':').map(Number);
+  const first = new Date(year, month - 1, dayOfMonth, hours, minutes);
+  const step = reminder.every_hours * 3600000;
+  const dayStart = new Date(day.getFullYear(), day.getMonth(), day.getDate());
+  const dayEnd = new Date(day.getFullYear(), day.getMonth(), day.getDate() + 1);
+  const times = [];
+  let dose = new Date(first.getTime() + Math.max(0, Math.ceil((dayStart - first) / step)) * step);
+  while (dose < dayEnd) {
+    times.push(`${String(dose.getHours()).padStart(2, '0')}:${String(dose.getMinutes()).padStart(2, '0')}`);
+    dose = new Date(dose.getTime() + step);
+  }
+  return times;
+}
+
+// Next dose of a reminder after the given moment, or null once its course has ended
+function nextDose(reminder, after) {
+  const day = new Date(after.getFullYear(), after.getMonth(), after.getDate());
+  for (let i = 0; i <= 7 * (reminder.every_days || 1); i++) {
+    for (const clock of doseTimesOn(reminder, day)) {
+      const [hours, minutes] = clock.split(':').map(Number);
+      const due = new Date(day);
+      due.setHours(hours, minutes, 0, 0);
+      if (due > after) return due;
+    }
+    day.setDate(day.getDate() + 1);
+  }
+  return null;
+}
+
+function localDate(day) {
+  return `${day.getFullYear()}-${String(day.getMonth() + 1).padStart(2, '0')}-${String(day.getDate()).padStart(2, '0')}`;
+}
+
+// Tell the server a dose went off (or was taken) so its next due time moves on
+function reportDose(reminderId, taken) {
+  fetch('/reminder-fired', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Timezone': TIMEZONE },
+    body: JSON.stringify({ id: reminderId, taken: taken })
+  })
+    .catch(err => console.error('Error reporting dose:', err));
+}
+
+function formatTime(timeString) {
+  // Handle various time formats and standardize display
+  const timeParts = timeString.split(/[: ]/);
+  if (timeParts.length < 2) return timeString;
+
+  let hours = parseInt(timeParts[0]);
+  const minutes = parseInt(timeParts[1]);
+  let ampm = timeParts[2]?.toUpperCase() || '';
+
+  // Add AM/PM if not present
+  if (!ampm) {
+    ampm = hours >= 12 ? 'PM' : 'AM';
+    if (hours > 12) hours -= 12;
+    if (hours === 0) hours = 12;
+  }
+
+  return `${hours}:${minutes.toString().padStart(2, '0')} ${ampm}`;
+}
+
+function formatTimeForAPI(timeString) {
+  // Convert time input value to API format (with AM/PM)
+  const [hours, minutes] = timeString.split(':');
+  let h = parseInt(hours);
+  const ampm = h >= 12 ? 'PM' : 'AM';
+
+  if (h > 12) h -= 12;
+  if (h === 0) h = 12;
+
+  return `${h}:${minutes} ${ampm}`;
+}
+
+function capitalizeFirstLetter(string) {
+  return string.charAt(0).toUpperCase() + string.slice(1);
+}
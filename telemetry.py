@@ -0,0 +1,289 @@
+"""
+Telemetry module for MedAssist.
+
+This module provides lightweight request tracing and Prometheus metrics:
+spans for routes, MongoDB commands, outbound HTTP calls and Gemini calls,
+latency histograms, cache hit counters and pool saturation gauges.
+"""
+
+import os
+import json
+import time
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry
+    from prometheus_client import multiprocess
+    METRICS_ENABLED = True
+except ImportError:
+    print("Warning: prometheus_client not installed. Metrics will be disabled.")
+    METRICS_ENABLED = False
+
+# Finished requests slower than this (in seconds) have their trace printed; empty disables it
+TRACE_LOG_THRESHOLD = os.environ.get("TRACE_LOG_THRESHOLD", "")
+
+# Upper bound on child spans kept per trace
+MAX_CHILD_SPANS = 200
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30)
+
+if METRICS_ENABLED:
+    REQUEST_LATENCY = Histogram(
+        "medassist_request_latency_seconds", "Latency of HTTP requests by route and chat intent",
+        ["route", "method", "intent", "status"], buckets=LATENCY_BUCKETS
+    )
+    UPSTREAM_LATENCY = Histogram(
+        "medassist_upstream_latency_seconds", "Latency of calls to upstream providers",
+        ["provider", "outcome"], buckets=LATENCY_BUCKETS
+    )
+    MONGO_LATENCY = Histogram(
+        "medassist_mongo_command_latency_seconds", "Latency of MongoDB commands",
+        ["command", "outcome"], buckets=LATENCY_BUCKETS
+    )
+    CACHE_REQUESTS = Counter(
+        "medassist_cache_requests_total", "Cache lookups by cache and result",
+        ["cache", "result"]
+    )
+    POOL_IN_USE = Gauge(
+        "medassist_pool_in_use", "Connections or workers currently checked out of a pool",
+        ["pool"], multiprocess_mode="livesum"
+    )
+    SINGLEFLIGHT_CALLS = Counter(
+        "medassist_singleflight_calls_total", "Coalesced lookups by role (followers are upstream calls saved)",
+        ["namespace", "role"]
+    )
+    UPSTREAM_CALLS_SAVED = Counter(
+        "medassist_upstream_calls_saved_total", "Upstream lookups avoided by single-flight coalescing",
+        ["namespace"]
+    )
+    ADMISSION_DECISIONS = Counter(
+        "medassist_admission_decisions_total", "Admission checks by tier and outcome (admitted, rate_limited, overloaded)",
+        ["tier", "outcome"]
+    )
+    GEMINI_QUEUE_DEPTH = Gauge(
+        "medassist_gemini_queue_depth", "Gemini calls waiting for a slot, by priority",
+        ["priority"], multiprocess_mode="livesum"
+    )
+    GEMINI_QUEUE_WAIT = Histogram(
+        "medassist_gemini_queue_wait_seconds", "Time Gemini calls spent waiting for a slot, by priority",
+        ["priority"], buckets=LATENCY_BUCKETS
+    )
+    GEMINI_CALLS = Counter(
+        "medassist_gemini_calls_total", "Gemini call outcomes by priority (ok, retried, rate_limited, transient, error, shed)",
+        ["priority", "outcome"]
+    )
+    PASSWORD_HASH_WAIT = Histogram(
+        "medassist_password_hash_queue_wait_seconds", "Time password hashing jobs waited for a process, by operation",
+        ["operation"], buckets=LATENCY_BUCKETS
+    )
+    POOL_SIZE = Gauge(
+        "medassist_pool_size", "Maximum size of a pool",
+        ["pool"], multiprocess_mode="livesum"
+    )
+
+class Span:
+    """A timed unit of work within a trace"""
+    __slots__ = ("name", "kind", "attrs", "start", "duration", "status", "children")
+
+    def __init__(self, name, kind, attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.children = []
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "attrs": self.attrs,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "status": self.status,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+_current_span = ContextVar("medassist_span", default=None)
+
+def _attach(span):
+    """Attach a finished span to the span that was active when it started"""
+    parent = _current_span.get()
+    if parent is not None and len(parent.children) < MAX_CHILD_SPANS:
+        parent.children.append(span)
+
+def start_request_span(name, **attrs):
+    """Start the root span of a request; returns a token for finish_request_span"""
+    span = Span(name, "route", attrs)
+    return span, _current_span.set(span)
+
+def finish_request_span(handle, route, method, status):
+    """Finish a request's root span and record its latency"""
+    span, token = handle
+    span.duration = time.perf_counter() - span.start
+    span.status = "error" if status >= 500 else "ok"
+    _current_span.reset(token)
+    if METRICS_ENABLED:
+        REQUEST_LATENCY.labels(route, method, span.attrs.get("intent", ""), str(status)).observe(span.duration)
+    if TRACE_LOG_THRESHOLD and span.duration >= float(TRACE_LOG_THRESHOLD):
+        print(f"Slow request trace: {json.dumps(span.to_dict(), default=str)}")
+
+def tag(**attrs):
+    """Add attributes (such as the chat intent) to the current request's root span"""
+    span = _current_span.get()
+    if span is not None:
+        span.attrs.update(attrs)
+
+def current_span():
+    """The span active in this context, if any"""
+    return _current_span.get()
+
+@contextmanager
+def span(name, kind="internal", **attrs):
+    """Trace a block of work; upstream spans also feed the upstream latency histogram"""
+    current = Span(name, kind, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        _attach(current)
+        if METRICS_ENABLED and kind == "upstream":
+            UPSTREAM_LATENCY.labels(name, current.status).observe(current.duration)
+
+def record_cache(cache, hit):
+    """Count a cache lookup"""
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_singleflight(namespace, role):
+    """Count a coalesced lookup; every follower is one upstream call saved"""
+    if METRICS_ENABLED:
+        SINGLEFLIGHT_CALLS.labels(namespace, role).inc()
+        if role != "leader":
+            UPSTREAM_CALLS_SAVED.labels(namespace).inc()
+
+def record_admission(tier, outcome):
+    """Count an admission decision"""
+    if METRICS_ENABLED:
+        ADMISSION_DECISIONS.labels(tier, outcome).inc()
+
+def record_gemini_queue(priority, delta):
+    """Track calls entering (+1) and leaving (-1) the Gemini queue"""
+    if METRICS_ENABLED:
+        GEMINI_QUEUE_DEPTH.labels(priority).inc(delta)
+
+def observe_gemini_wait(priority, seconds):
+    if METRICS_ENABLED:
+        GEMINI_QUEUE_WAIT.labels(priority).observe(seconds)
+
+def record_gemini_call(priority, outcome):
+    if METRICS_ENABLED:
+        GEMINI_CALLS.labels(priority, outcome).inc()
+
+def observe_password_hash_wait(operation, seconds):
+    if METRICS_ENABLED:
+        PASSWORD_HASH_WAIT.labels(operation).observe(seconds)
+
+def set_pool_size(pool, size):
+    """Publish the capacity of a pool"""
+    if METRICS_ENABLED:
+        POOL_SIZE.labels(pool).set(size)
+
+@contextmanager
+def pool_slot(pool):
+    """Mark one slot of a pool as busy for the duration of the block"""
+    if METRICS_ENABLED:
+        POOL_IN_USE.labels(pool).inc()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            POOL_IN_USE.labels(pool).dec()
+
+def generate_metrics():
+    """Render all metrics in the Prometheus text format; returns (body, content_type)"""
+    if not METRICS_ENABLED:
+        return "# prometheus_client is not installed\n", "text/plain"
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Aggregate the samples written by every gunicorn worker
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+def _build_mongo_listeners():
+    """Define the pymongo listener classes (pymongo is imported only once a client is created)"""
+    from pymongo import monitoring
+
+    class MongoCommandListener(monitoring.CommandListener):
+        """Record a span and a latency sample for every MongoDB command"""
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            self._record(event, "ok")
+
+        def failed(self, event):
+            self._record(event, "error")
+
+        def _record(self, event, outcome):
+            duration = event.duration_micros / 1e6
+            if METRICS_ENABLED:
+                MONGO_LATENCY.labels(event.command_name, outcome).observe(duration)
+            # Listeners run on the thread that issued the command, so the span context applies
+            child = Span(f"mongo.{event.command_name}", "mongo", {"database": event.database_name})
+            child.duration = duration
+            child.status = outcome
+            _attach(child)
+
+    class MongoPoolListener(monitoring.ConnectionPoolListener):
+        """Track how many MongoDB connections are checked out"""
+
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            pass
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            pass
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            pass
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            pass
+
+        def connection_checked_out(self, event):
+            if METRICS_ENABLED:
+                POOL_IN_USE.labels("mongo").inc()
+
+        def connection_checked_in(self, event):
+            if METRICS_ENABLED:
+                POOL_IN_USE.labels("mongo").dec()
+
+    return [MongoCommandListener(), MongoPoolListener()]
+
+def mongo_event_listeners():
+    """Listeners to pass to pymongo.MongoClient(event_listeners=...)"""
+    return _build_mongo_listeners()
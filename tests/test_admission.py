@@ -0,0 +1,52 @@
+"""Tests for admission control (admission.py)"""
+
+import pytest
+
+import admission
+from local_db import LocalDatabase
+
+@pytest.fixture(autouse=True)
+def admission_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(admission, "_db", LocalDatabase(str(tmp_path / "admission.sqlite3"), schema=admission._db.schema))
+    monkeypatch.setattr(admission, "MAX_EXPENSIVE_IN_FLIGHT", 2)
+
+def test_default_in_flight_limit_follows_upstream_capacity():
+    assert admission._upstream_slots >= admission.gemini_client.GEMINI_MAX_CONCURRENCY
+
+def test_expensive_requests_are_shed_when_every_slot_is_taken():
+    first, second = admission.check("a", "drug_info"), admission.check("b", "disease_info")
+    assert first.allowed and second.allowed
+    shed = admission.check("c", "drug_info")
+    assert not shed.allowed and shed.reason == "overloaded"
+    admission.release(first)
+    assert admission.check("c", "drug_info").allowed
+
+def test_cheap_requests_and_cached_lookups_are_never_shed():
+    held = [admission.check(user, "drug_info") for user in ("a", "b")]
+    assert all(decision.allowed for decision in held)
+    assert admission.check("c", "set_reminder").allowed
+    assert admission.check("c", "cached_lookup").allowed
+    assert admission.check("c", "cached_lookup").slot is None
+
+def test_shedding_does_not_cost_tokens(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_EXPENSIVE_IN_FLIGHT", 0)
+    for _ in range(int(admission.EXPENSIVE_BURST) * 2):
+        assert admission.check("a", "drug_info").reason == "overloaded"
+    monkeypatch.setattr(admission, "MAX_EXPENSIVE_IN_FLIGHT", 100)
+    assert admission.check("a", "drug_info").allowed
+
+def test_users_run_out_of_expensive_tokens_but_keep_cheap_ones(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_EXPENSIVE_IN_FLIGHT", 100)
+    decisions = [admission.check("a", "drug_info") for _ in range(int(admission.EXPENSIVE_BURST) + 1)]
+    assert [decision.allowed for decision in decisions].count(False) == 1
+    assert decisions[-1].reason == "rate_limited" and decisions[-1].retry_after > 0
+    assert decisions[-1].slot is None
+    assert admission.check("a", "set_reminder").allowed
+
+def test_upstream_work_in_cheap_requests_needs_a_slot():
+    held = admission.check_upstream()
+    assert held.allowed and held.slot
+    other = admission.check("a", "drug_info")
+    assert not admission.check_upstream().allowed
+    admission.release(other)
+    assert admission.check_upstream().allowed
@@ -0,0 +1,28 @@
+"""Tests for the shared HTTP session of the fallback providers (api_fallbacks.py)"""
+
+import threading
+
+import api_fallbacks
+
+def test_concurrent_first_use_creates_a_single_session(monkeypatch):
+    import requests
+    created = []
+    class SlowSession(requests.Session):
+        def __init__(self):
+            created.append(self)
+            threading.Event().wait(0.05)
+            super().__init__()
+    monkeypatch.setattr(requests, "Session", SlowSession)
+    monkeypatch.setattr(api_fallbacks, "_http", None)
+    start = threading.Barrier(8)
+    sessions = []
+    def first_use():
+        start.wait()
+        sessions.append(api_fallbacks.FallbackAPI._http_session())
+    threads = [threading.Thread(target=first_use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(session is created[0] for session in sessions)
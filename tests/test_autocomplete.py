@@ -0,0 +1,28 @@
+"""Tests for medication name autocomplete (autocomplete.py)"""
+
+import autocomplete
+
+def test_shipped_seed_vocabulary_loads():
+    names = autocomplete.read_vocabulary()
+    assert len(names) > 500
+    assert not any(name.startswith("#") for name in names)
+
+def test_every_word_starts_a_key_and_the_most_used_name_comes_first():
+    index = autocomplete.PrefixIndex(["Metformin", "Insulin Glargine", "Methotrexate", "metformin"])
+    assert len(index) == 3
+    assert index.suggest("met") == ["Metformin", "Methotrexate"]
+    assert index.suggest("gla") == ["Insulin Glargine"]
+    assert index.suggest("insulin gl") == ["Insulin Glargine"]
+    assert index.suggest("") == []
+
+def test_long_prefixes_rank_their_slice_on_the_fly():
+    names = [f"Drug{n:04d}" for n in range(50)]
+    index = autocomplete.PrefixIndex(names)
+    assert index.suggest("drug00", limit=3) == ["Drug0000", "Drug0001", "Drug0002"]
+
+def test_build_puts_openfda_names_first_and_keeps_the_seed(tmp_path, monkeypatch):
+    path = tmp_path / "drug_names.txt"
+    path.write_text("# seed\nAspirin\nZolpidem\n", encoding="utf-8")
+    monkeypatch.setattr(autocomplete, "fetch_openfda_names", lambda: [("Ibuprofen", 900), ("Aspirin", 400)])
+    assert autocomplete.build(str(path)) == (2, 1)
+    assert autocomplete.read_vocabulary(str(path)) == ["Ibuprofen", "Aspirin", "Zolpidem"]
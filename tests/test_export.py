@@ -0,0 +1,122 @@
+"""Tests for chat history exports (export.py)"""
+
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("bson")
+from bson import ObjectId
+
+import export
+import retention
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction == -1)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+class FakeCollection:
+    """The few find() filters export.py uses: equality, $in, $gt and $lte"""
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def _matches(self, doc, query):
+        for key, condition in query.items():
+            value = doc.get(key)
+            if not isinstance(condition, dict):
+                if value != condition:
+                    return False
+                continue
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$lte" in condition and not value <= condition["$lte"]:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        hidden = {key for key, shown in (projection or {}).items() if not shown}
+        return FakeCursor([{k: v for k, v in doc.items() if k not in hidden}
+                           for doc in self.docs if self._matches(doc, query)])
+
+    def find_one(self, query, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(*sort[0])
+        return next(iter(cursor), None)
+
+def message(user_id, n, when):
+    return {"_id": ObjectId.from_datetime(when + timedelta(seconds=n)), "user_id": user_id, "role": "user",
+            "intent": "chat", "content": f"message {n}", "timestamp": when + timedelta(seconds=n)}
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "CHAT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    monkeypatch.setattr(export, "EXPORT_CURSOR_EVERY", 4)
+    old = datetime(2024, 1, 31, 9)
+    archived = [message("alice", n, old) for n in range(5)] + [message("bob", 5, old)]
+    # An interrupted archival run wrote the first batch twice
+    retention._write_batch(old.date(), archived[:2])
+    retention._write_batch(old.date(), archived)
+    recent = datetime(2024, 9, 1, 9)
+    active = [message("alice", n, recent) for n in range(6)] + [message("bob", 6, recent)]
+    # One archived message was restored and is back in chat_history
+    active.append(archived[4])
+    collection = FakeCollection(active)
+    monkeypatch.setattr(export, "chat_history_collection", collection)
+    monkeypatch.setattr(export, "medications_collection", FakeCollection())
+    monkeypatch.setattr(export.response_store, "resolve", lambda messages: messages)
+    return archived, active
+
+def contents(user_id, position):
+    return [item["content"] for item, _ in export.iter_messages(position, "secret")]
+
+def test_export_includes_archived_messages_once_and_oldest_first(history):
+    position = export.start("alice", "secret")
+    assert contents("alice", position) == [f"message {n}" for n in range(4)] + ["message 4"] + [f"message {n}" for n in range(6)]
+
+def test_resuming_from_every_cursor_continues_where_it_stopped(history):
+    full = contents("alice", export.start("alice", "secret"))
+    position = export.start("alice", "secret")
+    seen = []
+    for item, token in export.iter_messages(position, "secret"):
+        seen.append(item["content"])
+        if token:
+            resumed = export.start("alice", "secret", token)
+            assert seen + contents("alice", resumed) == full
+
+def test_export_covers_only_messages_that_existed_when_it_started(history):
+    _, active = history
+    position = export.start("alice", "secret")
+    active_count = len(contents("alice", position))
+    export.chat_history_collection.docs.append(message("alice", 99, datetime(2024, 9, 2)))
+    assert len(contents("alice", position)) == active_count
+
+def test_cursor_tokens_are_signed_and_bound_to_their_user(history):
+    tokens = [token for _, token in export.iter_messages(export.start("alice", "secret"), "secret") if token]
+    assert tokens
+    with pytest.raises(export.InvalidCursor):
+        export.start("bob", "secret", tokens[0])
+    with pytest.raises(export.InvalidCursor):
+        export.start("alice", "other secret", tokens[0])
+    with pytest.raises(export.InvalidCursor):
+        export.start("alice", "secret", tokens[0][:-2] + "xx")
+
+def test_ndjson_export_streams_messages_cursors_and_an_end_marker(history):
+    lines = [json.loads(line) for line in export.generate("ndjson", "alice", export.start("alice", "secret"), "secret")]
+    assert [line["type"] for line in lines].count("message") == 11
+    assert any(line["type"] == "cursor" for line in lines)
+    assert lines[-1] == {"type": "end"}
@@ -0,0 +1,104 @@
+"""Tests for the Gemini call pool and quota governor (gemini_client.py)"""
+
+import time
+import threading
+
+import pytest
+
+import deadlines
+import gemini_client
+
+@pytest.fixture(autouse=True)
+def governor(tmp_path, monkeypatch):
+    quota = gemini_client.QuotaGovernor(path=str(tmp_path / "quota.sqlite3"), rpm=60, tpm=100000)
+    monkeypatch.setattr(gemini_client, "governor", quota)
+    yield quota
+    deadlines.clear()
+
+def levels(quota):
+    rows = quota.db.connection().execute("SELECT name, level FROM quota WHERE name != 'cooldown'").fetchall()
+    return dict(rows)
+
+def wait_for_waiters(slots, count):
+    for _ in range(200):
+        if len(slots._waiters) == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError("waiters never queued")
+
+def test_slots_are_handed_out_by_priority():
+    slots = gemini_client._PrioritySlots(1, aging=1000)
+    assert slots.acquire(gemini_client.INTERACTIVE, 1)
+    order = []
+    def wait(level):
+        assert slots.acquire(level, 5)
+        order.append(level)
+        slots.release()
+    batch = threading.Thread(target=wait, args=(gemini_client.BATCH,))
+    batch.start()
+    wait_for_waiters(slots, 1)
+    interactive = threading.Thread(target=wait, args=(gemini_client.INTERACTIVE,))
+    interactive.start()
+    wait_for_waiters(slots, 2)
+    slots.release()
+    batch.join(); interactive.join()
+    assert order == [gemini_client.INTERACTIVE, gemini_client.BATCH]
+
+def test_long_waiting_batch_work_ages_past_new_interactive_calls():
+    slots = gemini_client._PrioritySlots(1, aging=0.05)
+    assert slots.acquire(gemini_client.INTERACTIVE, 1)
+    order = []
+    def wait(level):
+        assert slots.acquire(level, 5)
+        order.append(level)
+        slots.release()
+    batch = threading.Thread(target=wait, args=(gemini_client.BATCH,))
+    batch.start()
+    wait_for_waiters(slots, 1)
+    time.sleep(0.2)
+    interactive = threading.Thread(target=wait, args=(gemini_client.INTERACTIVE,))
+    interactive.start()
+    wait_for_waiters(slots, 2)
+    slots.release()
+    batch.join(); interactive.join()
+    assert order == [gemini_client.BATCH, gemini_client.INTERACTIVE]
+
+def test_timed_out_waiters_leave_the_queue():
+    slots = gemini_client._PrioritySlots(1)
+    assert slots.acquire(gemini_client.INTERACTIVE, 1)
+    assert not slots.acquire(gemini_client.BATCH, 0.05)
+    assert slots._waiters == []
+    slots.release()
+    assert slots.in_use == 0
+
+def test_shed_calls_give_their_quota_back(tmp_path, monkeypatch):
+    # Slow refill, so the buckets barely move while the call waits
+    quota = gemini_client.QuotaGovernor(path=str(tmp_path / "slow.sqlite3"), rpm=6, tpm=60000)
+    monkeypatch.setattr(gemini_client, "governor", quota)
+    monkeypatch.setattr(gemini_client, "_slots", gemini_client._PrioritySlots(0))
+    quota.reserve_call(0, gemini_client.INTERACTIVE)
+    before = levels(quota)
+    deadlines.start(0.2)
+    with pytest.raises(gemini_client.DeadlineExceeded):
+        gemini_client.generate("what is ibuprofen?")
+    after = levels(quota)
+    assert after["requests"] == pytest.approx(before["requests"], abs=0.1)
+    assert after["tokens"] == pytest.approx(before["tokens"], abs=0.5 * 60000 / 60)
+
+def test_retries_share_one_quota_reservation(governor, monkeypatch):
+    calls = []
+    class Model:
+        def generate_content(self, prompt, request_options):
+            calls.append(prompt)
+            if len(calls) == 1:
+                raise RuntimeError("503 unavailable")
+            return "answer"
+    monkeypatch.setattr(gemini_client.resources, "gemini_model", lambda: Model())
+    monkeypatch.setattr(gemini_client, "_classify", lambda error: "transient")
+    monkeypatch.setattr(gemini_client, "GEMINI_BACKOFF_BASE", 0.001)
+    reservations = []
+    reserve_call = governor.reserve_call
+    monkeypatch.setattr(governor, "reserve_call", lambda tokens, level: reservations.append(tokens) or reserve_call(tokens, level))
+    assert gemini_client.generate("what is ibuprofen?") == "answer"
+    assert len(calls) == 2
+    assert len(reservations) == 1
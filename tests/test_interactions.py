@@ -0,0 +1,62 @@
+"""Tests for drug-drug interaction checks (interactions.py)"""
+
+import itertools
+import random
+
+import pytest
+
+import interactions
+
+DATASET = {
+    "aliases": {"Advil": ["ibuprofen"], "Tylenol": ["acetaminophen"], "Percocet": ["oxycodone", "acetaminophen"]},
+    "classes": {"nsaid": ["ibuprofen", "naproxen"], "opioid": ["oxycodone", "morphine"]},
+    "interactions": [
+        {"drugs": ["warfarin", "nsaid"], "severity": "major", "description": "bleeding"},
+        {"drugs": ["nsaid", "nsaid"], "severity": "moderate", "description": "two nsaids"},
+        {"drugs": ["opioid", "alprazolam"], "severity": "major", "description": "breathing"},
+        {"drugs": ["ibuprofen", "warfarin"], "severity": "moderate", "description": "weaker duplicate entry"},
+    ],
+}
+
+@pytest.fixture
+def index():
+    return interactions.InteractionIndex(DATASET)
+
+def test_brand_names_combinations_and_strengths_resolve_to_ingredients(index):
+    assert index.ingredients("Percocet") == ["oxycodone", "acetaminophen"]
+    assert index.ingredients("Hydrocodone and Tylenol") == ["hydrocodone", "acetaminophen"]
+    assert index.ingredients("Ibuprofen 400 mg tablets") == ["ibuprofen"]
+    assert index.ingredients("Unknownium") == ["unknownium"]
+
+def test_a_class_paired_with_itself_covers_two_different_members(index):
+    assert [w["description"] for w in index.check("Naproxen", ["Advil"])] == ["two nsaids"]
+    assert index.check("Advil", ["Ibuprofen"])[0]["type"] == "duplicate"
+
+def test_the_most_severe_entry_for_a_pair_wins_and_major_comes_first(index):
+    warnings = index.check("Warfarin", ["Naproxen", "Advil", "Percocet"])
+    assert [(w["medications"][1], w["severity"]) for w in warnings] == [("Advil", "major"), ("Naproxen", "major")]
+
+def test_shared_ingredients_are_reported_as_duplicates(index):
+    (warning,) = index.check("Tylenol", ["Percocet"])
+    assert warning["type"] == "duplicate" and warning["ingredients"] == ["acetaminophen", "acetaminophen"]
+
+def test_unknown_names_give_no_warnings(index):
+    assert index.check("Unknownium", ["Warfarin", "Advil"]) == []
+
+def test_an_audit_finds_the_same_warnings_as_checking_every_pair(index):
+    names = ["Warfarin", "Advil", "Naproxen", "Percocet", "Tylenol", "Alprazolam", "Morphine", "Metformin"]
+    rng = random.Random(7)
+    for _ in range(20):
+        sample = rng.sample(names, rng.randint(2, len(names)))
+        expected = set()
+        for a, b in itertools.combinations(sample, 2):
+            expected.update((frozenset(w["medications"]), w["description"]) for w in index.check(a, [b]))
+        assert {(frozenset(w["medications"]), w["description"]) for w in index.audit(sample)} == expected
+
+def test_the_shipped_dataset_loads_and_describes_warnings():
+    warnings = interactions.check("Warfarin", ["Advil"])
+    assert warnings and warnings[0]["severity"] == "major"
+    text = interactions.describe(warnings * 7)
+    assert text.startswith("#### ⚠️ Possible Interactions")
+    assert "...and 2 more" in text
+    assert interactions.describe([]) == ""
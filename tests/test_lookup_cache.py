@@ -0,0 +1,82 @@
+"""Tests for the tiered lookup cache (lookup_cache.py)"""
+
+import time
+
+import pytest
+
+import lookup_cache
+
+class FakePersistent:
+    """Stands in for the MongoDB tier: {key: (value, expires_at timestamp)}"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return entry if entry and entry[1] > time.time() else None
+
+    def set(self, key, value, ttl):
+        self.entries[key] = (value, time.time() + ttl)
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+@pytest.fixture
+def tiers(tmp_path):
+    return lookup_cache.SharedCache(str(tmp_path / "shared.sqlite3"), max_entries=50), FakePersistent()
+
+def worker(tiers, **kwargs):
+    shared, persistent = tiers
+    return lookup_cache.LookupCache("drug_info", shared=shared, persistent=persistent, **kwargs)
+
+def test_a_value_set_by_one_worker_is_read_by_another_from_the_shared_file(tiers):
+    worker(tiers).set("Ibuprofen", "ibuprofen info")
+    other = worker(tiers)
+    assert other.get("  ibuprofen ") == "ibuprofen info"
+    assert "drug_info:ibuprofen" in other._local
+
+def test_a_persistent_entry_refills_the_faster_tiers(tiers):
+    shared, persistent = tiers
+    persistent.set("drug_info:ibuprofen", "ibuprofen info", 3600)
+    assert worker(tiers).get("ibuprofen") == "ibuprofen info"
+    assert shared.get("drug_info:ibuprofen") == "ibuprofen info"
+
+def test_local_entries_are_bounded_least_recently_used_first(tiers):
+    cache = worker(tiers, local_size=2)
+    for name in ("a", "b"):
+        cache.set(name, name)
+    cache.get("a")
+    cache.set("c", "c")
+    assert list(cache._local) == ["drug_info:a", "drug_info:c"]
+
+def test_expired_entries_are_misses_in_every_tier(tiers):
+    shared, persistent = tiers
+    cache = worker(tiers, ttl=-1, persistent_ttl=-1)
+    cache.set("ibuprofen", "stale")
+    assert cache.get("ibuprofen") is None
+    assert shared.get("drug_info:ibuprofen") is None
+
+def test_deleting_clears_every_tier(tiers):
+    cache = worker(tiers)
+    cache.set("ibuprofen", "ibuprofen info")
+    cache.delete("ibuprofen")
+    assert worker(tiers).get("ibuprofen") is None
+    assert cache.get("ibuprofen") is None
+
+def test_the_shared_file_evicts_least_recently_used_entries_beyond_its_bound(tmp_path):
+    shared = lookup_cache.SharedCache(str(tmp_path / "shared.sqlite3"), max_entries=3)
+    for n in range(5):
+        shared.set(f"key{n}", n, 3600)
+        # Distinct access times
+        shared._connection().execute("UPDATE entries SET last_access = ? WHERE key = ?", (n, f"key{n}"))
+    shared.evict()
+    assert [shared.get(f"key{n}") for n in range(5)] == [None, None, 2, 3, 4]
+
+def test_a_broken_shared_entry_is_a_miss_not_an_error(tiers):
+    shared, _ = tiers
+    shared._connection().execute(
+        "INSERT INTO entries (key, value, expires_at, last_access) VALUES ('drug_info:x', 'not json', ?, ?)",
+        (time.time() + 60, time.time())
+    )
+    assert worker(tiers).get("x") is None
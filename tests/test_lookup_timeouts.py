@@ -0,0 +1,24 @@
+"""Tests for lookups that run out of the request's latency budget (app.py)"""
+
+import pytest
+
+pytest.importorskip("pymongo")
+import app as medassist
+from deadlines import DeadlineExceeded
+
+@pytest.fixture
+def slow_gemini(monkeypatch):
+    def generate(prompt):
+        raise DeadlineExceeded("latency budget exhausted")
+    monkeypatch.setattr(medassist, "GEMINI_ENABLED", True)
+    monkeypatch.setattr(medassist, "generate_with_gemini", generate)
+
+def test_a_slow_gemini_answer_asks_to_try_again_instead_of_reporting_no_information(slow_gemini):
+    reply = medassist.use_gemini_for_basic_info("zolpidem")
+    assert "took too long" in reply
+    assert "No information found" not in reply
+
+def test_a_slow_lookup_is_not_stored_with_a_reminder(slow_gemini, monkeypatch):
+    monkeypatch.setattr(medassist, "fetch_drug_info", lambda name: medassist.use_gemini_for_basic_info(name))
+    monkeypatch.setattr(medassist.drug_info_cache, "get", lambda name: None)
+    assert medassist.fetch_reminder_drug_info("zolpidem", admitted=True) is None
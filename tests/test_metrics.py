@@ -0,0 +1,21 @@
+"""Tests for access to the Prometheus endpoint (app.py /metrics)"""
+
+import pytest
+
+pytest.importorskip("pymongo")
+import app as medassist
+
+@pytest.fixture
+def client():
+    return medassist.app.test_client()
+
+def test_metrics_are_not_served_without_a_configured_token(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+def test_metrics_require_the_configured_token(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scraper-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scraper-secret"}).status_code == 200
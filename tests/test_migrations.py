@@ -0,0 +1,136 @@
+"""Tests for the resumable migration runner (migrations.py)"""
+
+import copy
+import threading
+
+import pytest
+
+import migrations
+
+def _walk(doc, path):
+    *parents, last = path.split(".")
+    for key in parents:
+        doc = doc[int(key)] if isinstance(doc, list) else doc.setdefault(key, {})
+    return doc, int(last) if isinstance(doc, list) else last
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc[key])
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+class FakeCollection:
+    """find() on _id ranges plus equality, and update_one() with dotted $set/$inc paths"""
+
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.lock = threading.Lock()
+
+    def _matches(self, doc, query):
+        for key, condition in query.items():
+            value = doc.get(key)
+            if not isinstance(condition, dict):
+                if value != condition:
+                    return False
+                continue
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+            if "$gte" in condition and not value >= condition["$gte"]:
+                return False
+            if "$lt" in condition and not value < condition["$lt"]:
+                return False
+        return True
+
+    def find(self, query, projection=None):
+        with self.lock:
+            return FakeCursor([dict(doc) for doc in self.docs.values() if self._matches(doc, query)])
+
+    def find_one(self, query, projection=None):
+        with self.lock:
+            doc = self.docs.get(query["_id"])
+            return copy.deepcopy(doc)
+
+    def update_one(self, query, update, upsert=False):
+        with self.lock:
+            doc = self.docs.get(query["_id"])
+            if doc is None:
+                if not upsert:
+                    return
+                doc = self.docs[query["_id"]] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+            for path, value in update.get("$set", {}).items():
+                parent, key = _walk(doc, path)
+                parent[key] = copy.deepcopy(value)
+            for path, value in update.get("$inc", {}).items():
+                parent, key = _walk(doc, path)
+                parent[key] = parent.get(key, 0) + value if isinstance(parent, dict) else parent[key] + value
+
+@pytest.fixture
+def db(monkeypatch):
+    collections = {"medications": FakeCollection({"_id": n, "fixed": False} for n in range(1, 26))}
+    monkeypatch.setattr(migrations.resources, "collection", lambda name: collections[name])
+    monkeypatch.setattr(migrations, "migrations_collection", FakeCollection())
+    monkeypatch.setattr(migrations, "MIGRATION_BATCH_SIZE", 4)
+    return collections
+
+def fix_step(applied, fail_after=None):
+    def apply(docs, dry_run):
+        if fail_after is not None and len(applied) >= fail_after:
+            raise RuntimeError("interrupted")
+        applied.extend(doc["_id"] for doc in docs)
+        if not dry_run:
+            for doc in docs:
+                migrations.resources.collection("medications").docs[doc["_id"]]["fixed"] = True
+        return len(docs)
+    return migrations.Step("fix", "medications", {"fixed": False}, apply=apply)
+
+def test_a_batch_step_changes_every_document_once_and_is_then_done(db):
+    applied = []
+    migration = migrations.Migration("0099_test", "test", [fix_step(applied)])
+    assert migrations.run_step(migration, migration.steps[0], partitions=1) == 25
+    assert sorted(applied) == list(range(1, 26))
+    assert migrations.run_step(migration, migration.steps[0], partitions=1) == 0
+    assert len(applied) == 25
+
+def test_an_interrupted_step_resumes_after_its_last_checkpoint(db):
+    applied = []
+    migration = migrations.Migration("0099_test", "test", [fix_step(applied, fail_after=8)])
+    with pytest.raises(RuntimeError):
+        migrations.run_step(migration, migration.steps[0], partitions=1)
+    assert applied == list(range(1, 9))
+    # Resume with the query still matching everything, so only the checkpoint prevents repeats
+    step = fix_step(applied)
+    step.query = {}
+    migration.steps = [step]
+    assert migrations.run_step(migration, step, partitions=1) == 17
+    assert applied == list(range(1, 26))
+
+def test_partitions_cover_every_document_exactly_once(db, monkeypatch):
+    monkeypatch.setattr(migrations, "_partition_bounds", lambda step, partitions: [None, 7, 15, 22])
+    applied = []
+    migration = migrations.Migration("0099_test", "test", [fix_step(applied)])
+    assert migrations.run_step(migration, migration.steps[0], workers=4) == 25
+    assert sorted(applied) == list(range(1, 26))
+    state = migrations.migrations_collection.find_one({"_id": "0099_test"})["steps"]["fix"]
+    assert state["done"] and all(partition["done"] for partition in state["partitions"])
+    assert sum(partition["changed"] for partition in state["partitions"]) == 25
+
+def test_a_dry_run_writes_nothing(db):
+    applied = []
+    migration = migrations.Migration("0099_test", "test", [fix_step(applied)])
+    assert migrations.run_step(migration, migration.steps[0], dry_run=True, partitions=1) == 25
+    assert migrations.migrations_collection.docs == {}
+    assert not any(doc["fixed"] for doc in db["medications"].docs.values())
+
+def test_range_filters_resume_after_the_checkpoint_and_stop_before_the_next_partition():
+    step = migrations.Step("fix", "medications", {"fixed": False})
+    assert migrations._range_filter(step, None, None) == {"fixed": False}
+    assert migrations._range_filter(step, 5, 10) == {"fixed": False, "_id": {"$gte": 5, "$lt": 10}}
+    assert migrations._range_filter(step, 5, 10, after=7) == {"fixed": False, "_id": {"$gt": 7, "$lt": 10}}
@@ -0,0 +1,39 @@
+"""Tests for password hashing (passwords.py)"""
+
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+@pytest.mark.parametrize("method", ["scrypt", "scrypt:16384:8:1", "pbkdf2", "pbkdf2:sha512", "pbkdf2:sha256:1000"])
+def test_stored_prefix_matches_werkzeug(method):
+    assert passwords._stored_prefix(method) == generate_password_hash("x", method).split("$", 1)[0]
+
+def test_needs_rehash(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_PREFIX", passwords._stored_prefix("pbkdf2:sha256:1000"))
+    assert not passwords.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:1000"))
+    assert passwords.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:2000"))
+    assert passwords.needs_rehash(generate_password_hash("x", "scrypt:16384:8:1"))
+
+def test_hash_and_verify_in_process():
+    pool = passwords._Pool(0)
+    password_hash = pool.run("hash", generate_password_hash, "secret", "pbkdf2:sha256:1000")
+    assert pool.run("verify", passwords.check_password_hash, password_hash, "secret")
+
+def _exit_in_child(parent_pid):
+    if os.getpid() != parent_pid:
+        os._exit(1)
+    return "ran in process"
+
+def test_broken_pool_falls_back_and_is_rebuilt():
+    pool = passwords._Pool(1)
+    try:
+        # The child dies mid-call: this call runs on the calling thread instead
+        assert pool.run("hash", _exit_in_child, os.getpid()) == "ran in process"
+        # and the next one gets a working pool again
+        assert pool.run("hash", os.getpid) != os.getpid()
+    finally:
+        if pool._executor:
+            pool._executor.shutdown()
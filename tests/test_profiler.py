@@ -0,0 +1,53 @@
+"""Tests for the sampling profiler (profiler.py)"""
+
+import time
+import threading
+
+import pytest
+
+import profiler
+from local_db import LocalDatabase
+
+@pytest.fixture(autouse=True)
+def profile_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "_db", LocalDatabase(str(tmp_path / "profiles.sqlite3"), schema=profiler._db.schema))
+
+def _busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+def test_samples_are_folded_into_the_profile():
+    sampler = profiler.Sampler(interval=0.001)
+    ident = threading.get_ident()
+    sampler.register(ident)
+    _busy(0.1)
+    counts = sampler.unregister(ident)
+    assert sum(counts.values()) > 0
+    assert any("_busy" in stack for stack in counts)
+
+def test_no_samples_after_unregister():
+    sampler = profiler.Sampler(interval=0.0005)
+    ident = threading.get_ident()
+    live = sampler.register(ident)
+    _busy(0.05)
+    counts = sampler.unregister(ident)
+    _busy(0.05)
+    # The returned copy is final, and the sampler stops writing to the live counter
+    assert sum(live.values()) == sum(counts.values())
+
+def test_finish_while_sampling_never_raises(monkeypatch):
+    monkeypatch.setattr(profiler, "_sampler", profiler.Sampler(interval=0))
+    for _ in range(200):
+        handle = threading.get_ident(), profiler._sampler.register(threading.get_ident())
+        _busy(0.001)
+        profiler.finish(handle, "/chat", "drug_info")
+    assert profiler.summary()[0]["profiled_requests"] == 200
+
+def test_finish_swallows_errors(monkeypatch):
+    class Broken:
+        def connection(self):
+            raise RuntimeError("dictionary changed size during iteration")
+    monkeypatch.setattr(profiler, "_db", Broken())
+    handle = threading.get_ident(), profiler._sampler.register(threading.get_ident())
+    profiler.finish(handle, "/chat", None)
@@ -0,0 +1,59 @@
+"""Tests for chat history archival and restore (retention.py)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("bson")
+from bson import ObjectId
+
+import retention
+import search_index
+from local_db import LocalDatabase
+
+class FakeChatHistory:
+    def __init__(self):
+        self.docs = {}
+
+    def bulk_write(self, requests, ordered=True):
+        upserted = {}
+        for index, request in enumerate(requests):
+            doc = request._doc
+            if doc["_id"] not in self.docs:
+                upserted[index] = doc["_id"]
+            self.docs[doc["_id"]] = doc
+        return type("BulkWriteResult", (), {"upserted_ids": upserted})()
+
+@pytest.fixture
+def chat_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "CHAT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(search_index, "_db", LocalDatabase(str(tmp_path / "search.sqlite3"), schema=search_index._db.schema))
+    monkeypatch.setattr(retention.response_store, "should_store", lambda role, content: False)
+    monkeypatch.setattr(retention.response_store, "release", lambda refs: None)
+    collection = FakeChatHistory()
+    monkeypatch.setattr(retention, "chat_history_collection", collection)
+    return collection
+
+def archived(user_id, n, when):
+    return {"_id": ObjectId.from_datetime(when + timedelta(seconds=n)), "user_id": user_id, "role": "user",
+            "content": f"ibuprofen question {n}", "timestamp": when + timedelta(seconds=n)}
+
+def indexed_ids():
+    return {row[0] for row in search_index._db.connection().execute("SELECT message_id FROM docs")}
+
+def test_restore_puts_messages_back_once_and_indexes_them_for_search(chat_history):
+    day = datetime(2024, 1, 31, 9)
+    messages = [archived("alice", n, day) for n in range(3)] + [archived("bob", 3, day)]
+    retention._write_batch(day.date(), messages[:2])
+    retention._write_batch(day.date(), messages)
+    assert retention.restore(day.date(), day.date(), "alice") == 3
+    assert set(chat_history.docs) == {m["_id"] for m in messages[:3]}
+    assert indexed_ids() == {str(m["_id"]) for m in messages[:3]}
+    # Restoring again changes nothing
+    assert retention.restore(day.date(), day.date(), "alice") == 0
+    assert len(indexed_ids()) == 3
+
+def test_archived_days_lists_archive_files_oldest_first(chat_history):
+    for day in (datetime(2024, 2, 1), datetime(2024, 1, 30)):
+        retention._write_batch(day.date(), [archived("alice", 0, day)])
+    assert retention.archived_days() == [datetime(2024, 1, 30).date(), datetime(2024, 2, 1).date()]
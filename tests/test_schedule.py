@@ -0,0 +1,124 @@
+"""Tests for the dosing schedule grammar (schedule.py)"""
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+import schedule
+
+TODAY = date(2026, 10, 19)  # a Monday
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+def times(text):
+    rule = schedule.parse_time_field(text, TODAY)
+    return rule and rule["times"]
+
+@pytest.mark.parametrize("text, expected", [
+    ("8:00 AM", ["08:00"]),
+    ("8", ["08:00"]),
+    ("9 pm", ["21:00"]),
+    ("14:30", ["14:30"]),
+    ("bedtime", ["21:00"]),
+    ("twice daily", ["08:00", "20:00"]),
+    ("bid", ["08:00", "20:00"]),
+    ("3 times a day at 7am", ["07:00", "13:00", "19:00"]),
+    ("at 8am and 8pm", ["08:00", "20:00"]),
+    ("every 8 hours", ["08:00"]),
+    ("every 6 hours at 9", ["09:00"]),
+])
+def test_times(text, expected):
+    assert times(text) == expected
+
+@pytest.mark.parametrize("text", ["5 times a day", "six times a day", "12 times a day", "24 times a day"])
+def test_many_doses_a_day_stay_on_the_clock(text):
+    rule = schedule.parse_time_field(text, TODAY)
+    assert all("00:00" <= clock <= "23:59" for clock in rule["times"])
+    assert len(rule["times"]) == schedule._number(text.split()[0])
+    # Every dose time must be usable, not only parsed
+    assert schedule.fields(rule, utc(2026, 10, 19, 12, 0))["next_due_at"] is not None
+
+@pytest.mark.parametrize("text", [
+    "every 0 hours", "every 0 days", "for 0 days", "twice daily for 0 days",
+    "0 times a day", "30 times a day", "30 times a day at 9", "at 25", "13pm", "take two tablets", "",
+])
+def test_invalid_schedules_are_rejected(text):
+    assert schedule.parse_time_field(text, TODAY) is None
+
+def test_weekdays():
+    rule = schedule.parse("Mon/Wed/Fri at 9", TODAY)
+    assert rule["times"] == ["09:00"] and rule["weekdays"] == [0, 2, 4]
+    assert schedule.parse("on weekends", TODAY)["weekdays"] == [5, 6]
+
+def test_course_length():
+    assert schedule.parse("twice daily for 14 days", TODAY)["until"] == "2026-11-01"
+    assert schedule.parse("daily for 1 week", TODAY)["until"] == "2026-10-25"
+    assert schedule.parse("twice daily", TODAY)["until"] is None
+
+def test_extract_leaves_the_medication_name():
+    rule, remainder = schedule.extract("Amoxicillin 500mg three times a day for 7 days", TODAY)
+    assert rule["times"] == ["08:00", "14:00", "20:00"]
+    assert remainder == "Amoxicillin 500mg"
+
+def test_next_occurrence():
+    rule = schedule.parse("at 8am and 8pm", TODAY)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 9, 0)) == utc(2026, 10, 19, 20, 0)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 21, 0)) == utc(2026, 10, 20, 8, 0)
+    # Naive moments are UTC, as pymongo returns them
+    assert schedule.next_occurrence(rule, datetime(2026, 10, 19, 9, 0)) == utc(2026, 10, 19, 20, 0)
+
+def test_next_occurrence_on_weekdays_and_every_other_day():
+    weekly = schedule.parse("Fridays at 9", TODAY)
+    assert schedule.next_occurrence(weekly, utc(2026, 10, 19, 10, 0)) == utc(2026, 10, 23, 9, 0)
+    alternate = schedule.parse("every other day at 8", TODAY)
+    assert schedule.next_occurrence(alternate, utc(2026, 10, 19, 9, 0)) == utc(2026, 10, 21, 8, 0)
+
+def test_course_ends():
+    rule = schedule.parse("daily at 8 for 2 days", TODAY)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 20, 7, 0)) == utc(2026, 10, 20, 8, 0)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 20, 9, 0)) is None
+
+def test_dose_times_are_in_the_users_timezone():
+    rule = schedule.parse("at 8am and 8pm", TODAY, "America/New_York")
+    assert rule["timezone"] == "America/New_York"
+    # 8 PM in New York (EDT) is midnight UTC
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 13, 0)) == utc(2026, 10, 20, 0, 0)
+    kolkata = schedule.parse("at 9", TODAY, "Asia/Kolkata")
+    assert schedule.next_occurrence(kolkata, utc(2026, 10, 19, 0, 0)) == utc(2026, 10, 19, 3, 30)
+
+def test_dose_times_follow_daylight_saving():
+    # Europe/Berlin leaves summer time on 2026-10-25
+    rule = schedule.parse("at 8", TODAY, "Europe/Berlin")
+    assert schedule.next_occurrence(rule, utc(2026, 10, 24, 12, 0)) == utc(2026, 10, 25, 7, 0)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 25, 12, 0)) == utc(2026, 10, 26, 7, 0)
+
+def test_hour_intervals_start_at_the_first_dose():
+    rule = schedule.parse("every 8 hours", TODAY)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 0, 0)) == utc(2026, 10, 19, 8, 0)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 8, 0)) == utc(2026, 10, 19, 16, 0)
+    assert schedule.next_occurrence(rule, utc(2026, 10, 19, 23, 0)) == utc(2026, 10, 20, 0, 0)
+
+def test_hour_intervals_need_not_divide_a_day():
+    rule = schedule.parse("every 5 hours at 8 for 2 days", TODAY)
+    doses, moment = [], utc(2026, 10, 19, 0, 0)
+    while True:
+        moment = schedule.next_occurrence(rule, moment)
+        if moment is None:
+            break
+        doses.append(moment.strftime("%d %H:%M"))
+    assert doses == ["19 08:00", "19 13:00", "19 18:00", "19 23:00", "20 04:00", "20 09:00", "20 14:00", "20 19:00"]
+    assert schedule.describe(rule) == "every 5 hours from 8:00 AM until Oct 20, 2026"
+
+def test_unknown_timezones_are_not_valid():
+    assert schedule.valid_timezone("Europe/Berlin")
+    assert not schedule.valid_timezone("Mars/Olympus_Mons")
+    assert not schedule.valid_timezone("../etc/passwd")
+
+def test_retime_moves_every_dose():
+    rule = schedule.retime(schedule.parse("twice daily", TODAY), "09:00")
+    assert rule["times"] == ["09:00", "21:00"]
+
+def test_describe():
+    assert schedule.describe(schedule.parse("twice daily for 14 days", TODAY)) == "8:00 AM and 8:00 PM daily until Nov 01, 2026"
+    assert schedule.describe(schedule.parse("Mon and Wed at 9pm", TODAY)) == "9:00 PM on Mon and Wed"
@@ -0,0 +1,108 @@
+"""Tests for full-text search over chat history (search_index.py)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("bson")
+from bson import ObjectId
+
+import search_index
+from local_db import LocalDatabase
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        self.docs.sort(key=lambda doc: tuple(doc[key] for key, _ in keys))
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+class FakeChatHistory:
+    """The find() filters search_index.py uses: user_id, timestamp $gte and _id $in"""
+
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query, projection=None):
+        def matches(doc):
+            if "user_id" in query and doc["user_id"] != query["user_id"]:
+                return False
+            if "timestamp" in query and doc["timestamp"] < query["timestamp"]["$gte"]:
+                return False
+            if "_id" in query and doc["_id"] not in query["_id"]["$in"]:
+                return False
+            return True
+        return FakeCursor([dict(doc) for doc in self.docs if matches(doc)])
+
+@pytest.fixture
+def chat_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "_db", LocalDatabase(str(tmp_path / "search.sqlite3"), schema=search_index._db.schema))
+    monkeypatch.setattr(search_index.response_store, "resolve", lambda messages: messages)
+    collection = FakeChatHistory()
+    monkeypatch.setattr(search_index, "chat_history_collection", collection)
+    return collection
+
+def save(collection, user_id, content, minutes):
+    when = datetime(2024, 9, 1, 9) + timedelta(minutes=minutes)
+    message = {"_id": ObjectId(), "user_id": user_id, "role": "user", "content": content, "timestamp": when}
+    collection.docs.append(message)
+    return message
+
+def found(user_id, query, **kwargs):
+    return [hit["snippet"].replace("**", "") for hit in search_index.search(user_id, query, **kwargs)]
+
+def test_search_builds_the_index_from_chat_history_and_stays_within_a_user(chat_history):
+    save(chat_history, "alice", "When should I take my ibuprofen?", 0)
+    save(chat_history, "alice", "Metformin makes me dizzy", 1)
+    save(chat_history, "bob", "ibuprofen and alcohol", 2)
+    assert found("alice", "ibuprofen") == ["When should I take my ibuprofen?"]
+    assert found("bob", "ibuprofen") == ["ibuprofen and alcohol"]
+
+def test_prefixes_phrases_and_recent_first_ordering(chat_history):
+    save(chat_history, "alice", "what dose of ibuprofen", 0)
+    save(chat_history, "alice", "dosage for children", 1)
+    save(chat_history, "alice", "dose of ibuprofen again", 2)
+    assert found("alice", "dos*", sort="recent") == ["dose of ibuprofen again", "dosage for children", "what dose of ibuprofen"]
+    assert len(found("alice", '"dose of ibuprofen"')) == 2
+    assert found("alice", "children dose") == []
+
+def test_query_syntax_cannot_break_the_match_expression():
+    assert search_index.to_match_expression('NEAR(a b) OR "x y" dos*') == '"NEAR a" AND "b" AND "OR" AND "x y" AND "dos"*'
+    with pytest.raises(search_index.QueryError):
+        search_index.to_match_expression('"" ** --')
+
+def test_catching_up_again_indexes_each_message_once(chat_history):
+    for minute in range(5):
+        save(chat_history, "alice", f"ibuprofen note {minute}", minute)
+    assert len(found("alice", "ibuprofen")) == 5
+    save(chat_history, "alice", "ibuprofen note 5", 5)
+    assert len(found("alice", "ibuprofen")) == 6
+    (count,) = search_index._db.connection().execute("SELECT COUNT(*) FROM docs").fetchone()
+    assert count == 6
+
+def test_hits_on_messages_gone_from_chat_history_are_pruned(chat_history):
+    kept = save(chat_history, "alice", "ibuprofen kept", 0)
+    gone = save(chat_history, "alice", "ibuprofen deleted elsewhere", 1)
+    assert len(found("alice", "ibuprofen")) == 2
+    chat_history.docs.remove(gone)
+    assert [hit["id"] for hit in search_index.search("alice", "ibuprofen")] == [str(kept["_id"])]
+    (count,) = search_index._db.connection().execute("SELECT COUNT(*) FROM docs").fetchone()
+    assert count == 1
+
+def test_removed_and_forgotten_messages_leave_the_index(chat_history):
+    first = save(chat_history, "alice", "ibuprofen one", 0)
+    save(chat_history, "alice", "ibuprofen two", 1)
+    found("alice", "ibuprofen")
+    search_index.remove([first["_id"]])
+    conn = search_index._db.connection()
+    assert conn.execute("SELECT COUNT(*) FROM docs").fetchone() == (1,)
+    search_index.forget("alice")
+    assert conn.execute("SELECT COUNT(*) FROM docs").fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM messages").fetchone() == (0,)
@@ -0,0 +1,69 @@
+"""Tests for the reworded-question cache (semantic_cache.py)"""
+
+import pytest
+
+import semantic_cache
+
+pytestmark = pytest.mark.skipif(not semantic_cache.NUMPY_AVAILABLE, reason="numpy not installed")
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = semantic_cache.SemanticCache(str(tmp_path / "semantic.sqlite3"))
+    for question in ["dengue", "hypothyroidism", "type 2 diabetes", "lung cancer", "kidney stone", "chronic kidney disease"]:
+        cache.add("disease_info", question)
+    return cache
+
+@pytest.mark.parametrize("question, expected", [
+    ("tell me about dengue fever", "dengue"),
+    ("What is Dengue?", "dengue"),
+    ("dengue symptoms", "dengue"),
+    ("diabetes type 2", "type 2 diabetes"),
+    ("kidney stones", "kidney stone"),
+])
+def test_reworded_questions_share_an_answer(cache, question, expected):
+    assert cache.lookup("disease_info", question) == expected
+
+@pytest.mark.parametrize("question", [
+    "hyperthyroidism",      # looks like hypothyroidism
+    "type 1 diabetes",      # differs in a number
+    "diabetes",             # less specific than type 2 diabetes
+    "breast cancer",        # shares only the generic part
+    "acute kidney disease", # differs in a qualifier
+    "yellow fever",
+    "fever",
+])
+def test_different_conditions_do_not(cache, question):
+    assert cache.lookup("disease_info", question) is None
+
+def test_namespaces_are_separate(cache):
+    assert cache.lookup("drug_info", "dengue") is None
+
+def test_threshold_is_configurable(tmp_path):
+    strict = semantic_cache.SemanticCache(str(tmp_path / "strict.sqlite3"), threshold=0.99)
+    strict.add("disease_info", "dengue")
+    assert strict.lookup("disease_info", "dengue fever") is None
+    assert strict.lookup("disease_info", "what is dengue") == "dengue"
+
+def test_other_workers_keys_are_picked_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_SYNC_INTERVAL", 0)
+    path = str(tmp_path / "shared.sqlite3")
+    reader, writer = semantic_cache.SemanticCache(path), semantic_cache.SemanticCache(path)
+    assert reader.lookup("disease_info", "malaria") is None
+    writer.add("disease_info", "malaria")
+    assert reader.lookup("disease_info", "tell me about malaria") == "malaria"
+
+def test_hash_collisions_do_not_match():
+    # Different words never score as similar, whatever their hashed vectors do
+    assert semantic_cache.similarity("hyperthyroidism", "hypothyroidism") == 0
+    assert semantic_cache.similarity("dengue fever", "dengue") > 0.9
+
+def test_large_index_uses_lsh_and_finds_the_match(monkeypatch):
+    np = semantic_cache.np
+    index = semantic_cache.VectorIndex()
+    monkeypatch.setattr(semantic_cache, "LSH_MIN_ENTRIES", 1000)
+    rng = np.random.default_rng(1)
+    noise = rng.standard_normal((5000, index.dim)).astype(np.float32)
+    for i, vector in enumerate(noise / np.linalg.norm(noise, axis=1, keepdims=True)):
+        index.add(f"noise {i}", vector.astype(np.float16))
+    index.add("dengue", semantic_cache.embed("dengue").astype(np.float16))
+    assert index.search(semantic_cache.embed(semantic_cache.normalize("dengue fever")))[0][0] == "dengue"
@@ -0,0 +1,135 @@
+"""Tests for request coalescing (singleflight.py)"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+from pymongo.errors import DuplicateKeyError
+
+import singleflight
+
+class FakeLeases:
+    """The lease operations singleflight.py uses, on a dict guarded by a lock"""
+
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def insert_one(self, doc):
+        with self.lock:
+            if doc["_id"] in self.docs:
+                raise DuplicateKeyError("duplicate key")
+            self.docs[doc["_id"]] = dict(doc)
+
+    def replace_one(self, query, doc, upsert=False):
+        with self.lock:
+            self.docs[query["_id"]] = {"_id": query["_id"], **doc}
+
+    def find_one_and_update(self, query, update):
+        with self.lock:
+            doc = self.docs.get(query["_id"])
+            if doc is None or not doc["expires_at"] < query["expires_at"]["$lt"]:
+                return None
+            before = dict(doc)
+            doc.update(update["$set"])
+            return before
+
+    def find_one(self, query, projection=None):
+        with self.lock:
+            doc = self.docs.get(query["_id"])
+            return dict(doc) if doc else None
+
+    def delete_one(self, query):
+        with self.lock:
+            doc = self.docs.get(query["_id"])
+            if doc and doc["owner"] == query["owner"]:
+                del self.docs[query["_id"]]
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    def peek(self, key):
+        return self.values.get(key)
+
+@pytest.fixture
+def leases(monkeypatch):
+    leases = FakeLeases()
+    monkeypatch.setattr(singleflight, "leases_collection", leases)
+    return leases
+
+def test_concurrent_lookups_of_a_key_run_once(leases):
+    flight = singleflight.SingleFlight("drug_info", FakeCache())
+    calls = []
+    followers = threading.Semaphore(0)
+    wait_local = flight._wait_local
+    def counted_wait(call):
+        followers.release()
+        return wait_local(call)
+    flight._wait_local = counted_wait
+    def compute():
+        calls.append(1)
+        # Hold the lookup until every other caller is waiting on it
+        for _ in range(7):
+            assert followers.acquire(timeout=5)
+        return "ibuprofen info"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("Ibuprofen ", compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["ibuprofen info"] * 8
+    assert leases.docs == {}
+
+def test_a_failed_lookup_fails_its_followers_and_is_not_remembered(leases):
+    flight = singleflight.SingleFlight("drug_info", FakeCache())
+    started, release = threading.Event(), threading.Event()
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream down")
+    errors = []
+    def call():
+        try:
+            flight.do("ibuprofen", failing)
+        except RuntimeError as e:
+            errors.append(e)
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    release.set()
+    leader.join(); follower.join()
+    assert len(errors) == 2
+    assert flight.do("ibuprofen", lambda: "recovered") == "recovered"
+
+def test_another_workers_result_is_used_instead_of_calling_upstream(leases, monkeypatch):
+    cache = FakeCache()
+    flight = singleflight.SingleFlight("drug_info", cache)
+    leases.insert_one({"_id": "drug_info:ibuprofen", "owner": "other-worker",
+                       "expires_at": datetime.now(timezone.utc) + timedelta(seconds=10)})
+    polls = []
+    def peek(key):
+        polls.append(key)
+        # The other worker finishes while this one polls
+        return "from the other worker" if len(polls) >= 3 else None
+    monkeypatch.setattr(cache, "peek", peek)
+    assert flight.do("ibuprofen", lambda: pytest.fail("computed twice")) == "from the other worker"
+
+def test_an_expired_lease_is_taken_over(leases):
+    flight = singleflight.SingleFlight("drug_info", FakeCache())
+    leases.insert_one({"_id": "drug_info:ibuprofen", "owner": "dead-worker",
+                       "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    assert flight.do("ibuprofen", lambda: "fetched") == "fetched"
+    assert leases.docs == {}
+
+def test_the_lookup_is_done_again_when_the_other_worker_fails(leases):
+    flight = singleflight.SingleFlight("drug_info", FakeCache(), lease_seconds=0.2)
+    leases.insert_one({"_id": "drug_info:ibuprofen", "owner": "other-worker",
+                       "expires_at": datetime.now(timezone.utc) + timedelta(seconds=10)})
+    assert flight.do("ibuprofen", lambda: "fetched") == "fetched"
@@ -9,11 +9,13 @@ import os
 import pymongo
 import datetime
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # Load environment variables
 load_dotenv()
 
+# Gemini is configured from the environment, so import the client after loading it
+import gemini_client
+
 # Common diseases to add to the database
 COMMON_DISEASES = [
     "gastroenteritis", "diarrhea", "ulcerative colitis", "crohn's disease",
@@ -29,9 +31,6 @@ def update_disease_data():
             print("Error: GEMINI_API_KEY environment variable not set")
             return False
             
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        
         # Connect to MongoDB
         MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/medassist")
         client = pymongo.MongoClient(MONGODB_URI)
@@ -73,7 +72,7 @@ def update_disease_data():
             """
             
             try:
-                response = model.generate_content(prompt)
+                response = gemini_client.generate(prompt, gemini_client.BATCH)
                 
                 if response and hasattr(response, 'text'):
                     # Store in database